@@ -0,0 +1,251 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from datetime import datetime
+import numpy as np
+from schedule_engine import (
+    POPULATION_SIZE, SchedulingProblem, EncodedProblem, solve,
+    calculate_fitness, local_repair, batch_fitness, initialize_population, get_default_shifts, get_month_days
+)
+
+# Cấu hình mặc định của bộ benchmark: số nhân viên, kỳ lịch (năm, tháng) và mật độ ca AL/NPL nhập tay.
+# Các kỳ được chọn để có đủ độ dài 28, 29, 30 và 31 ngày (từ ngày 26 đến ngày 25 tháng sau).
+DEFAULT_SIZES = [10, 50, 200, 500]
+DEFAULT_PERIODS = [(2025, 2), (2024, 2), (2025, 4), (2025, 1)]
+DEFAULT_LEAVE_DENSITIES = [0.0, 0.05]
+
+# Tỉ lệ nhân viên Customer Service và tỉ lệ cấp bậc trong cửa hàng giả lập
+CS_RATIO = 0.25
+SENIOR_RATIO = 0.15
+MANAGER_RATIO = 0.05
+
+
+# Hàm tạo danh sách nhân viên giả lập: trộn Cashier/Customer Service (tối thiểu 4 CS), có Senior/Manager
+def make_employees(size, rng):
+    num_cs = min(size, max(4, round(size * CS_RATIO)))
+    employees = []
+    for i in range(size):
+        roll = rng.random()
+        rank = "Manager" if roll < MANAGER_RATIO else "Senior" if roll < MANAGER_RATIO + SENIOR_RATIO else "Junior"
+        employees.append({
+            "ID": f"E{i + 1:04d}",
+            "Họ Tên": f"Nhân viên {i + 1}",
+            "Cấp bậc": rank,
+            "Bộ phận": "Customer Service" if i < num_cs else "Cashier"
+        })
+    return employees
+
+
+# Hàm tạo ca AL/NPL nhập tay với mật độ density (tỉ lệ ô), không đặt hai ngày nghỉ liền nhau
+def make_leave_shifts(employees, num_days, density, rng):
+    manual_shifts = {}
+    for emp in employees:
+        days = np.flatnonzero(rng.random(num_days) < density)
+        for day in days.tolist():
+            if (emp["ID"], day - 1) in manual_shifts:
+                continue
+            manual_shifts[(emp["ID"], day)] = "AL" if rng.random() < 0.7 else "NPL"
+    return manual_shifts
+
+
+# Hàm lấy bộ nhớ đỉnh (MB) của tiến trình hiện tại; None nếu hệ điều hành không hỗ trợ (Windows)
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return round(peak / 2**20 if sys.platform == "darwin" else peak / 2**10, 2)
+
+
+# Hàm đo thời gian trung bình (giây) của fn sau `repeat` lần gọi
+def time_call(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+# Hàm đo warm start: thêm `edits` ô AL/NPL nhập tay vào lịch đã giải rồi giải lại với cùng cấu hình, một lần khởi tạo
+# từ lịch đó (warm start) và một lần từ đầu. Ghi fitness của quần thể ban đầu, fitness cuối và số thế hệ mỗi lần cần
+# để đạt fitness tốt nhất mà lần giải từ đầu đạt được trong GA (None nếu không đạt).
+def measure_warm_start(problem, schedule, edits, rng):
+    free_cells = [(emp["ID"], day) for emp in problem.scheduled_employees() for day in range(len(problem.month_days))
+                  if (emp["ID"], day) not in problem.manual_shifts]
+    manual_shifts = dict(problem.manual_shifts)
+    for i in rng.choice(len(free_cells), size=min(edits, len(free_cells)), replace=False).tolist():
+        manual_shifts[free_cells[i]] = "AL" if rng.random() < 0.7 else "NPL"
+    results = {"cold": solve(replace(problem, manual_shifts=manual_shifts)),
+               "warm": solve(replace(problem, manual_shifts=manual_shifts, warm_start=schedule))}
+
+    # Thống kê thế hệ g ghi fitness tốt nhất sau g - 1 lần tiến hóa; rỗng nếu quần thể ban đầu đã đạt ngưỡng
+    best = {label: [(g["generation"] - 1, g["best_fitness"]) for g in result.run_report.generations]
+            or [(0, result.fitness)] for label, result in results.items()}
+    target = best["cold"][-1][1]
+    measurement = {"edits": len(manual_shifts) - len(problem.manual_shifts), "target_fitness": target}
+    for label, result in results.items():
+        measurement[f"{label}_initial_fitness"] = best[label][0][1]
+        measurement[f"{label}_fitness"] = result.fitness
+        measurement[f"{label}_generations_to_target"] = next(
+            (generation for generation, fitness in best[label] if fitness <= target), None)
+    return measurement
+
+
+# Hàm chạy một trường hợp benchmark và trả về các chỉ số dạng dict (ghi được ra JSON).
+# Nên chạy mỗi trường hợp trong một tiến trình mới để bộ nhớ đỉnh chỉ tính riêng trường hợp đó.
+# warm_start_edits > 0: đo thêm warm start sau ngần ấy ô AL/NPL sửa tay (xem measure_warm_start).
+def run_case(size, year, month, leave_density, max_generations, seed, num_workers=1, num_islands=1,
+             repair_mode="conflict", backend="auto", warm_start_edits=0):
+    rng = np.random.default_rng(seed)
+    month_days = get_month_days(year, month)
+    employees = make_employees(size, rng)
+    manual_shifts = make_leave_shifts(employees, len(month_days), leave_density, rng)
+    selected_shifts = sorted(get_default_shifts("Tất cả"))
+    problem = SchedulingProblem(
+        employees=employees,
+        month_days=month_days,
+        selected_shifts=selected_shifts,
+        manual_shifts=dict(manual_shifts),
+        max_generations=max_generations,
+        seed=seed,
+        num_workers=num_workers,
+        num_islands=num_islands,
+        repair_mode=repair_mode,
+        backend=backend
+    )
+
+    result = solve(problem)
+    peak_memory = peak_rss_mb()
+
+    case = {
+        "employees": size,
+        "period": f"{year}-{month:02d}",
+        "days": len(month_days),
+        "leave_density": leave_density,
+        "manual_leave_cells": len(manual_shifts),
+        "max_generations": max_generations,
+        "seed": seed,
+        "repair_mode": repair_mode,
+        "backend": result.backend,
+        "elapsed_seconds": round(result.elapsed_time, 4),
+        "generations": result.generations,
+        "generations_per_second": round(result.generations / result.elapsed_time, 4) if result.elapsed_time else None,
+        "fitness_evaluations": result.fitness_evaluations,
+        "fitness_evaluations_per_second": round(result.fitness_evaluations / result.elapsed_time, 2) if result.elapsed_time else None,
+        "time_to_feasible_seconds": round(result.time_to_feasible, 4) if result.time_to_feasible is not None else None,
+        "peak_memory_mb": peak_memory,
+        "fitness": result.fitness if result.schedule else None,
+        # Số bản ghi Violation cứng/mềm của lịch; tổng mức vi phạm (magnitude, ví dụ số ca thiếu) ghi riêng
+        "hard_violations": sum(v.hard for v in result.violations) if result.schedule else None,
+        "soft_violations": sum(not v.hard for v in result.violations) if result.schedule else None,
+        "hard_magnitude": sum(v.magnitude for v in result.violations if v.hard) if result.schedule else None,
+        "soft_magnitude": sum(v.magnitude for v in result.violations if not v.hard) if result.schedule else None,
+        "run_report": result.run_report.to_dict(),
+    }
+
+    # Đo riêng các hàm lõi trên cùng dữ liệu: calculate_fitness (bản tham chiếu), batch_fitness
+    # cho một quần thể và local_repair cho một cá thể
+    if result.schedule:
+        scheduled = problem.scheduled_employees()
+        case["calculate_fitness_ms"] = round(1000 * time_call(lambda: calculate_fitness(
+            result.schedule, scheduled, month_days, problem.sundays, problem.vx_min, problem.balance_morning_evening,
+            problem.max_morning_evening_diff, result.manual_shifts, selected_shifts)), 3)
+        encoded = EncodedProblem(scheduled, month_days, problem.sundays, problem.vx_min, problem.balance_morning_evening,
+                                 problem.max_morning_evening_diff, result.manual_shifts, selected_shifts)
+        encoded.repair_mode = repair_mode
+        population = initialize_population(encoded, rng, POPULATION_SIZE)
+        case["batch_fitness_ms"] = round(1000 * time_call(lambda: batch_fitness(population, encoded), repeat=3), 3)
+        case["local_repair_ms"] = round(1000 * time_call(lambda: local_repair(population[0].copy(), encoded, rng)), 3)
+        if warm_start_edits:
+            case["warm_start"] = measure_warm_start(problem, result.schedule, warm_start_edits, rng)
+    return case
+
+
+# Hàm so sánh kết quả với lần chạy trước (file JSON cùng định dạng), trả về danh sách dòng mô tả
+def compare_with_baseline(cases, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(c["employees"], c["period"], c["leave_density"]): c for c in json.load(f)["cases"]}
+    lines = []
+    for case in cases:
+        previous = baseline.get((case["employees"], case["period"], case["leave_density"]))
+        if not previous or not previous.get("generations_per_second") or not case["generations_per_second"]:
+            continue
+        ratio = case["generations_per_second"] / previous["generations_per_second"]
+        lines.append(f"{case['employees']:>4} NV, {case['period']}, AL/NPL {case['leave_density']:.2f}: "
+                     f"{ratio:.2f}x thế hệ/giây so với lần trước")
+    return lines
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark bộ xếp lịch với các cửa hàng giả lập")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=DEFAULT_SIZES,
+                        help="Số nhân viên, phân cách bởi dấu phẩy (mặc định 10,50,200,500)")
+    parser.add_argument("--periods", type=lambda s: [tuple(int(x) for x in p.split("-")) for p in s.split(",")],
+                        default=DEFAULT_PERIODS, help="Kỳ lịch dạng năm-tháng, phân cách bởi dấu phẩy")
+    parser.add_argument("--leave-densities", type=lambda s: [float(x) for x in s.split(",")],
+                        default=DEFAULT_LEAVE_DENSITIES, help="Tỉ lệ ô AL/NPL nhập tay, phân cách bởi dấu phẩy")
+    parser.add_argument("--max-generations", type=int, default=5, help="Số thế hệ tối đa mỗi trường hợp")
+    parser.add_argument("--seed", type=int, default=0, help="Seed cho dữ liệu giả lập và bộ xếp lịch")
+    parser.add_argument("--workers", type=int, default=1, help="Số tiến trình local repair")
+    parser.add_argument("--islands", type=int, default=1, help="Số đảo của island model")
+    parser.add_argument("--repair-mode", choices=["conflict", "random"], default="conflict",
+                        help="Chế độ local repair: theo ô vi phạm (mặc định) hoặc ô ngẫu nhiên")
+    parser.add_argument("--backend", choices=["auto", "memetic", "exact"], default="auto",
+                        help="Bộ giải: tự động (mặc định), Memetic Algorithm hoặc bộ giải chính xác")
+    parser.add_argument("--warm-start-edits", type=int, default=0,
+                        help="Đo thêm warm start: số ô AL/NPL sửa tay trước khi giải lại (mặc định 0 = không đo)")
+    parser.add_argument("--output", default="benchmark_results.json", help="File JSON ghi kết quả")
+    parser.add_argument("--baseline", help="File JSON của lần chạy trước để so sánh")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    cases = []
+    for size in args.sizes:
+        for year, month in args.periods:
+            for density in args.leave_densities:
+                # Mỗi trường hợp chạy trong một tiến trình "spawn" riêng để đo bộ nhớ đỉnh độc lập
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    case = executor.submit(run_case, size, year, month, density, args.max_generations, args.seed,
+                                           args.workers, args.islands, args.repair_mode, args.backend,
+                                           args.warm_start_edits).result()
+                cases.append(case)
+                print(f"{size:>4} NV, {case['period']} ({case['days']} ngày), AL/NPL {density:.2f}: "
+                      f"{case['generations_per_second']} thế hệ/giây, {case['fitness_evaluations_per_second']} lần đánh giá/giây, "
+                      f"khả thi sau {case['time_to_feasible_seconds']} giây, {case['peak_memory_mb']} MB, "
+                      f"vi phạm cứng/mềm {case['hard_violations']}/{case['soft_violations']}")
+                if "warm_start" in case:
+                    warm = case["warm_start"]
+                    print(f"      warm start sau {warm['edits']} ô sửa: fitness ban đầu {warm['warm_initial_fitness']} "
+                          f"(từ đầu {warm['cold_initial_fitness']}), đạt {warm['target_fitness']} sau "
+                          f"{warm['warm_generations_to_target']} thế hệ (từ đầu {warm['cold_generations_to_target']})")
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "cases": cases
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Đã ghi kết quả vào {args.output}")
+    if args.baseline:
+        for line in compare_with_baseline(cases, args.baseline):
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
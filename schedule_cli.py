@@ -0,0 +1,175 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from schedule_engine import SchedulingProblem, solve, check_feasibility, get_default_shifts, get_month_days, get_valid_shifts
+from schedule_employees import DEPARTMENTS, REJECT_DUPLICATE_ID, read_employees_csv
+from schedule_reports import ScheduleStatsCache, build_schedule_report, build_detail_report, build_violation_report
+
+
+# Hàm đọc danh sách nhân viên từ file CSV, bỏ qua ID trùng; báo lỗi kèm mọi dòng không hợp lệ khác
+def load_employees_csv(path):
+    result = read_employees_csv(path)
+    duplicated = result.rejected["Lý do"] == REJECT_DUPLICATE_ID
+    if duplicated.any():
+        logging.warning(f"{path}: bỏ qua {int(duplicated.sum())} dòng trùng ID")
+    invalid = result.rejected[~duplicated]
+    if len(invalid):
+        lines = [f"dòng {row['Dòng']} (ID {row['ID'] or '-'}): {row['Lý do']}" for row in invalid.to_dict("records")]
+        raise ValueError(f"{path}: {len(invalid)} dòng không hợp lệ:\n" + "\n".join(lines))
+    return result.employees
+
+
+# Hàm lấy danh sách mã ca từ tham số dòng lệnh, mặc định theo bộ phận như trên giao diện
+def parse_shifts(shifts, department):
+    if not shifts:
+        return sorted(get_default_shifts(department))
+    selected = [s.strip() for s in shifts.split(",") if s.strip()]
+    unknown = [s for s in selected if s not in get_valid_shifts() + ["PRD", "AL", "NPL"]]
+    if unknown:
+        raise ValueError(f"Mã ca không hợp lệ: {', '.join(unknown)}")
+    return selected
+
+
+# Hàm xếp lịch cho một cửa hàng và ghi lịch, báo cáo chi tiết, báo cáo vi phạm vào output_dir
+def run_store(employee_csv, output_dir, year, month, vx_min, max_generations, shifts=None, department="Tất cả",
+              balance_morning_evening=True, max_morning_evening_diff=4, seed=None, num_workers=1, num_islands=1,
+              time_limit=None, stagnation_limit=None):
+    start_time = time.time()
+    store = os.path.splitext(os.path.basename(employee_csv))[0]
+    employees = load_employees_csv(employee_csv)
+    selected_shifts = parse_shifts(shifts, department)
+    month_days = get_month_days(year, month)
+    os.makedirs(output_dir, exist_ok=True)
+    violation_path = os.path.join(output_dir, f"vi_pham_{year}_{month}.csv")
+
+    is_feasible, reason = check_feasibility(employees, month_days, selected_shifts, department)
+    if not is_feasible:
+        build_violation_report([reason]).to_csv(violation_path, index=False)
+        logging.error(f"{store}: kiểm tra tính khả thi thất bại: {reason}")
+        return {"Cửa hàng": store, "Trạng thái": "Không khả thi", "Fitness": None, "Số vi phạm": 1,
+                "Thời gian (giây)": round(time.time() - start_time, 2)}
+
+    problem = SchedulingProblem(
+        employees=employees,
+        month_days=month_days,
+        selected_shifts=selected_shifts,
+        vx_min=vx_min,
+        department_filter=department,
+        balance_morning_evening=balance_morning_evening,
+        max_morning_evening_diff=max_morning_evening_diff,
+        max_generations=None if time_limit else max_generations,
+        seed=seed,
+        num_workers=num_workers,
+        num_islands=num_islands,
+        time_limit=time_limit,
+        stagnation_limit=stagnation_limit
+    )
+    result = solve(problem)
+    violations = result.violations if result.schedule else \
+        result.certificate or [result.message or f"Không tìm được lịch hợp lệ sau {max_generations} thế hệ"]
+    scheduled = problem.scheduled_employees()
+    if result.schedule:
+        stats = ScheduleStatsCache().get(result.schedule, scheduled, month_days)
+        build_schedule_report(result.schedule, scheduled, month_days, stats).to_csv(
+            os.path.join(output_dir, f"lich_ca_{year}_{month}.csv"))
+        build_detail_report(result.schedule, scheduled, month_days, stats).to_csv(
+            os.path.join(output_dir, f"bao_cao_chi_tiet_{year}_{month}.csv"), index=False)
+    build_violation_report(violations, scheduled, month_days).to_csv(violation_path, index=False)
+    with open(os.path.join(output_dir, f"bao_cao_chay_{year}_{month}.json"), "w", encoding="utf-8") as f:
+        json.dump(result.run_report.to_dict(), f, ensure_ascii=False, indent=2)
+    status = "Thất bại" if not result.schedule else ("Có vi phạm" if violations else "Hợp lệ")
+    logging.info(f"{store}: {status}, fitness = {result.fitness}, {len(violations)} vi phạm")
+    return {"Cửa hàng": store, "Trạng thái": status, "Fitness": result.fitness, "Số vi phạm": len(violations),
+            "Thời gian (giây)": round(time.time() - start_time, 2)}
+
+
+# Hàm khởi tạo logging cho tiến trình con của chế độ batch
+def _init_batch_worker(level):
+    logging.basicConfig(level=level, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+# Hàm xếp lịch cho mọi file CSV trong input_dir song song, mỗi cửa hàng một tiến trình;
+# trả về bảng tổng hợp kết quả các cửa hàng
+def run_batch(input_dir, output_dir, jobs=None, **options):
+    files = sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.lower().endswith(".csv"))
+    if not files:
+        raise ValueError(f"Không có file CSV nào trong thư mục {input_dir}")
+    jobs = min(jobs or os.cpu_count() or 1, len(files))
+    summary = []
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_batch_worker, initargs=(logging.getLogger().level,)) as executor:
+        futures = {
+            executor.submit(run_store, path, os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0]), **options): path
+            for path in files
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                summary.append(future.result())
+            except Exception as e:
+                logging.error(f"Lỗi khi xếp lịch {path}: {e}")
+                summary.append({"Cửa hàng": os.path.splitext(os.path.basename(path))[0], "Trạng thái": f"Lỗi: {e}",
+                                "Fitness": None, "Số vi phạm": None, "Thời gian (giây)": None})
+    df_summary = pd.DataFrame(summary).sort_values("Cửa hàng").reset_index(drop=True)
+    os.makedirs(output_dir, exist_ok=True)
+    df_summary.to_csv(os.path.join(output_dir, f"tong_hop_{options['year']}_{options['month']}.csv"), index=False)
+    return df_summary
+
+
+# Hàm khai báo tham số dòng lệnh
+def build_parser():
+    parser = argparse.ArgumentParser(description="Sắp lịch tự động không cần giao diện (Aeon Cashier SchedulerZ)")
+    parser.add_argument("--year", type=int, required=True, help="Năm của kỳ lịch")
+    parser.add_argument("--month", type=int, required=True, choices=range(1, 13), metavar="1-12",
+                        help="Tháng của kỳ lịch (từ ngày 26 tháng này đến ngày 25 tháng sau)")
+    parser.add_argument("--vx-min", type=int, default=3, help="Số ca VX tối thiểu mỗi nhân viên")
+    parser.add_argument("--max-generations", type=int, default=10, help="Số thế hệ tối đa")
+    parser.add_argument("--shifts", help="Danh sách mã ca, phân cách bởi dấu phẩy (mặc định theo bộ phận)")
+    parser.add_argument("--department", default="Tất cả", choices=["Tất cả"] + DEPARTMENTS, help="Bộ phận cần xếp lịch")
+    parser.add_argument("--no-balance", action="store_true", help="Không cân bằng ca sáng/tối")
+    parser.add_argument("--max-diff", type=int, default=4, help="Chênh lệch tối đa ca sáng/tối")
+    parser.add_argument("--time-limit", type=float,
+                        help="Thời gian chạy tối đa (giây); khi có, bỏ qua --max-generations và trả về lịch tốt nhất khi hết giờ")
+    parser.add_argument("--stagnation-limit", type=int, help="Dừng khi fitness không cải thiện sau số thế hệ này")
+    parser.add_argument("--seed", type=int, help="Seed để tái lập kết quả")
+    parser.add_argument("--islands", type=int, default=1, help="Số đảo của island model")
+    parser.add_argument("--output-dir", default=".", help="Thư mục ghi kết quả")
+    parser.add_argument("--verbose", action="store_true", help="In log chi tiết")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--employees", help="File CSV nhân viên của một cửa hàng")
+    source.add_argument("--batch-dir", help="Thư mục chứa file CSV nhân viên của nhiều cửa hàng")
+    parser.add_argument("--workers", type=int,
+                        help="Số tiến trình local repair (một cửa hàng, mặc định 1) hoặc số cửa hàng chạy song song (batch, mặc định: số lõi CPU)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    options = dict(year=args.year, month=args.month, vx_min=args.vx_min, max_generations=args.max_generations,
+                   shifts=args.shifts, department=args.department, balance_morning_evening=not args.no_balance,
+                   max_morning_evening_diff=args.max_diff, seed=args.seed, num_islands=args.islands,
+                   time_limit=args.time_limit, stagnation_limit=args.stagnation_limit)
+    try:
+        if args.batch_dir:
+            df_summary = run_batch(args.batch_dir, args.output_dir, args.workers, **options)
+            print(df_summary.to_string(index=False))
+            return 0 if (df_summary["Trạng thái"] == "Hợp lệ").all() else 1
+        summary = run_store(args.employees, args.output_dir, num_workers=args.workers or 1, **options)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"{summary['Cửa hàng']}: {summary['Trạng thái']}, fitness = {summary['Fitness']}, "
+          f"{summary['Số vi phạm']} vi phạm, {summary['Thời gian (giây)']} giây")
+    return 0 if summary["Trạng thái"] == "Hợp lệ" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
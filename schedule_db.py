@@ -0,0 +1,562 @@
+import json
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
+from schedule_engine import SHIFT_CODES, encode_schedule, decode_schedule, summarize_boundary
+
+# File SQLite mặc định của ứng dụng
+DB_PATH = "schedule.db"
+
+# Cửa hàng mặc định (dữ liệu tạo trước khi có khóa cửa hàng cũng thuộc cửa hàng này)
+DEFAULT_STORE = "default"
+
+# Lược đồ theo bảng. Lịch và ca thủ công được khóa theo (cửa hàng, kỳ, nhân viên, ngày), trong đó kỳ là
+# "YYYY-MM" của ngày 26 bắt đầu kỳ. Bảng WITHOUT ROWID lưu dữ liệu theo thứ tự khóa chính nên truy vấn
+# theo một kỳ của một cửa hàng chỉ đọc đúng vùng dữ liệu đó; chỉ mục phụ (period, emp_id, date, shift)
+# phủ toàn bộ cột cho truy vấn một kỳ trên mọi cửa hàng.
+SCHEMA = {
+    "employees": [
+        '''CREATE TABLE IF NOT EXISTS employees
+           (store TEXT NOT NULL, id TEXT NOT NULL, name TEXT, rank TEXT, department TEXT,
+            PRIMARY KEY (store, id)) WITHOUT ROWID''',
+    ],
+    "schedule": [
+        '''CREATE TABLE IF NOT EXISTS schedule
+           (store TEXT NOT NULL, period TEXT NOT NULL, emp_id TEXT NOT NULL, date TEXT NOT NULL, shift TEXT,
+            PRIMARY KEY (store, period, emp_id, date)) WITHOUT ROWID''',
+        '''CREATE INDEX IF NOT EXISTS idx_schedule_period ON schedule (period, emp_id, date, shift)''',
+    ],
+    "manual_shifts": [
+        '''CREATE TABLE IF NOT EXISTS manual_shifts
+           (store TEXT NOT NULL, period TEXT NOT NULL, emp_id TEXT NOT NULL, date TEXT NOT NULL, shift TEXT,
+            PRIMARY KEY (store, period, emp_id, date)) WITHOUT ROWID''',
+        '''CREATE INDEX IF NOT EXISTS idx_manual_shifts_period ON manual_shifts (period, emp_id, date, shift)''',
+    ],
+    # Trạng thái cuối kỳ của từng nhân viên (số ngày làm liên tục đến ngày cuối kỳ, ca ngày cuối), để kỳ sau
+    # kiểm tra ràng buộc qua ranh giới kỳ. Tính lần đầu khi được đọc và bị xóa mỗi khi lịch của kỳ thay đổi.
+    "boundary_state": [
+        '''CREATE TABLE IF NOT EXISTS boundary_state
+           (store TEXT NOT NULL, period TEXT NOT NULL, emp_id TEXT NOT NULL, trailing_run INTEGER, last_shift TEXT,
+            PRIMARY KEY (store, period, emp_id)) WITHOUT ROWID''',
+    ],
+    "settings": [
+        '''CREATE TABLE IF NOT EXISTS settings
+           (key TEXT PRIMARY KEY, value TEXT)''',
+    ],
+    "solver_runs": [
+        '''CREATE TABLE IF NOT EXISTS solver_runs
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TEXT, fitness REAL, generations INTEGER,
+            elapsed_time REAL, report TEXT, store TEXT, period TEXT)''',
+        '''CREATE INDEX IF NOT EXISTS idx_solver_runs_period ON solver_runs (store, period, id)''',
+    ],
+    # Mỗi phiên bản là một ảnh chụp lịch: ma trận mã ca int8 (nhân viên × ngày) của lịch và của ca thủ công
+    # (0 = không nhập tay), nén zlib, kèm danh sách ID nhân viên theo thứ tự hàng
+    "schedule_versions": [
+        '''CREATE TABLE IF NOT EXISTS schedule_versions
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, store TEXT NOT NULL, period TEXT NOT NULL, created_at TEXT,
+            source TEXT, fitness REAL, emp_ids TEXT, num_days INTEGER, schedule_codes BLOB, manual_codes BLOB)''',
+        '''CREATE INDEX IF NOT EXISTS idx_schedule_versions_period ON schedule_versions (store, period, id)''',
+    ],
+    # Hàng đợi xếp lịch chạy nền: mỗi dòng là một lần chạy của một bộ phận trong một kỳ, với trạng thái
+    # (xem JOB_STATUSES), tiến độ, fitness tốt nhất đến hiện tại và cờ yêu cầu hủy. details lưu danh sách vi phạm
+    # còn lại (hoặc chứng cứ vô nghiệm) dạng JSON khi chạy xong.
+    "solver_jobs": [
+        '''CREATE TABLE IF NOT EXISTS solver_jobs
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, store TEXT NOT NULL, period TEXT NOT NULL, department TEXT,
+            status TEXT NOT NULL, progress REAL DEFAULT 0, message TEXT, best_fitness REAL,
+            cancel_requested INTEGER DEFAULT 0, created_at TEXT, started_at TEXT, finished_at TEXT, details TEXT)''',
+        '''CREATE INDEX IF NOT EXISTS idx_solver_jobs_period ON solver_jobs (store, period, id)''',
+    ],
+}
+
+# Kỳ của một ngày trong DB cũ (chưa có cột period): ngày 26 trở đi thuộc kỳ của tháng đó,
+# các ngày còn lại thuộc kỳ của tháng trước
+LEGACY_PERIOD = ("CASE WHEN CAST(strftime('%d', date) AS INTEGER) >= 26 THEN strftime('%Y-%m', date) "
+                 "ELSE strftime('%Y-%m', date, 'start of month', '-1 month') END")
+
+# Câu lệnh dùng lại nhiều lần: giữ nguyên chuỗi SQL để sqlite3 dùng lại câu lệnh đã biên dịch
+# trong bộ đệm của kết nối
+INSERT_EMPLOYEE = 'INSERT OR REPLACE INTO employees (store, id, name, rank, department) VALUES (?, ?, ?, ?, ?)'
+DELETE_EMPLOYEE = 'DELETE FROM employees WHERE store = ? AND id = ?'
+INSERT_SCHEDULE = 'INSERT OR REPLACE INTO schedule (store, period, emp_id, date, shift) VALUES (?, ?, ?, ?, ?)'
+INSERT_MANUAL_SHIFT = 'INSERT OR REPLACE INTO manual_shifts (store, period, emp_id, date, shift) VALUES (?, ?, ?, ?, ?)'
+INSERT_SETTING = 'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)'
+SELECT_SETTING = 'SELECT value FROM settings WHERE key = ?'
+SELECT_SCHEDULE = 'SELECT emp_id, date, shift FROM schedule WHERE store = ? AND period = ?'
+SELECT_MANUAL_SHIFTS = 'SELECT emp_id, date, shift FROM manual_shifts WHERE store = ? AND period = ?'
+DELETE_SCHEDULE = 'DELETE FROM schedule WHERE store = ? AND period = ?'
+DELETE_MANUAL_SHIFTS = 'DELETE FROM manual_shifts WHERE store = ? AND period = ?'
+DELETE_SCHEDULE_CELL = 'DELETE FROM schedule WHERE store = ? AND period = ? AND emp_id = ? AND date = ?'
+DELETE_MANUAL_SHIFT = 'DELETE FROM manual_shifts WHERE store = ? AND period = ? AND emp_id = ? AND date = ?'
+INSERT_BOUNDARY_STATE = 'INSERT OR REPLACE INTO boundary_state (store, period, emp_id, trailing_run, last_shift) VALUES (?, ?, ?, ?, ?)'
+SELECT_BOUNDARY_STATE = 'SELECT emp_id, trailing_run, last_shift FROM boundary_state WHERE store = ? AND period = ?'
+DELETE_BOUNDARY_STATE = 'DELETE FROM boundary_state WHERE store = ? AND period = ?'
+DELETE_EMPLOYEE_SCHEDULE = 'DELETE FROM schedule WHERE store = ? AND period = ? AND emp_id = ?'
+DELETE_EMPLOYEE_MANUAL_SHIFTS = 'DELETE FROM manual_shifts WHERE store = ? AND period = ? AND emp_id = ?'
+
+# Giá trị thiết lập đã lưu theo (db_path, key), để chỉ ghi khi giá trị thay đổi
+_saved_settings = {}
+
+# Streamlit chạy mỗi phiên trên một luồng riêng nhưng dùng chung kết nối, nên mọi truy cập đi qua khóa này
+_lock = threading.RLock()
+
+
+# Hàm lấy danh sách cột của một bảng (rỗng nếu bảng chưa tồn tại)
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+# Hàm chuyển các bảng của DB cũ (một kỳ, một cửa hàng) sang lược đồ có khóa cửa hàng/kỳ
+def _migrate_legacy_tables(conn):
+    legacy_columns = {
+        "employees": ("store", "id, name, rank, department", f"'{DEFAULT_STORE}', id, name, rank, department"),
+        "schedule": ("period", "emp_id, date, shift", f"'{DEFAULT_STORE}', {LEGACY_PERIOD}, emp_id, date, shift"),
+        "manual_shifts": ("period", "emp_id, date, shift", f"'{DEFAULT_STORE}', {LEGACY_PERIOD}, emp_id, date, shift"),
+    }
+    for table, (new_column, old_columns, select) in legacy_columns.items():
+        columns = _table_columns(conn, table)
+        if not columns or new_column in columns:
+            continue
+        conn.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+        for statement in SCHEMA[table]:
+            conn.execute(statement)
+        new_columns = "store, " + ("period, " if table != "employees" else "") + old_columns
+        conn.execute(f'INSERT OR REPLACE INTO {table} ({new_columns}) SELECT {select} FROM {table}_legacy')
+        conn.execute(f'DROP TABLE {table}_legacy')
+    columns = _table_columns(conn, "solver_runs")
+    if columns and "period" not in columns:
+        conn.execute('ALTER TABLE solver_runs ADD COLUMN store TEXT')
+        conn.execute('ALTER TABLE solver_runs ADD COLUMN period TEXT')
+
+
+# Hàm lấy kết nối SQLite dùng chung cho cả tiến trình: mở một lần, bật WAL, chuyển DB cũ và tạo bảng một lần
+@lru_cache(maxsize=None)
+def get_connection(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    with conn:
+        _migrate_legacy_tables(conn)
+        for statements in SCHEMA.values():
+            for statement in statements:
+                conn.execute(statement)
+    return conn
+
+
+# Hàm lấy khóa kỳ "YYYY-MM" từ danh sách ngày của kỳ (ngày đầu tiên là ngày 26)
+def period_key(month_days):
+    return month_days[0].strftime('%Y-%m')
+
+
+# Hàm chạy fn(conn) trong một transaction duy nhất (commit khi thành công, rollback khi lỗi)
+def run_in_transaction(fn, db_path=DB_PATH):
+    conn = get_connection(db_path)
+    with _lock, conn:
+        return fn(conn)
+
+
+# Hàm chạy một truy vấn đọc và trả về toàn bộ kết quả
+def fetch_all(query, params=(), db_path=DB_PATH):
+    conn = get_connection(db_path)
+    with _lock:
+        return conn.execute(query, params).fetchall()
+
+
+# Hàm chuyển dict[emp_id] -> list[str] thành các dòng (cửa hàng, kỳ, emp_id, ngày, ca), bỏ qua ô trống
+def _schedule_rows(schedule, month_days, store):
+    period = period_key(month_days)
+    dates = [d.strftime('%Y-%m-%d') for d in month_days]
+    return [(store, period, emp_id, dates[day], shift)
+            for emp_id, shifts in schedule.items()
+            for day, shift in enumerate(shifts) if shift]
+
+
+# Hàm lưu danh sách nhân viên của một cửa hàng vào DB (ghi đè nhân viên của cửa hàng đó)
+def save_employees_to_db(employees, store=DEFAULT_STORE, db_path=DB_PATH):
+    rows = [(store, emp['ID'], emp['Họ Tên'], emp['Cấp bậc'], emp['Bộ phận']) for emp in employees]
+    def write(conn):
+        conn.execute('DELETE FROM employees WHERE store = ?', (store,))
+        conn.executemany(INSERT_EMPLOYEE, rows)
+    run_in_transaction(write, db_path)
+
+
+# Hàm thêm mới hoặc cập nhật một lô nhân viên của cửa hàng trong một transaction (không xóa nhân viên khác)
+def upsert_employees_to_db(employees, store=DEFAULT_STORE, db_path=DB_PATH):
+    rows = [(store, emp['ID'], emp['Họ Tên'], emp['Cấp bậc'], emp['Bộ phận']) for emp in employees]
+    run_in_transaction(lambda conn: conn.executemany(INSERT_EMPLOYEE, rows), db_path)
+
+
+# Hàm xóa một nhân viên của cửa hàng khỏi DB
+def delete_employee_from_db(emp_id, store=DEFAULT_STORE, db_path=DB_PATH):
+    run_in_transaction(lambda conn: conn.execute(DELETE_EMPLOYEE, (store, emp_id)), db_path)
+
+
+# Hàm tải nhân viên của một cửa hàng từ DB
+def load_employees_from_db(store=DEFAULT_STORE, db_path=DB_PATH):
+    rows = fetch_all('SELECT id, name, rank, department FROM employees WHERE store = ?', (store,), db_path)
+    return [{'ID': row[0], 'Họ Tên': row[1], 'Cấp bậc': row[2], 'Bộ phận': row[3]} for row in rows]
+
+
+# Hàm lưu lịch của một kỳ vào DB (ghi đè kỳ đó, không ảnh hưởng các kỳ khác) trong một transaction
+def save_schedule_to_db(schedule, month_days, store=DEFAULT_STORE, db_path=DB_PATH):
+    rows = _schedule_rows(schedule, month_days, store)
+    def write(conn):
+        conn.execute(DELETE_SCHEDULE, (store, period_key(month_days)))
+        conn.executemany(INSERT_SCHEDULE, rows)
+        conn.execute(DELETE_BOUNDARY_STATE, (store, period_key(month_days)))
+    run_in_transaction(write, db_path)
+
+
+# Hàm lưu lịch và manual_shifts của một kỳ chỉ cho các nhân viên emp_ids (ghi đè các nhân viên đó, giữ nguyên
+# nhân viên khác) trong một transaction, để các lần xếp lịch của những bộ phận khác nhau không ghi đè lên nhau
+def save_employee_schedules_to_db(schedule, manual_shifts, month_days, emp_ids, store=DEFAULT_STORE, db_path=DB_PATH):
+    period = period_key(month_days)
+    emp_ids = set(emp_ids)
+    schedule_rows = _schedule_rows({emp_id: shifts for emp_id, shifts in schedule.items() if emp_id in emp_ids},
+                                   month_days, store)
+    manual_rows = [(store, period, emp_id, month_days[day].strftime('%Y-%m-%d'), shift)
+                   for (emp_id, day), shift in manual_shifts.items() if emp_id in emp_ids]
+    keys = [(store, period, emp_id) for emp_id in emp_ids]
+    def write(conn):
+        conn.executemany(DELETE_EMPLOYEE_SCHEDULE, keys)
+        conn.executemany(INSERT_SCHEDULE, schedule_rows)
+        conn.executemany(DELETE_EMPLOYEE_MANUAL_SHIFTS, keys)
+        conn.executemany(INSERT_MANUAL_SHIFT, manual_rows)
+        conn.execute(DELETE_BOUNDARY_STATE, (store, period))
+    run_in_transaction(write, db_path)
+
+
+# Hàm tải lịch của một kỳ từ DB
+def load_schedule_from_db(month_days, store=DEFAULT_STORE, db_path=DB_PATH):
+    schedule = {}
+    date_to_index = {d.strftime('%Y-%m-%d'): i for i, d in enumerate(month_days)}
+    for emp_id, date, shift in fetch_all(SELECT_SCHEDULE, (store, period_key(month_days)), db_path):
+        if emp_id not in schedule:
+            schedule[emp_id] = [''] * len(month_days)
+        if date in date_to_index:
+            schedule[emp_id][date_to_index[date]] = shift
+    return schedule
+
+
+# Hàm lưu manual_shifts của một kỳ vào DB (ghi đè kỳ đó) trong một transaction
+def save_manual_shifts_to_db(manual_shifts, month_days, store=DEFAULT_STORE, db_path=DB_PATH):
+    period = period_key(month_days)
+    rows = [(store, period, emp_id, month_days[day].strftime('%Y-%m-%d'), shift)
+            for (emp_id, day), shift in manual_shifts.items()]
+    def write(conn):
+        conn.execute(DELETE_MANUAL_SHIFTS, (store, period))
+        conn.executemany(INSERT_MANUAL_SHIFT, rows)
+    run_in_transaction(write, db_path)
+
+
+# Hàm tải manual_shifts của một kỳ từ DB
+def load_manual_shifts_from_db(month_days, store=DEFAULT_STORE, db_path=DB_PATH):
+    manual_shifts = {}
+    date_to_index = {d.strftime('%Y-%m-%d'): i for i, d in enumerate(month_days)}
+    for emp_id, date, shift in fetch_all(SELECT_MANUAL_SHIFTS, (store, period_key(month_days)), db_path):
+        if date in date_to_index:
+            manual_shifts[(emp_id, date_to_index[date])] = shift
+    return manual_shifts
+
+
+# Hàm tải trạng thái cuối kỳ month_days (dict[emp_id] -> (số ngày làm liên tục, ca ngày cuối)) để dùng làm
+# trạng thái biên cho kỳ sau. Nếu chưa có, tính từ lịch đã lưu của kỳ và ghi lại cho các lần đọc sau.
+def load_boundary_state_from_db(month_days, store=DEFAULT_STORE, db_path=DB_PATH):
+    period = period_key(month_days)
+    rows = fetch_all(SELECT_BOUNDARY_STATE, (store, period), db_path)
+    if rows:
+        return {emp_id: (trailing_run, last_shift) for emp_id, trailing_run, last_shift in rows}
+    boundary = summarize_boundary(load_schedule_from_db(month_days, store, db_path))
+    rows = [(store, period, emp_id, trailing_run, last_shift) for emp_id, (trailing_run, last_shift) in boundary.items()]
+    if rows:
+        run_in_transaction(lambda conn: conn.executemany(INSERT_BOUNDARY_STATE, rows), db_path)
+    return boundary
+
+
+# Hàm liệt kê các kỳ đã có lịch của một cửa hàng, mới nhất trước
+def list_periods_from_db(store=DEFAULT_STORE, db_path=DB_PATH):
+    rows = fetch_all('SELECT DISTINCT period FROM schedule WHERE store = ? ORDER BY period DESC', (store,), db_path)
+    return [row[0] for row in rows]
+
+
+# Các ô (emp_id, ngày) đã thay đổi trên bảng chỉnh sửa và giá trị mới ("" = xóa ca).
+# Ghi vào DB một lần bằng flush(): chỉ upsert/xóa đúng các ô đó ở cả bảng schedule và manual_shifts.
+class DirtyCells:
+    def __init__(self):
+        self.cells = {}
+
+    def mark(self, emp_id, day, shift):
+        self.cells[(emp_id, day)] = shift
+
+    def __len__(self):
+        return len(self.cells)
+
+    # Hàm ghi các ô đã đổi trong một transaction rồi xóa danh sách, trả về số ô đã ghi
+    def flush(self, month_days, store=DEFAULT_STORE, db_path=DB_PATH):
+        if not self.cells:
+            return 0
+        period = period_key(month_days)
+        upserts = []
+        deletes = []
+        for (emp_id, day), shift in self.cells.items():
+            date = month_days[day].strftime('%Y-%m-%d')
+            if shift:
+                upserts.append((store, period, emp_id, date, shift))
+            else:
+                deletes.append((store, period, emp_id, date))
+        def write(conn):
+            conn.executemany(INSERT_SCHEDULE, upserts)
+            conn.executemany(INSERT_MANUAL_SHIFT, upserts)
+            conn.executemany(DELETE_SCHEDULE_CELL, deletes)
+            conn.executemany(DELETE_MANUAL_SHIFT, deletes)
+            conn.execute(DELETE_BOUNDARY_STATE, (store, period))
+        run_in_transaction(write, db_path)
+        count = len(self.cells)
+        self.cells = {}
+        return count
+
+
+# Hàm xóa lịch và ca thủ công của một kỳ trong DB
+def clear_schedule_from_db(month_days, store=DEFAULT_STORE, db_path=DB_PATH):
+    period = period_key(month_days)
+    def write(conn):
+        conn.execute(DELETE_SCHEDULE, (store, period))
+        conn.execute(DELETE_MANUAL_SHIFTS, (store, period))
+        conn.execute(DELETE_BOUNDARY_STATE, (store, period))
+    run_in_transaction(write, db_path)
+
+
+# Hàm lưu một thiết lập (vx_min, max_generations, ...) vào DB, bỏ qua nếu giá trị không đổi
+# so với lần lưu/tải trước; trả về True nếu đã ghi
+def save_settings_to_db(key, value, db_path=DB_PATH):
+    value = str(value)
+    if _saved_settings.get((db_path, key)) == value:
+        return False
+    run_in_transaction(lambda conn: conn.execute(INSERT_SETTING, (key, value)), db_path)
+    _saved_settings[(db_path, key)] = value
+    return True
+
+
+# Hàm tải một thiết lập dạng số nguyên từ DB
+def load_setting_from_db(key, default, db_path=DB_PATH):
+    rows = fetch_all(SELECT_SETTING, (key,), db_path)
+    if not rows:
+        return default
+    _saved_settings[(db_path, key)] = rows[0][0]
+    return int(rows[0][0])
+
+
+# Hàm lưu báo cáo một lần chạy bộ xếp lịch (thời gian theo giai đoạn, bộ đếm) của một kỳ vào DB
+def save_run_report_to_db(result, month_days, store=DEFAULT_STORE, db_path=DB_PATH):
+    row = (datetime.now().isoformat(timespec="seconds"), result.fitness if result.schedule else None,
+           result.generations, result.elapsed_time, json.dumps(result.run_report.to_dict()), store,
+           period_key(month_days))
+    run_in_transaction(lambda conn: conn.execute(
+        'INSERT INTO solver_runs (created_at, fitness, generations, elapsed_time, report, store, period) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)', row), db_path)
+
+
+# Hàm tải báo cáo lần chạy gần nhất của một kỳ từ DB
+def load_last_run_report_from_db(month_days, store=DEFAULT_STORE, db_path=DB_PATH):
+    rows = fetch_all('SELECT created_at, fitness, generations, elapsed_time, report FROM solver_runs '
+                     'WHERE store = ? AND period = ? ORDER BY id DESC LIMIT 1', (store, period_key(month_days)), db_path)
+    if not rows:
+        return None
+    created_at, fitness, generations, elapsed_time, report = rows[0]
+    return {"created_at": created_at, "fitness": fitness, "generation_count": generations,
+            "elapsed_time": elapsed_time, **json.loads(report)}
+
+
+# Nguồn tạo phiên bản lịch
+VERSION_SOURCES = {"solver": "Sắp lịch tự động", "manual": "Chỉnh sửa thủ công", "rollback": "Khôi phục"}
+
+
+# Hàm đóng gói lịch và manual_shifts thành (danh sách ID, blob lịch, blob ca thủ công)
+def pack_schedule(schedule, manual_shifts, month_days):
+    emp_ids = list(dict.fromkeys(list(schedule) + [emp_id for emp_id, _ in manual_shifts]))
+    manual_schedule = {}
+    for (emp_id, day), shift in manual_shifts.items():
+        manual_schedule.setdefault(emp_id, [''] * len(month_days))[day] = shift
+    schedule_codes = encode_schedule(schedule, emp_ids, len(month_days))
+    manual_codes = encode_schedule(manual_schedule, emp_ids, len(month_days))
+    return emp_ids, zlib.compress(schedule_codes.tobytes()), zlib.compress(manual_codes.tobytes())
+
+
+# Hàm giải nén blob thành ma trận mã ca (số nhân viên, số ngày)
+def unpack_codes(blob, num_employees, num_days):
+    return np.frombuffer(zlib.decompress(blob), dtype=np.int8).reshape(num_employees, num_days)
+
+
+# Hàm lưu một phiên bản lịch của kỳ, trả về id phiên bản
+def save_schedule_version(schedule, manual_shifts, month_days, source, fitness=None, store=DEFAULT_STORE,
+                          db_path=DB_PATH):
+    emp_ids, schedule_blob, manual_blob = pack_schedule(schedule, manual_shifts, month_days)
+    row = (store, period_key(month_days), datetime.now().isoformat(timespec="seconds"), source, fitness,
+           json.dumps(emp_ids), len(month_days), schedule_blob, manual_blob)
+    return run_in_transaction(lambda conn: conn.execute(
+        'INSERT INTO schedule_versions (store, period, created_at, source, fitness, emp_ids, num_days, '
+        'schedule_codes, manual_codes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', row).lastrowid, db_path)
+
+
+# Hàm ghi đè nội dung một phiên bản đã có (dùng cho phiên chỉnh sửa thủ công đang mở)
+def update_schedule_version(version_id, schedule, manual_shifts, month_days, fitness=None, db_path=DB_PATH):
+    emp_ids, schedule_blob, manual_blob = pack_schedule(schedule, manual_shifts, month_days)
+    run_in_transaction(lambda conn: conn.execute(
+        'UPDATE schedule_versions SET created_at = ?, fitness = ?, emp_ids = ?, num_days = ?, schedule_codes = ?, '
+        'manual_codes = ? WHERE id = ?',
+        (datetime.now().isoformat(timespec="seconds"), fitness, json.dumps(emp_ids), len(month_days),
+         schedule_blob, manual_blob, version_id)), db_path)
+
+
+# Hàm liệt kê các phiên bản lịch của một kỳ (không giải nén), mới nhất trước
+def list_schedule_versions(month_days, store=DEFAULT_STORE, db_path=DB_PATH):
+    rows = fetch_all('SELECT id, created_at, source, fitness, emp_ids, length(schedule_codes) + length(manual_codes) '
+                     'FROM schedule_versions WHERE store = ? AND period = ? ORDER BY id DESC',
+                     (store, period_key(month_days)), db_path)
+    return [{"id": version_id, "created_at": created_at, "source": source, "fitness": fitness,
+             "employees": len(json.loads(emp_ids)), "size_bytes": size}
+            for version_id, created_at, source, fitness, emp_ids, size in rows]
+
+
+# Hàm tải ma trận mã ca của một phiên bản: (danh sách ID, mã ca lịch, mã ca thủ công)
+def load_version_codes(version_id, db_path=DB_PATH):
+    rows = fetch_all('SELECT emp_ids, num_days, schedule_codes, manual_codes FROM schedule_versions WHERE id = ?',
+                     (version_id,), db_path)
+    if not rows:
+        raise KeyError(f"Không có phiên bản lịch {version_id}")
+    emp_ids, num_days, schedule_blob, manual_blob = rows[0]
+    emp_ids = json.loads(emp_ids)
+    return (emp_ids, unpack_codes(schedule_blob, len(emp_ids), num_days),
+            unpack_codes(manual_blob, len(emp_ids), num_days))
+
+
+# Hàm tải một phiên bản dưới dạng (lịch dict[emp_id] -> list[str], manual_shifts)
+def load_schedule_version(version_id, db_path=DB_PATH):
+    emp_ids, schedule_codes, manual_codes = load_version_codes(version_id, db_path)
+    schedule = decode_schedule(schedule_codes, emp_ids)
+    manual_shifts = {(emp_ids[e], day): SHIFT_CODES[code]
+                     for e, day, code in zip(*np.nonzero(manual_codes), manual_codes[manual_codes != 0].tolist())}
+    return schedule, manual_shifts
+
+
+# Hàm so sánh hai phiên bản: danh sách (emp_id, ngày, ca ở phiên bản a, ca ở phiên bản b) của các ô khác nhau.
+# So sánh trực tiếp trên ma trận mã ca, nhân viên chỉ có ở một phiên bản được coi là toàn ô trống ở phiên bản kia.
+def diff_schedule_versions(version_a, version_b, db_path=DB_PATH):
+    emp_ids_a, codes_a, _ = load_version_codes(version_a, db_path)
+    emp_ids_b, codes_b, _ = load_version_codes(version_b, db_path)
+    emp_ids = list(dict.fromkeys(emp_ids_a + emp_ids_b))
+    num_days = max(codes_a.shape[1], codes_b.shape[1])
+    aligned_a = np.zeros((len(emp_ids), num_days), dtype=np.int8)
+    aligned_b = np.zeros((len(emp_ids), num_days), dtype=np.int8)
+    aligned_a[:len(emp_ids_a), :codes_a.shape[1]] = codes_a
+    index = {emp_id: i for i, emp_id in enumerate(emp_ids)}
+    aligned_b[[index[emp_id] for emp_id in emp_ids_b], :codes_b.shape[1]] = codes_b
+    rows, days = np.nonzero(aligned_a != aligned_b)
+    return [(emp_ids[e], day, SHIFT_CODES[aligned_a[e, day]], SHIFT_CODES[aligned_b[e, day]])
+            for e, day in zip(rows.tolist(), days.tolist())]
+
+
+# Hàm khôi phục lịch và manual_shifts của kỳ về một phiên bản (ghi trong một transaction),
+# trả về (lịch, manual_shifts) đã khôi phục
+def rollback_to_version(version_id, month_days, store=DEFAULT_STORE, db_path=DB_PATH):
+    schedule, manual_shifts = load_schedule_version(version_id, db_path)
+    period = period_key(month_days)
+    schedule_rows = _schedule_rows(schedule, month_days, store)
+    manual_rows = [(store, period, emp_id, month_days[day].strftime('%Y-%m-%d'), shift)
+                   for (emp_id, day), shift in manual_shifts.items()]
+    def write(conn):
+        conn.execute(DELETE_SCHEDULE, (store, period))
+        conn.executemany(INSERT_SCHEDULE, schedule_rows)
+        conn.execute(DELETE_MANUAL_SHIFTS, (store, period))
+        conn.executemany(INSERT_MANUAL_SHIFT, manual_rows)
+        conn.execute(DELETE_BOUNDARY_STATE, (store, period))
+    run_in_transaction(write, db_path)
+    return schedule, manual_shifts
+
+
+# Trạng thái của lần xếp lịch chạy nền
+JOB_STATUSES = {"queued": "Đang chờ", "running": "Đang chạy", "done": "Hoàn tất", "failed": "Lỗi",
+                "cancelled": "Đã hủy"}
+ACTIVE_JOB_STATUSES = ("queued", "running")
+JOB_COLUMNS = ("id", "store", "period", "department", "status", "progress", "message", "best_fitness",
+               "cancel_requested", "created_at", "started_at", "finished_at", "details")
+SELECT_JOB = f'SELECT {", ".join(JOB_COLUMNS)} FROM solver_jobs'
+
+
+# Hàm chuyển một dòng của bảng solver_jobs thành dict
+def _job_from_row(row):
+    job = dict(zip(JOB_COLUMNS, row))
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    job["details"] = json.loads(job["details"]) if job["details"] else []
+    return job
+
+
+# Hàm tạo một lần xếp lịch chạy nền (trạng thái "queued") cho một bộ phận của kỳ, trả về id
+def create_solver_job(month_days, department, store=DEFAULT_STORE, db_path=DB_PATH):
+    row = (store, period_key(month_days), department, "queued", datetime.now().isoformat(timespec="seconds"))
+    return run_in_transaction(lambda conn: conn.execute(
+        'INSERT INTO solver_jobs (store, period, department, status, created_at) VALUES (?, ?, ?, ?, ?)',
+        row).lastrowid, db_path)
+
+
+# Hàm chuyển lần chạy sang "running"; nếu đã có yêu cầu hủy khi còn chờ thì chuyển sang "cancelled".
+# Trả về True nếu lần chạy được bắt đầu.
+def start_solver_job(job_id, db_path=DB_PATH):
+    now = datetime.now().isoformat(timespec="seconds")
+    def write(conn):
+        conn.execute("UPDATE solver_jobs SET status = 'cancelled', finished_at = ? "
+                     "WHERE id = ? AND status = 'queued' AND cancel_requested = 1", (now, job_id))
+        return conn.execute("UPDATE solver_jobs SET status = 'running', started_at = ? "
+                            "WHERE id = ? AND status = 'queued'", (now, job_id)).rowcount == 1
+    return run_in_transaction(write, db_path)
+
+
+# Hàm cập nhật tiến độ của lần chạy, trả về True nếu đã có yêu cầu hủy
+def update_solver_job_progress(job_id, progress, message, best_fitness=None, db_path=DB_PATH):
+    def write(conn):
+        conn.execute('UPDATE solver_jobs SET progress = ?, message = ?, best_fitness = COALESCE(?, best_fitness) '
+                     'WHERE id = ?', (progress, message, best_fitness, job_id))
+        return bool(conn.execute('SELECT cancel_requested FROM solver_jobs WHERE id = ?', (job_id,)).fetchone()[0])
+    return run_in_transaction(write, db_path)
+
+
+# Hàm kết thúc lần chạy với trạng thái status ("done", "failed" hoặc "cancelled")
+def finish_solver_job(job_id, status, message, best_fitness=None, details=(), db_path=DB_PATH):
+    row = (status, 1.0 if status == "done" else None, message, best_fitness, json.dumps(list(details)),
+           datetime.now().isoformat(timespec="seconds"), job_id)
+    run_in_transaction(lambda conn: conn.execute(
+        'UPDATE solver_jobs SET status = ?, progress = COALESCE(?, progress), message = ?, best_fitness = ?, '
+        'details = ?, finished_at = ? WHERE id = ?', row), db_path)
+
+
+# Hàm yêu cầu hủy một lần chạy chưa kết thúc; trả về True nếu lần chạy còn đang chờ hoặc đang chạy
+def request_solver_job_cancel(job_id, db_path=DB_PATH):
+    return run_in_transaction(lambda conn: conn.execute(
+        "UPDATE solver_jobs SET cancel_requested = 1 WHERE id = ? AND status IN ('queued', 'running')",
+        (job_id,)).rowcount == 1, db_path)
+
+
+# Hàm đánh dấu lỗi các lần chạy còn "queued"/"running" (tiến trình chạy chúng đã dừng), trả về số lần chạy
+def fail_interrupted_solver_jobs(db_path=DB_PATH):
+    row = ("Bị gián đoạn do ứng dụng khởi động lại", datetime.now().isoformat(timespec="seconds"))
+    return run_in_transaction(lambda conn: conn.execute(
+        "UPDATE solver_jobs SET status = 'failed', message = ?, finished_at = ? "
+        "WHERE status IN ('queued', 'running')", row).rowcount, db_path)
+
+
+# Hàm tải một lần chạy (None nếu không có)
+def load_solver_job(job_id, db_path=DB_PATH):
+    rows = fetch_all(f'{SELECT_JOB} WHERE id = ?', (job_id,), db_path)
+    return _job_from_row(rows[0]) if rows else None
+
+
+# Hàm liệt kê các lần chạy của một kỳ, mới nhất trước; active_only chỉ lấy lần chạy đang chờ hoặc đang chạy
+def list_solver_jobs(month_days, store=DEFAULT_STORE, active_only=False, limit=20, db_path=DB_PATH):
+    query = f'{SELECT_JOB} WHERE store = ? AND period = ?'
+    if active_only:
+        query += f" AND status IN ({', '.join(repr(status) for status in ACTIVE_JOB_STATUSES)})"
+    rows = fetch_all(query + ' ORDER BY id DESC LIMIT ?', (store, period_key(month_days), limit), db_path)
+    return [_job_from_row(row) for row in rows]
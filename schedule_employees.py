@@ -0,0 +1,60 @@
+from dataclasses import dataclass, field
+import pandas as pd
+
+# Các cột bắt buộc của file nhân viên và các giá trị hợp lệ
+EMPLOYEE_COLUMNS = ["ID", "Họ Tên", "Cấp bậc", "Bộ phận"]
+RANKS = ["Junior", "Senior", "Manager"]
+DEPARTMENTS = ["Cashier", "Customer Service"]
+
+# Lý do loại một dòng khi import (kiểm tra theo thứ tự, mỗi dòng chỉ ghi lý do đầu tiên)
+REJECT_MISSING_ID = "Thiếu ID"
+REJECT_MISSING_NAME = "Thiếu Họ Tên"
+REJECT_RANK = f"Cấp bậc không hợp lệ (chỉ chấp nhận {', '.join(RANKS)})"
+REJECT_DEPARTMENT = f"Bộ phận không hợp lệ (chỉ chấp nhận {', '.join(DEPARTMENTS)})"
+REJECT_DUPLICATE_ID = "ID trùng với dòng trước trong file"
+
+
+# Kết quả đọc một file nhân viên: các nhân viên hợp lệ (theo thứ tự trong file) và bảng các dòng bị loại
+# (số dòng trong file, ID, lý do)
+@dataclass
+class EmployeeImport:
+    employees: list = field(default_factory=list)
+    rejected: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=["Dòng", "ID", "Lý do"]))
+
+
+# Hàm kiểm tra bảng nhân viên bằng các phép toán theo cột: chuẩn hóa chuỗi, đánh dấu lý do loại cho mọi dòng
+# không hợp lệ cùng lúc (thiếu ID/Họ Tên, cấp bậc/bộ phận sai, ID trùng trong file), trả về EmployeeImport
+def parse_employee_frame(df, source="file CSV"):
+    missing = [col for col in EMPLOYEE_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"{source}: file CSV phải chứa các cột: {', '.join(EMPLOYEE_COLUMNS)}")
+    df = df[EMPLOYEE_COLUMNS].astype("string").apply(lambda column: column.str.strip()).fillna("")
+
+    reason = pd.Series("", index=df.index, dtype="string")
+    checks = [
+        (df["ID"] == "", REJECT_MISSING_ID),
+        (df["Họ Tên"] == "", REJECT_MISSING_NAME),
+        (~df["Cấp bậc"].isin(RANKS), REJECT_RANK),
+        (~df["Bộ phận"].isin(DEPARTMENTS), REJECT_DEPARTMENT),
+    ]
+    for mask, text in checks:
+        reason = reason.mask(mask & (reason == ""), text)
+    # Chỉ dòng hợp lệ đầu tiên của mỗi ID được giữ
+    duplicated = (reason == "") & df["ID"].where(reason == "").duplicated(keep="first")
+    reason = reason.mask(duplicated, REJECT_DUPLICATE_ID)
+
+    valid = reason == ""
+    rejected = pd.DataFrame({
+        # Dòng 1 là tiêu đề
+        "Dòng": df.index[~valid] + 2,
+        "ID": df.loc[~valid, "ID"].to_numpy(),
+        "Lý do": reason[~valid].to_numpy()
+    })
+    return EmployeeImport(df[valid].to_dict("records"), rejected.reset_index(drop=True))
+
+
+# Hàm đọc file CSV nhân viên (đường dẫn hoặc file tải lên); mọi cột được đọc dạng chuỗi để ID như "007" giữ nguyên
+def read_employees_csv(source):
+    return parse_employee_frame(pd.read_csv(source, dtype=str, keep_default_na=False),
+                                getattr(source, "name", source))
+
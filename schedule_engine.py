@@ -0,0 +1,2235 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from functools import lru_cache
+import heapq
+import logging
+import math
+import multiprocessing
+import time
+import numpy as np
+
+# Trọng số vi phạm (dùng chung cho calculate_fitness và bộ đánh giá tăng dần)
+HARD_CONSTRAINT_WEIGHT = 10_000_000
+SOFT_CONSTRAINT_WEIGHT = 1_000
+
+# Các mã nghỉ (không tính là ngày làm việc)
+OFF_SHIFTS = ("PRD", "AL", "NPL")
+
+# Danh sách ngày lễ
+HOLIDAYS = [
+    "01/01", "03/02", "08/03", "26/03", "30/04", "01/05",
+    "01/06", "27/07", "02/09", "10/10", "20/10", "20/11", "22/12", "24/12"
+]
+
+# Hàm kiểm tra ngày lễ
+def is_holiday(date):
+    return date.strftime("%d/%m") in HOLIDAYS
+
+# Hàm kiểm tra ngày không hợp lệ cho PRD
+def is_invalid_prd_day(date):
+    day = date.day
+    return day in [5, 20] or date.weekday() in [5, 6] or is_holiday(date)
+
+# Hàm tạo danh sách các ca hợp lệ
+def get_valid_shifts():
+    shifts = []
+    for code in range(14, 26):  # VX: 7h00 đến 12h30
+        shifts.append(f"VX{code:02d}")
+    for code in range(14, 30):  # V8: 7h00 đến 14h30
+        shifts.append(f"V8{code:02d}")
+    for code in range(14, 34):  # V6: 7h00 đến 16h30
+        shifts.append(f"V6{code:02d}")
+    return shifts
+
+# Hàm lấy giờ bắt đầu từ mã ca
+@lru_cache(maxsize=10000)
+def get_shift_start_hour(shift):
+    if shift in ["PRD", "AL", "NPL", ""]:
+        return None
+    code = int(shift[2:4])
+    start_hour = code / 2
+    return start_hour
+
+# Hàm lấy giờ kết thúc từ mã ca
+@lru_cache(maxsize=10000)
+def get_shift_end_hour(shift):
+    if shift in ["PRD", "AL", "NPL", ""]:
+        return None
+    start_hour = get_shift_start_hour(shift)
+    if shift.startswith("VX"):
+        return start_hour + 10
+    elif shift.startswith("V8"):
+        return start_hour + 8
+    elif shift.startswith("V6"):
+        return start_hour + 6
+    return None
+
+# Hàm lấy danh sách mã ca mặc định theo bộ phận
+def get_default_shifts(department):
+    all_shifts = get_valid_shifts()
+    cs_shifts = ["V633", "V614", "V616", "V618", "V620", "V814", "V816", "V818", "V820", "V829", "VX22", "VX25", "PRD"]
+    if department == "Customer Service":
+        return cs_shifts
+    elif department == "Cashier":
+        return all_shifts + ["PRD"]
+    else:  # Tất cả
+        return list(set(all_shifts + cs_shifts))
+
+# Hàm tạo danh sách ngày của kỳ lịch tháng: từ ngày 26 của tháng đến ngày 25 của tháng sau
+def get_month_days(year, month):
+    start_date = datetime(year, month, 26)
+    end_date = datetime(year, month + 1, 25) if month < 12 else datetime(year + 1, 1, 25)
+    return [start_date + timedelta(days=x) for x in range((end_date - start_date).days + 1)]
+
+# Hàm tạo danh sách ngày của kỳ liền trước kỳ month_days
+def get_previous_month_days(month_days):
+    start = month_days[0]
+    return get_month_days(start.year, start.month - 1) if start.month > 1 else get_month_days(start.year - 1, 12)
+
+# Hàm tính điểm vi phạm của một chuỗi làm việc liên tục dài run_length ngày
+def run_penalty(run_length):
+    if run_length <= 7:
+        return 0
+    return HARD_CONSTRAINT_WEIGHT * (run_length - 7) * (run_length - 6) // 2
+
+
+
+# Bảng mã ca dạng số nguyên (int8): 0 = ô trống, 1-3 = PRD/AL/NPL, từ 4 trở đi là các ca làm việc
+SHIFT_CODES = [""] + list(OFF_SHIFTS) + get_valid_shifts()
+SHIFT_INDEX = {shift: code for code, shift in enumerate(SHIFT_CODES)}
+NUM_SHIFT_CODES = len(SHIFT_CODES)
+EMPTY, PRD, AL, NPL = 0, 1, 2, 3
+
+# Nhóm ca
+FAMILY_OFF, FAMILY_VX, FAMILY_V8, FAMILY_V6 = 0, 1, 2, 3
+
+# Slot ca bắt buộc Customer Service
+CS_SLOT_NONE, CS_SLOT_14, CS_SLOT_18, CS_SLOT_29_33 = 0, 1, 2, 3
+
+# Hàm dựng các mảng thuộc tính theo mã ca từ get_valid_shifts
+def build_shift_table():
+    start_hour = np.full(NUM_SHIFT_CODES, np.nan)
+    end_hour = np.full(NUM_SHIFT_CODES, np.nan)
+    family = np.zeros(NUM_SHIFT_CODES, dtype=np.int8)
+    cs_slot = np.zeros(NUM_SHIFT_CODES, dtype=np.int8)
+    for code, shift in enumerate(SHIFT_CODES):
+        if get_shift_start_hour(shift) is not None:
+            start_hour[code] = get_shift_start_hour(shift)
+            end_hour[code] = get_shift_end_hour(shift)
+        family[code] = {"VX": FAMILY_VX, "V8": FAMILY_V8, "V6": FAMILY_V6}.get(shift[:2], FAMILY_OFF)
+        if shift in ["V814", "V614"]:
+            cs_slot[code] = CS_SLOT_14
+        elif shift in ["V818", "V618"]:
+            cs_slot[code] = CS_SLOT_18
+        elif shift in ["V829", "V633"]:
+            cs_slot[code] = CS_SLOT_29_33
+    is_work = ~np.isnan(start_hour)
+    is_morning = is_work & (np.nan_to_num(start_hour, nan=24) < 12)
+    return start_hour, end_hour, family, is_work, is_morning, cs_slot
+
+SHIFT_START, SHIFT_END, SHIFT_FAMILY, SHIFT_IS_WORK, SHIFT_IS_MORNING, SHIFT_CS_SLOT = build_shift_table()
+SHIFT_IS_OFF = np.isin(np.arange(NUM_SHIFT_CODES), [PRD, AL, NPL])
+V633 = SHIFT_INDEX["V633"]
+
+# Hàm dựng các bảng cặp ca [ca hôm trước, ca hôm sau] từ giờ bắt đầu/kết thúc của từng mã ca
+def build_pair_tables():
+    both_work = SHIFT_IS_WORK[:, np.newaxis] & SHIFT_IS_WORK[np.newaxis, :]
+    # Các ngày trong kỳ liên tiếp nhau nên giãn cách = 24h - giờ kết thúc ca trước + giờ bắt đầu ca sau
+    rest_gap = 24 - SHIFT_END[:, np.newaxis] + SHIFT_START[np.newaxis, :]
+    rest_violation = both_work & (np.nan_to_num(rest_gap, nan=24) < 10)
+    is_vx = SHIFT_FAMILY == FAMILY_VX
+    is_v6 = SHIFT_FAMILY == FAMILY_V6
+    consecutive_vx = is_vx[:, np.newaxis] & is_vx[np.newaxis, :]
+    consecutive_v6 = is_v6[:, np.newaxis] & is_v6[np.newaxis, :]
+    consecutive_off = SHIFT_IS_OFF[:, np.newaxis] & SHIFT_IS_OFF[np.newaxis, :]
+    return rest_violation, consecutive_vx, consecutive_v6, consecutive_off
+
+REST_VIOLATION, CONSECUTIVE_VX, CONSECUTIVE_V6, CONSECUTIVE_OFF = build_pair_tables()
+
+# Điểm vi phạm giữa hai mã ca liền kề [ca hôm trước, ca hôm sau]
+PAIR_PENALTY = (HARD_CONSTRAINT_WEIGHT * (REST_VIOLATION.astype(np.int64) + CONSECUTIVE_VX + CONSECUTIVE_OFF)
+                + SOFT_CONSTRAINT_WEIGHT * CONSECUTIVE_V6.astype(np.int64))
+
+# Bản sao dạng list để truy cập từng ô nhanh trong vòng lặp Python
+_IS_WORK = SHIFT_IS_WORK.tolist()
+_IS_MORNING = SHIFT_IS_MORNING.tolist()
+_FAMILY = SHIFT_FAMILY.tolist()
+_CS_SLOT = SHIFT_CS_SLOT.tolist()
+_PAIR_PENALTY = PAIR_PENALTY.tolist()
+
+# Hàm chuyển lịch dạng dict[emp_id] -> list[str] sang mảng mã ca (số nhân viên, số ngày)
+def encode_schedule(schedule, emp_ids, num_days):
+    codes = np.zeros((len(emp_ids), num_days), dtype=np.int8)
+    for e, emp_id in enumerate(emp_ids):
+        shifts = schedule.get(emp_id)
+        if shifts:
+            codes[e, :len(shifts)] = [SHIFT_INDEX[shift] for shift in shifts[:num_days]]
+    return codes
+
+# Hàm chuyển mảng mã ca về lịch dạng dict[emp_id] -> list[str]
+def decode_schedule(codes, emp_ids):
+    return {emp_id: [SHIFT_CODES[code] for code in row] for emp_id, row in zip(emp_ids, codes.tolist())}
+
+# Hàm tính trạng thái cuối kỳ của từng nhân viên từ lịch một kỳ: dict[emp_id] -> (số ngày làm việc liên tục
+# tính đến ngày cuối kỳ, ca ngày cuối kỳ). Kỳ sau dùng trạng thái này để kiểm tra ràng buộc qua ranh giới kỳ
+# mà không cần tải lại cả lịch kỳ trước.
+def summarize_boundary(schedule):
+    boundary = {}
+    for emp_id, shifts in schedule.items():
+        if not shifts:
+            continue
+        trailing_run = 0
+        for shift in reversed(shifts):
+            if shift in ["PRD", "AL", "NPL", ""]:
+                break
+            trailing_run += 1
+        boundary[emp_id] = (trailing_run, shifts[-1])
+    return boundary
+
+# Hàm chuyển lịch kỳ trước sang kỳ month_days để làm lịch khởi tạo: mỗi ngày lấy ca của ngày cùng thứ
+# trong kỳ trước (giữ mẫu ca theo tuần). AL/NPL không được chép vì chỉ được nhập tay.
+def align_previous_schedule(previous_schedule, month_days):
+    aligned = {}
+    for emp_id, shifts in previous_schedule.items():
+        previous_length = len(shifts)
+        if previous_length < 7:
+            continue
+        row = []
+        for day in range(len(month_days)):
+            source_day = day + previous_length % 7
+            while source_day >= previous_length:
+                source_day -= 7
+            shift = shifts[source_day]
+            row.append("" if shift in ["AL", "NPL"] else shift)
+        aligned[emp_id] = row
+    return aligned
+
+
+# Bộ phận được xếp lịch chung và các cấp bậc chỉ nhận ca sáng
+ALL_DEPARTMENTS = "Tất cả"
+CUSTOMER_SERVICE = "Customer Service"
+MORNING_ONLY_RANKS = ["Senior", "Manager"]
+
+
+# Danh bạ nhân viên có chỉ mục: danh sách nhân viên (dict như trong DB) kèm chỉ mục ID -> vị trí, tập vị trí theo
+# bộ phận và cấp bậc, mặt nạ CS/chỉ ca sáng dạng mảng và danh sách ca được phép của từng nhân viên (tính một lần cho
+# mỗi danh sách ca đã chọn). Dùng được ở mọi chỗ nhận danh sách nhân viên (duyệt, len, lấy theo vị trí); tập con
+# theo bộ phận cũng là một danh bạ và được giữ lại đến khi bộ phận đó thay đổi. Giao diện và bộ xếp lịch dùng chung
+# một đối tượng; mọi thay đổi đi qua add/update/remove/upsert để chỉ mục luôn đúng. Thêm và cập nhật một nhân viên
+# chỉ sửa các mục liên quan (mặt nạ có dung lượng dự trữ, tăng gấp đôi khi đầy); xóa làm dịch vị trí các nhân viên
+# phía sau nên dựng lại chỉ mục.
+class EmployeeRegistry:
+    def __init__(self, employees=()):
+        self.employees = list(employees)
+        self._reindex()
+
+    # Hàm trả về employees nếu đã là danh bạ, nếu không thì dựng danh bạ từ danh sách
+    @classmethod
+    def of(cls, employees):
+        return employees if isinstance(employees, cls) else cls(employees)
+
+    def _reindex(self):
+        self.ids = [emp["ID"] for emp in self.employees]
+        self.index = {emp_id: i for i, emp_id in enumerate(self.ids)}
+        self.by_department = {}
+        self.by_rank = {}
+        self._is_cs = np.zeros(len(self.employees), dtype=bool)
+        self._morning_only = np.zeros(len(self.employees), dtype=bool)
+        for i, emp in enumerate(self.employees):
+            self._index_employee(i, emp)
+        self._subsets = {}
+        self._shift_pools = {}
+
+    # Hàm ghi nhân viên emp ở vị trí i vào chỉ mục bộ phận/cấp bậc và các mặt nạ
+    def _index_employee(self, i, emp):
+        self.by_department.setdefault(emp["Bộ phận"], set()).add(i)
+        self.by_rank.setdefault(emp["Cấp bậc"], set()).add(i)
+        self._is_cs[i] = emp["Bộ phận"] == CUSTOMER_SERVICE
+        self._morning_only[i] = emp["Cấp bậc"] in MORNING_ONLY_RANKS
+
+    # Hàm bỏ nhân viên emp ở vị trí i khỏi chỉ mục bộ phận/cấp bậc
+    def _unindex_employee(self, i, emp):
+        self.by_department[emp["Bộ phận"]].discard(i)
+        self.by_rank[emp["Cấp bậc"]].discard(i)
+
+    # Hàm nới dung lượng mặt nạ để chứa thêm một nhân viên
+    def _reserve(self):
+        if len(self.employees) < len(self._is_cs):
+            return
+        capacity = max(2 * len(self._is_cs), 16)
+        for name in ("_is_cs", "_morning_only"):
+            grown = np.zeros(capacity, dtype=bool)
+            grown[:len(self.employees)] = getattr(self, name)[:len(self.employees)]
+            setattr(self, name, grown)
+
+    # Mặt nạ nhân viên Customer Service / chỉ nhận ca sáng theo vị trí
+    @property
+    def is_cs(self):
+        return self._is_cs[:len(self.employees)]
+
+    @property
+    def morning_only(self):
+        return self._morning_only[:len(self.employees)]
+
+    def __len__(self):
+        return len(self.employees)
+
+    def __iter__(self):
+        return iter(self.employees)
+
+    def __getitem__(self, i):
+        return self.employees[i]
+
+    # Hàm lấy nhân viên theo ID, None nếu không có
+    def get(self, emp_id):
+        i = self.index.get(emp_id)
+        return None if i is None else self.employees[i]
+
+    # Hàm lấy danh bạ con của một bộ phận ("Tất cả" là toàn bộ danh bạ), giữ nguyên thứ tự
+    def department(self, department):
+        if department == ALL_DEPARTMENTS:
+            return self
+        if department not in self._subsets:
+            self._subsets[department] = EmployeeRegistry(
+                self.employees[i] for i in sorted(self.by_department.get(department, ())))
+        return self._subsets[department]
+
+    # Hàm đếm số nhân viên của một bộ phận
+    def count(self, department):
+        return len(self) if department == ALL_DEPARTMENTS else len(self.by_department.get(department, ()))
+
+    # Hàm trả về (danh sách mảng mã ca được phép, danh sách tập mã ca được phép) theo vị trí nhân viên:
+    # Senior/Manager chỉ nhận ca sáng. Các nhân viên cùng loại dùng chung một mảng.
+    def shift_pools(self, selected_shifts):
+        key = tuple(selected_shifts)
+        if key not in self._shift_pools:
+            work_pool = np.array([SHIFT_INDEX[s] for s in selected_shifts if s not in OFF_SHIFTS], dtype=np.int8)
+            morning_pool = work_pool[SHIFT_IS_MORNING[work_pool]]
+            work_set, morning_set = set(work_pool.tolist()), set(morning_pool.tolist())
+            morning_only = self.morning_only.tolist()
+            self._shift_pools[key] = ([morning_pool if m else work_pool for m in morning_only],
+                                      [morning_set if m else work_set for m in morning_only])
+        return self._shift_pools[key]
+
+    # Hàm thêm một nhân viên, trả về False nếu ID đã tồn tại
+    def add(self, emp):
+        if emp["ID"] in self.index:
+            return False
+        self._reserve()
+        i = len(self.employees)
+        self.employees.append(emp)
+        self.ids.append(emp["ID"])
+        self.index[emp["ID"]] = i
+        self._index_employee(i, emp)
+        self._subsets.pop(emp["Bộ phận"], None)
+        self._shift_pools = {}
+        return True
+
+    # Hàm cập nhật nhân viên emp_id (có thể đổi ID), trả về False nếu ID mới trùng nhân viên khác
+    def update(self, emp_id, emp):
+        if emp["ID"] != emp_id and emp["ID"] in self.index:
+            return False
+        i = self.index.pop(emp_id)
+        old = self.employees[i]
+        self._unindex_employee(i, old)
+        self.employees[i] = emp
+        self.ids[i] = emp["ID"]
+        self.index[emp["ID"]] = i
+        self._index_employee(i, emp)
+        self._subsets.pop(old["Bộ phận"], None)
+        self._subsets.pop(emp["Bộ phận"], None)
+        if (old["Cấp bậc"] in MORNING_ONLY_RANKS) != (emp["Cấp bậc"] in MORNING_ONLY_RANKS):
+            self._shift_pools = {}
+        return True
+
+    # Hàm xóa nhân viên theo ID
+    def remove(self, emp_id):
+        if emp_id in self.index:
+            del self.employees[self.index[emp_id]]
+            self._reindex()
+
+    # Hàm gộp một lô nhân viên theo ID: ID đã có được cập nhật tại chỗ, ID mới được thêm vào cuối.
+    # Trả về (số nhân viên thêm mới, số nhân viên cập nhật)
+    def upsert(self, employees):
+        added = 0
+        for emp in employees:
+            i = self.index.get(emp["ID"])
+            if i is None:
+                self.index[emp["ID"]] = len(self.employees)
+                self.employees.append(emp)
+                added += 1
+            else:
+                self.employees[i] = emp
+        self._reindex()
+        return added, len(employees) - added
+
+
+# Bài toán đã mã hóa: toàn bộ dữ liệu đầu vào mà lõi GA cần, ở dạng mảng
+class EncodedProblem:
+    def __init__(self, employees, month_days, sundays, vx_min, balance_morning_evening,
+                 max_morning_evening_diff, manual_shifts, selected_shifts, warm_start=None, boundary=None):
+        # Sao chép chỉ mục của danh bạ: danh bạ có thể được sửa tại chỗ sau khi bài toán đã mã hóa
+        registry = EmployeeRegistry.of(employees)
+        self.emp_ids = list(registry.ids)
+        self.emp_index = dict(registry.index)
+        self.num_employees = len(employees)
+        self.num_days = len(month_days)
+        self.num_sundays = len(sundays)
+        self.vx_min = vx_min
+        self.balance_morning_evening = balance_morning_evening
+        self.max_morning_evening_diff = max_morning_evening_diff
+
+        # Ô nhập tay: bị khóa, không bị GA thay đổi và được miễn một số ràng buộc
+        self.manual_mask = np.zeros((self.num_employees, self.num_days), dtype=bool)
+        self.manual_codes = np.zeros((self.num_employees, self.num_days), dtype=np.int8)
+        for (emp_id, day), shift in manual_shifts.items():
+            if emp_id in self.emp_index and day < self.num_days:
+                self.manual_mask[self.emp_index[emp_id], day] = True
+                self.manual_codes[self.emp_index[emp_id], day] = SHIFT_INDEX[shift]
+
+        self.selected_mask = np.zeros(NUM_SHIFT_CODES, dtype=bool)
+        self.selected_mask[[SHIFT_INDEX[s] for s in selected_shifts if s in SHIFT_INDEX]] = True
+        self.invalid_prd_days = np.array([is_invalid_prd_day(d) for d in month_days], dtype=bool)
+        self.is_cs = registry.is_cs.copy()
+
+        # Danh sách ca được phép theo nhân viên (Senior/Manager chỉ nhận ca sáng), lấy từ danh bạ
+        self.shift_pools, self.pool_sets = registry.shift_pools(selected_shifts)
+
+        # Chế độ sửa chữa của local_repair: "conflict" (theo ô vi phạm, có hoán đổi và tabu) hoặc "random"
+        self.repair_mode = REPAIR_MODE
+
+        # Trạng thái cuối kỳ trước (số ngày làm liên tục, mã ca ngày cuối), 0 nếu không có dữ liệu
+        self.boundary_run = np.zeros(self.num_employees, dtype=np.int64)
+        self.boundary_code = np.zeros(self.num_employees, dtype=np.int8)
+        for emp_id, (trailing_run, last_shift) in (boundary or {}).items():
+            if emp_id in self.emp_index:
+                self.boundary_run[self.emp_index[emp_id]] = trailing_run
+                self.boundary_code[self.emp_index[emp_id]] = SHIFT_INDEX.get(last_shift, EMPTY)
+
+        # Lịch khởi tạo cho warm start dạng mảng (ô nhập tay luôn lấy theo ca nhập tay), None nếu không dùng
+        self.warm_start_codes = None
+        if warm_start:
+            codes = encode_schedule(warm_start, self.emp_ids, self.num_days)
+            self.warm_start_codes = np.where(self.manual_mask, self.manual_codes, codes)
+
+
+# Hàm tính độ dài chuỗi làm việc liên tục tính đến từng ngày (theo trục cuối)
+def run_lengths(work):
+    counts = np.cumsum(work, axis=-1)
+    resets = np.maximum.accumulate(np.where(work, 0, counts), axis=-1)
+    return counts - resets
+
+# Hàm tính độ dài chuỗi làm việc liên tục tính đến từng ngày của mảng mã ca (..., số nhân viên, số ngày),
+# chuỗi đầu kỳ được cộng thêm số ngày làm liên tục cuối kỳ trước
+def boundary_run_lengths(codes, problem):
+    work = SHIFT_IS_WORK[codes]
+    leading = np.logical_and.accumulate(work, axis=-1)
+    return run_lengths(work) + leading * problem.boundary_run[:, np.newaxis]
+
+# Hàm tính số ca VX, V6, PRD, sáng, tối của từng nhân viên
+def employee_counts(codes):
+    family = SHIFT_FAMILY[codes]
+    work = SHIFT_IS_WORK[codes]
+    morning = SHIFT_IS_MORNING[codes]
+    return np.stack([
+        np.count_nonzero(family == FAMILY_VX, axis=-1),
+        np.count_nonzero(family == FAMILY_V6, axis=-1),
+        np.count_nonzero(codes == PRD, axis=-1),
+        np.count_nonzero(morning, axis=-1),
+        np.count_nonzero(work & ~morning, axis=-1),
+    ], axis=-1)
+
+# Hàm tính số ca 14, 18, 29/33 và V633 của Customer Service theo từng ngày
+def cs_day_counts(codes, is_cs):
+    cs_codes = codes[..., is_cs, :]
+    slot = SHIFT_CS_SLOT[cs_codes]
+    return np.stack([
+        np.count_nonzero(slot == CS_SLOT_14, axis=-2),
+        np.count_nonzero(slot == CS_SLOT_18, axis=-2),
+        np.count_nonzero(slot == CS_SLOT_29_33, axis=-2),
+        np.count_nonzero(cs_codes == V633, axis=-2),
+    ], axis=-1)
+
+# Hàm tính điểm vi phạm theo số lượng ca của từng nhân viên
+def employee_penalties(counts, problem):
+    vx_count, v6_count, prd_count, morning_count, evening_count = np.moveaxis(counts.astype(np.int64), -1, 0)
+    penalty = HARD_CONSTRAINT_WEIGHT * np.abs(vx_count - v6_count)
+    penalty += HARD_CONSTRAINT_WEIGHT * np.maximum(problem.vx_min - vx_count, 0)
+    penalty += HARD_CONSTRAINT_WEIGHT * np.abs(prd_count - problem.num_sundays) * 2
+    if problem.balance_morning_evening:
+        diff = np.abs(morning_count - evening_count)
+        penalty += SOFT_CONSTRAINT_WEIGHT * np.maximum(diff - problem.max_morning_evening_diff, 0)
+    return penalty
+
+# Hàm tính điểm vi phạm ca bắt buộc Customer Service của từng ngày
+def cs_day_penalties(counts):
+    count_14, count_18, count_29_33, count_633 = np.moveaxis(counts.astype(np.int64), -1, 0)
+    penalty = HARD_CONSTRAINT_WEIGHT * (np.abs(count_14 - 1) + np.abs(count_18 - 1) + np.abs(count_29_33 - 2))
+    penalty += HARD_CONSTRAINT_WEIGHT * np.maximum(count_633 - 1, 0)
+    return penalty
+
+# Hàm tính điểm vi phạm chỉ phụ thuộc vào từng ô
+def cell_penalties(codes, problem):
+    invalid = (codes == EMPTY) | (codes == AL) | (codes == NPL)
+    invalid |= (codes == PRD) & problem.invalid_prd_days
+    invalid |= SHIFT_IS_WORK[codes] & ~problem.selected_mask[codes]
+    return HARD_CONSTRAINT_WEIGHT * (invalid & ~problem.manual_mask)
+
+# Hàm tính fitness cho cả quần thể dạng mảng (số cá thể, số nhân viên, số ngày) trong một lần gọi,
+# mỗi ràng buộc được tính bằng phép rút gọn NumPy; trả về vector fitness khớp với calculate_fitness.
+# Chuỗi làm việc và cặp ca ngày đầu kỳ được tính nối tiếp trạng thái cuối kỳ trước.
+def batch_fitness(population, problem):
+    codes = population.astype(np.intp)
+    over = np.maximum(boundary_run_lengths(codes, problem) - 7, 0)
+    total = HARD_CONSTRAINT_WEIGHT * over.sum(axis=(-2, -1), dtype=np.int64)
+    total += PAIR_PENALTY[codes[..., :-1], codes[..., 1:]].sum(axis=(-2, -1))
+    total += PAIR_PENALTY[problem.boundary_code, codes[..., 0]].sum(axis=-1)
+    total += cell_penalties(codes, problem).sum(axis=(-2, -1), dtype=np.int64)
+    total += employee_penalties(employee_counts(codes), problem).sum(axis=-1)
+    total += cs_day_penalties(cs_day_counts(codes, problem.is_cs)).sum(axis=-1)
+    return total
+
+# Hàm tính fitness của một lịch dạng mảng (số nhân viên, số ngày)
+def array_fitness(codes, problem):
+    return int(batch_fitness(codes[np.newaxis], problem)[0])
+
+
+# Bộ đánh giá fitness tăng dần: giữ trạng thái ràng buộc theo nhân viên và theo ngày,
+# trả về độ thay đổi fitness khi đổi một ô (nhân viên, ngày) mà không tính lại toàn bộ lịch.
+# Kết quả luôn khớp với calculate_fitness (hàm tham chiếu).
+class IncrementalFitness:
+    def __init__(self, codes, problem):
+        self.codes = codes
+        self.problem = problem
+        self.num_days = problem.num_days
+        self.rows = codes.tolist()
+        self.manual = problem.manual_mask.tolist()
+        self.selected = problem.selected_mask.tolist()
+        self.invalid_prd_days = problem.invalid_prd_days.tolist()
+        self.is_cs = problem.is_cs.tolist()
+        self.boundary_run = problem.boundary_run.tolist()
+        self.boundary_code = problem.boundary_code.tolist()
+
+        # Bộ đếm theo nhân viên: VX, V6, PRD, sáng, tối
+        self.emp_counts = employee_counts(codes).tolist()
+        # Bộ đếm theo ngày cho Customer Service: 14, 18, 29/33, V633
+        self.day_counts = cs_day_counts(codes, problem.is_cs).tolist()
+        self.emp_penalties = [self._emp_penalty(counts) for counts in self.emp_counts]
+        self.day_penalties = [self._day_penalty(counts) for counts in self.day_counts]
+        self.total = array_fitness(codes, problem)
+
+    # Cập nhật bộ đếm khi thêm (sign=1) hoặc bỏ (sign=-1) một ca
+    def _count(self, e, day, code, sign):
+        counts = self.emp_counts[e]
+        family = _FAMILY[code]
+        if family == FAMILY_VX:
+            counts[0] += sign
+        elif family == FAMILY_V6:
+            counts[1] += sign
+        if code == PRD:
+            counts[2] += sign
+        if _IS_WORK[code]:
+            counts[3 if _IS_MORNING[code] else 4] += sign
+        if self.is_cs[e] and _CS_SLOT[code]:
+            day_counts = self.day_counts[day]
+            day_counts[_CS_SLOT[code] - 1] += sign
+            if code == V633:
+                day_counts[3] += sign
+
+    # Điểm vi phạm chỉ phụ thuộc vào một ô
+    def cell_penalty(self, e, day, code):
+        if self.manual[e][day]:
+            return 0
+        if code in (EMPTY, AL, NPL):
+            return HARD_CONSTRAINT_WEIGHT
+        if code == PRD:
+            return HARD_CONSTRAINT_WEIGHT if self.invalid_prd_days[day] else 0
+        return 0 if self.selected[code] else HARD_CONSTRAINT_WEIGHT
+
+    # Điểm vi phạm theo số lượng ca của một nhân viên
+    def _emp_penalty(self, counts):
+        problem = self.problem
+        vx_count, v6_count, prd_count, morning_count, evening_count = counts
+        penalty = HARD_CONSTRAINT_WEIGHT * abs(vx_count - v6_count)
+        if vx_count < problem.vx_min:
+            penalty += HARD_CONSTRAINT_WEIGHT * (problem.vx_min - vx_count)
+        penalty += HARD_CONSTRAINT_WEIGHT * abs(prd_count - problem.num_sundays) * 2
+        if problem.balance_morning_evening:
+            diff = abs(morning_count - evening_count)
+            if diff > problem.max_morning_evening_diff:
+                penalty += SOFT_CONSTRAINT_WEIGHT * (diff - problem.max_morning_evening_diff)
+        return penalty
+
+    # Điểm vi phạm ca bắt buộc Customer Service của một ngày
+    def _day_penalty(self, counts):
+        count_14, count_18, count_29_33, count_633 = counts
+        penalty = HARD_CONSTRAINT_WEIGHT * (abs(count_14 - 1) + abs(count_18 - 1) + abs(count_29_33 - 2))
+        if count_633 > 1:
+            penalty += HARD_CONSTRAINT_WEIGHT * (count_633 - 1)
+        return penalty
+
+    # Độ dài chuỗi ngày làm việc liền kề bên trái và bên phải của một ô; chuỗi bên trái chạm đầu kỳ
+    # được nối với chuỗi làm việc cuối kỳ trước
+    def _run_sides(self, e, row, day):
+        left = 0
+        d = day - 1
+        while d >= 0 and _IS_WORK[row[d]]:
+            left += 1
+            d -= 1
+        if d < 0:
+            left += self.boundary_run[e]
+        right = 0
+        d = day + 1
+        while d < self.num_days and _IS_WORK[row[d]]:
+            right += 1
+            d += 1
+        return left, right
+
+    # Hàm tính độ thay đổi fitness nếu gán mã ca new_code cho ô (e, day), không thay đổi lịch
+    def delta(self, e, day, new_code):
+        row = self.rows[e]
+        old_code = row[day]
+        if new_code == old_code:
+            return 0
+
+        change = self.cell_penalty(e, day, new_code) - self.cell_penalty(e, day, old_code)
+        previous_code = row[day - 1] if day > 0 else self.boundary_code[e]
+        change += _PAIR_PENALTY[previous_code][new_code] - _PAIR_PENALTY[previous_code][old_code]
+        if day < self.num_days - 1:
+            change += _PAIR_PENALTY[new_code][row[day + 1]] - _PAIR_PENALTY[old_code][row[day + 1]]
+
+        old_work = _IS_WORK[old_code]
+        new_work = _IS_WORK[new_code]
+        if old_work != new_work:
+            left, right = self._run_sides(e, row, day)
+            joined = run_penalty(left + 1 + right)
+            split = run_penalty(left) + run_penalty(right)
+            change += joined - split if new_work else split - joined
+
+        self._count(e, day, old_code, -1)
+        self._count(e, day, new_code, 1)
+        change += self._emp_penalty(self.emp_counts[e]) - self.emp_penalties[e]
+        if self.is_cs[e]:
+            change += self._day_penalty(self.day_counts[day]) - self.day_penalties[day]
+        self._count(e, day, new_code, -1)
+        self._count(e, day, old_code, 1)
+        return change
+
+    # Hàm gán mã ca new_code cho ô (e, day) và cập nhật trạng thái, trả về độ thay đổi fitness
+    def apply(self, e, day, new_code):
+        new_code = int(new_code)
+        if new_code == self.rows[e][day]:
+            return 0
+        change = self.delta(e, day, new_code)
+        self._count(e, day, self.rows[e][day], -1)
+        self._count(e, day, new_code, 1)
+        self.rows[e][day] = new_code
+        self.codes[e, day] = new_code
+        self.emp_penalties[e] = self._emp_penalty(self.emp_counts[e])
+        if self.is_cs[e]:
+            self.day_penalties[day] = self._day_penalty(self.day_counts[day])
+        self.total += change
+        return change
+
+
+# Báo cáo một lần chạy: thời gian theo giai đoạn, bộ đếm và thống kê từng thế hệ.
+# Chỉ chứa dữ liệu thuần nên gửi được qua tiến trình con và gộp lại bằng merge().
+class RunReport:
+    # Tên hiển thị của các giai đoạn, theo thứ tự chạy
+    PHASES = {
+        "cs_fixed": "Phân bổ ca cố định CS",
+        "prd_allocation": "Phân bổ PRD",
+        "initialization": "Khởi tạo quần thể",
+        "fitness": "Đánh giá fitness",
+        "selection": "Chọn lọc",
+        "crossover": "Crossover",
+        "mutation": "Mutation",
+        "local_repair": "Local repair",
+        "migration": "Trao đổi giữa các đảo",
+        "final_repair": "Sửa chữa lần cuối",
+        "final_evaluation": "Đánh giá kết quả",
+        "exact_search": "Tìm kiếm chính xác",
+    }
+
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+        self.generations = []
+        self.feasible_at = None
+        # Lý do Memetic Algorithm dừng (khóa của SolveBudget.STOP_REASONS)
+        self.stop_reason = None
+
+    # Đo thời gian một giai đoạn, cộng dồn nếu giai đoạn chạy nhiều lần
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Ghi thống kê một thế hệ: fitness tốt nhất và số lần đánh giá fitness trong thế hệ đó
+    def add_generation(self, generation, best_fitness, fitness_calls, delta_calls, seconds):
+        self.generations.append({"generation": generation, "best_fitness": best_fitness,
+                                 "fitness_calls": fitness_calls, "delta_calls": delta_calls,
+                                 "seconds": round(seconds, 4)})
+
+    # Gộp báo cáo của tiến trình con (thời gian các đảo được cộng dồn)
+    def merge(self, other):
+        for name, seconds in other.timings.items():
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+        for name, amount in other.counters.items():
+            self.count(name, amount)
+        return self
+
+    def to_dict(self):
+        counters = dict(self.counters)
+        if counters.get("repair_max_steps"):
+            counters["repair_step_ratio"] = round(counters.get("repair_steps", 0) / counters["repair_max_steps"], 4)
+        return {"timings": {name: round(seconds, 4) for name, seconds in self.timings.items()},
+                "counters": counters, "generations": list(self.generations), "stop_reason": self.stop_reason}
+
+
+# Tham số Memetic Algorithm
+POPULATION_SIZE = 50
+MUTATION_RATE = 0.01
+ELITE_SIZE = 5
+TOURNAMENT_SIZE = 5
+HARD_CONSTRAINT_THRESHOLD = 0
+SOFT_CONSTRAINT_THRESHOLD = 1000
+
+# Tỉ lệ ô bị đột biến trong các bản sao lịch khởi tạo khi warm start (bản sao đầu tiên giữ nguyên)
+WARM_START_PERTURBATION = 0.05
+
+# Tham số local repair theo vi phạm: số ô vi phạm được xử lý mỗi bước, số nhân viên thử hoán đổi ca
+# cho mỗi ô, số ô vừa đổi bị cấm đổi lại (tabu) và số bước liên tiếp không giảm fitness trước khi dừng
+REPAIR_MODE = "conflict"
+CONFLICT_CELLS_PER_STEP = 16
+SWAP_CANDIDATES = 6
+TABU_TENURE = 20
+REPAIR_PATIENCE = 5
+
+# Tham số island model: số thế hệ giữa hai lần trao đổi và số cá thể tốt nhất được gửi đi
+MIGRATION_INTERVAL = 5
+MIGRATION_SIZE = 2
+
+
+# Ngân sách chạy của Memetic Algorithm: số thế hệ tối đa, thời gian tối đa (giây, tính từ lúc tạo) và số thế hệ
+# liên tiếp fitness tốt nhất không cải thiện; None = không giới hạn (cần ít nhất giới hạn thế hệ hoặc thời gian).
+# Hết ngân sách thì trả về lịch tốt nhất đến lúc đó (chế độ anytime). Hạn chót lưu theo time.time() để gửi được
+# sang tiến trình con. cancel_event (tùy chọn) dừng lần chạy trước thế hệ kế tiếp (island model: trước lần trao đổi
+# kế tiếp); on_improvement(fitness) (tùy chọn) được gọi mỗi khi fitness tốt nhất giảm.
+class SolveBudget:
+    STOP_REASONS = {
+        "threshold": "đạt ngưỡng fitness",
+        "max_generations": "hết số thế hệ tối đa",
+        "time_limit": "hết thời gian cho phép",
+        "stagnation": "fitness không cải thiện",
+        "cancelled": "đã bị hủy",
+    }
+
+    def __init__(self, max_generations=None, time_limit=None, stagnation_limit=None, cancel_event=None,
+                 on_improvement=None):
+        if max_generations is None and time_limit is None:
+            raise ValueError("Cần giới hạn số thế hệ hoặc thời gian chạy")
+        self.max_generations = max_generations
+        self.time_limit = time_limit
+        self.stagnation_limit = stagnation_limit
+        self.cancel_event = cancel_event
+        self.on_improvement = on_improvement
+        self.start = time.time()
+        self.deadline = self.start + time_limit if time_limit is not None else None
+        self.best_fitness = float('inf')
+        self.stalled = 0
+        self.stop_reason = None
+
+    def elapsed(self):
+        return time.time() - self.start
+
+    def expired(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    # Ghi fitness tốt nhất sau `generations` thế hệ, đếm số thế hệ liên tiếp không cải thiện
+    def record(self, best_fitness, generations=1):
+        if best_fitness < self.best_fitness:
+            self.best_fitness = best_fitness
+            self.stalled = 0
+            if self.on_improvement:
+                self.on_improvement(best_fitness)
+        else:
+            self.stalled += generations
+
+    # Hàm kiểm tra đã hết ngân sách trước khi chạy thế hệ thứ generation (ghi lại lý do dừng)
+    def exhausted(self, generation):
+        if self.cancelled():
+            self.stop_reason = "cancelled"
+        elif self.max_generations is not None and generation >= self.max_generations:
+            self.stop_reason = "max_generations"
+        elif self.expired():
+            self.stop_reason = "time_limit"
+        elif self.stagnation_limit is not None and self.stalled >= self.stagnation_limit:
+            self.stop_reason = "stagnation"
+        return self.stop_reason is not None
+
+    # Số thế hệ còn được chạy (None nếu không giới hạn số thế hệ)
+    def remaining_generations(self, generation):
+        return None if self.max_generations is None else self.max_generations - generation
+
+    # Tỉ lệ hoàn thành: theo thời gian nếu có giới hạn thời gian, ngược lại theo số thế hệ
+    def fraction(self, generation):
+        if self.time_limit is not None:
+            return min(self.elapsed() / self.time_limit, 0.99) if self.time_limit > 0 else 0.99
+        return min(generation / self.max_generations, 0.99)
+
+    def describe(self):
+        return self.STOP_REASONS.get(self.stop_reason, "")
+
+# Hàm khởi tạo cá thể ngẫu nhiên
+def initialize_random_individual(problem, rng):
+    codes = problem.manual_codes.copy()
+    for e, shift_pool in enumerate(problem.shift_pools):
+        free_days = np.flatnonzero(~problem.manual_mask[e])
+        codes[e, free_days] = rng.choice(shift_pool, size=len(free_days))
+    return codes
+
+# Hàm khởi tạo cá thể heuristic: giữ ca nhập tay, điền các ô còn trống bằng ca hợp lệ
+def initialize_heuristic_individual(problem, rng):
+    codes = problem.manual_codes.copy()
+    for e, shift_pool in enumerate(problem.shift_pools):
+        free_days = np.flatnonzero(~problem.manual_mask[e] & (codes[e] == EMPTY))
+        codes[e, free_days] = rng.choice(shift_pool, size=len(free_days))
+    return codes
+
+# Hàm khởi tạo cá thể từ lịch warm start: điền ô trống, đột biến tỉ lệ perturbation ô không nhập tay
+def initialize_warm_start_individual(problem, rng, perturbation=WARM_START_PERTURBATION):
+    codes = problem.warm_start_codes.copy()
+    for e, shift_pool in enumerate(problem.shift_pools):
+        free_days = np.flatnonzero(~problem.manual_mask[e] & (codes[e] == EMPTY))
+        codes[e, free_days] = rng.choice(shift_pool, size=len(free_days))
+    if perturbation:
+        codes = mutation(codes, problem, rng, perturbation)
+    return codes
+
+# Hàm nối tiếp trạng thái kỳ trước vào đầu kỳ: đổi ca ngày đầu nếu vi phạm giãn cách/ca liên tiếp với
+# ngày cuối kỳ trước, và đặt PRD nếu chuỗi làm việc nối từ kỳ trước vượt quá 7 ngày
+def carry_boundary(codes, problem, rng):
+    manual = problem.manual_mask
+    for e in np.flatnonzero((problem.boundary_code != EMPTY) | (problem.boundary_run > 0)):
+        row = codes[e]
+        last_code = int(problem.boundary_code[e])
+        if not manual[e, 0] and _PAIR_PENALTY[last_code][row[0]]:
+            shift_pool = problem.shift_pools[e]
+            allowed = shift_pool[PAIR_PENALTY[last_code, shift_pool] == 0]
+            if len(allowed):
+                row[0] = rng.choice(allowed)
+        trailing = int(problem.boundary_run[e])
+        leading = int(np.argmin(SHIFT_IS_WORK[row])) if not SHIFT_IS_WORK[row].all() else problem.num_days
+        if trailing and trailing + leading > 7:
+            # Ngày nghỉ phải rơi vào trong 7 - trailing ngày đầu; ưu tiên ngày muộn nhất hợp lệ cho PRD
+            candidates = np.flatnonzero(~manual[e, :max(7 - trailing, 0) + 1]
+                                        & ~problem.invalid_prd_days[:max(7 - trailing, 0) + 1])
+            if len(candidates):
+                row[candidates[-1]] = PRD
+    return codes
+
+# Hàm crossover một điểm theo trục ngày, giữ nguyên các ô nhập tay
+def crossover(parent1, parent2, problem, rng):
+    crossover_point = rng.integers(1, problem.num_days)
+    child1 = np.concatenate([parent1[:, :crossover_point], parent2[:, crossover_point:]], axis=1)
+    child2 = np.concatenate([parent2[:, :crossover_point], parent1[:, crossover_point:]], axis=1)
+    child1[problem.manual_mask] = problem.manual_codes[problem.manual_mask]
+    child2[problem.manual_mask] = problem.manual_codes[problem.manual_mask]
+    return child1, child2
+
+# Hàm mutation
+def mutation(codes, problem, rng, mutation_rate=0.01):
+    mutate_mask = (rng.random(codes.shape) < mutation_rate) & ~problem.manual_mask
+    for e in np.flatnonzero(mutate_mask.any(axis=1)):
+        days = np.flatnonzero(mutate_mask[e])
+        codes[e, days] = rng.choice(problem.shift_pools[e], size=len(days))
+    return codes
+
+# Hàm tính mức vi phạm gắn với chính từng ô (số nhân viên, số ngày): vi phạm theo ô, cặp ca liền kề (tính cho cả
+# hai ô, ngày đầu kỳ nối tiếp ca cuối kỳ trước) và phần chuỗi làm việc vượt 7 ngày. Mỗi hàng chỉ phụ thuộc dữ liệu
+# của nhân viên đó.
+def local_conflict_weights(codes, problem):
+    codes = codes.astype(np.intp)
+    weights = cell_penalties(codes, problem)
+    previous = np.concatenate([problem.boundary_code[:, np.newaxis].astype(np.intp), codes[:, :-1]], axis=1)
+    pair = PAIR_PENALTY[previous, codes]
+    weights += pair
+    weights[:, :-1] += pair[:, 1:]
+    weights += HARD_CONSTRAINT_WEIGHT * np.maximum(boundary_run_lengths(codes, problem) - 7, 0)
+    return weights
+
+# Hàm tính mức vi phạm của từng ô (số nhân viên, số ngày) từ trạng thái ràng buộc: vi phạm gắn với ô
+# (local_conflict_weights), ca bắt buộc CS của ngày (cho các ô CS) và vi phạm số lượng ca của nhân viên
+# (chia đều cho các ô làm việc). Ô nhập tay luôn bằng 0 vì không được đổi.
+def conflict_weights(codes, problem):
+    codes = codes.astype(np.intp)
+    weights = local_conflict_weights(codes, problem)
+    emp_penalty = employee_penalties(employee_counts(codes), problem) // problem.num_days
+    weights += SHIFT_IS_WORK[codes] * emp_penalty[:, np.newaxis]
+    weights[problem.is_cs] += cs_day_penalties(cs_day_counts(codes, problem.is_cs))
+    weights[problem.manual_mask] = 0
+    return weights
+
+# Lớp phủ ô không hợp lệ cho bảng chỉnh sửa ca: các ô có ca mà local_conflict_weights khác 0 (ca không được phép
+# ở ô đó, cặp ca liền kề vi phạm hoặc thuộc phần chuỗi làm việc vượt 7 ngày). Vì các vi phạm này chỉ phụ thuộc hàng
+# của từng nhân viên, kết quả được lưu theo nội dung hàng (mã ca, ô nhập tay, trạng thái cuối kỳ trước): sau một lần
+# chỉnh sửa chỉ các hàng thay đổi được tính lại, gộp trong một lần gọi. Bộ nhớ đệm được xóa khi kỳ hoặc danh sách
+# ca đã chọn thay đổi.
+class CellValidityOverlay:
+    def __init__(self):
+        self.context = None
+        self.rows = {}
+
+    # Hàm trả về tập các ô (emp_id, ngày) không hợp lệ của lịch dict[emp_id] -> list[str]
+    def invalid_cells(self, schedule, employees, month_days, manual_shifts, selected_shifts, boundary=None):
+        context = (tuple(month_days), tuple(sorted(selected_shifts)))
+        if context != self.context:
+            self.context = context
+            self.rows = {}
+        boundary = boundary or {}
+        registry = EmployeeRegistry.of(employees)
+        emp_ids, emp_index = registry.ids, registry.index
+        codes = encode_schedule(schedule, emp_ids, len(month_days))
+        manual_mask = np.zeros(codes.shape, dtype=bool)
+        for emp_id, day in manual_shifts:
+            if emp_id in emp_index and day < len(month_days):
+                manual_mask[emp_index[emp_id], day] = True
+        keys = [(codes[e].tobytes(), manual_mask[e].tobytes(), boundary.get(emp_id)) for e, emp_id in enumerate(emp_ids)]
+
+        stale = [e for e, key in enumerate(keys) if key not in self.rows]
+        if stale:
+            stale_employees = [employees[e] for e in stale]
+            stale_ids = set(emp_ids[e] for e in stale)
+            problem = EncodedProblem(stale_employees, month_days, [], 0, False, 0,
+                                     {key: shift for key, shift in manual_shifts.items() if key[0] in stale_ids},
+                                     selected_shifts, boundary=boundary)
+            stale_codes = codes[stale]
+            mask = (local_conflict_weights(stale_codes, problem) > 0) & (stale_codes != EMPTY)
+            for e, row in zip(stale, mask):
+                self.rows[keys[e]] = row
+        # Chỉ giữ các hàng đang dùng
+        self.rows = {key: self.rows[key] for key in keys}
+        invalid = np.stack([self.rows[key] for key in keys]) if keys else np.zeros(codes.shape, dtype=bool)
+        rows, days = np.nonzero(invalid)
+        return {(emp_ids[e], day) for e, day in zip(rows.tolist(), days.tolist())}
+
+
+# Hàm tìm mã ca tốt nhất cho ô (e, day) trong danh sách ca của nhân viên, trả về (mã ca, độ thay đổi fitness,
+# số lần tính delta); giữ nguyên ca hiện tại nếu không có mã ca nào làm giảm fitness
+def best_cell_move(evaluator, problem, e, day):
+    current_code = evaluator.rows[e][day]
+    best_code = current_code
+    best_delta = 0
+    delta_calls = 0
+    for code in problem.shift_pools[e].tolist():
+        if code == current_code:
+            continue
+        delta = evaluator.delta(e, day, code)
+        delta_calls += 1
+        if delta < best_delta:
+            best_delta = delta
+            best_code = code
+    return best_code, best_delta, delta_calls
+
+# Hàm tìm nhân viên tốt nhất để hoán đổi ca với ô (e, day) trong cùng ngày, chọn ngẫu nhiên tối đa
+# SWAP_CANDIDATES nhân viên cùng nhóm (CS với CS, còn lại với nhau) để số ca bắt buộc CS của ngày không đổi.
+# Hai nhân viên không phải CS không có ràng buộc chung nên độ thay đổi là tổng hai delta; với CS phải gán thử
+# rồi hoàn tác trên evaluator. Trả về (nhân viên, độ thay đổi fitness, số lần tính delta).
+def best_swap_move(evaluator, problem, rng, e, day):
+    rows = evaluator.rows
+    code = rows[e][day]
+    group = np.flatnonzero(problem.is_cs == problem.is_cs[e])
+    best_partner = None
+    best_delta = 0
+    delta_calls = 0
+    for partner in rng.choice(group, size=min(SWAP_CANDIDATES, len(group)), replace=False).tolist():
+        partner_code = rows[partner][day]
+        if partner == e or partner_code == code or evaluator.manual[partner][day] \
+                or partner_code not in problem.pool_sets[e] or code not in problem.pool_sets[partner]:
+            continue
+        if problem.is_cs[e]:
+            delta = evaluator.apply(e, day, partner_code) + evaluator.apply(partner, day, code)
+            evaluator.apply(partner, day, partner_code)
+            evaluator.apply(e, day, code)
+            delta_calls += 4
+        else:
+            delta = evaluator.delta(e, day, partner_code) + evaluator.delta(partner, day, code)
+            delta_calls += 2
+        if delta < best_delta:
+            best_delta = delta
+            best_partner = partner
+    return best_partner, best_delta, delta_calls
+
+# Hàm một lượt sửa theo vi phạm: lấy tối đa max_cells ô vi phạm nặng nhất (bỏ qua ô trong danh sách tabu)
+# từ hàng đợi ưu tiên; mỗi ô thử đổi sang ca tốt nhất, nếu không cải thiện thì thử hoán đổi ca với nhân viên
+# khác trong cùng ngày. Ô vừa đổi và ô không sửa được đều được đưa vào tabu để không thử lại ngay. Trả về (số ô đã thử, số bước chấp nhận, số lần tính delta,
+# số lần hoán đổi).
+def conflict_repair_pass(evaluator, problem, rng, tabu, max_cells=CONFLICT_CELLS_PER_STEP):
+    weights = conflict_weights(evaluator.codes, problem).ravel()
+    cells = np.flatnonzero(weights)
+    # Ô cùng mức vi phạm được lấy theo thứ tự ngẫu nhiên
+    heap = list(zip((-weights[cells]).tolist(), rng.random(len(cells)).tolist(), cells.tolist()))
+    heapq.heapify(heap)
+    attempts = accepted = delta_calls = swaps = 0
+    while heap and attempts < max_cells:
+        _, _, cell = heapq.heappop(heap)
+        e, day = divmod(cell, problem.num_days)
+        if (e, day) in tabu:
+            continue
+        attempts += 1
+        best_code, best_delta, calls = best_cell_move(evaluator, problem, e, day)
+        delta_calls += calls
+        if best_delta < 0:
+            evaluator.apply(e, day, best_code)
+            delta_calls += 1
+            tabu.append((e, day))
+            accepted += 1
+            continue
+        partner, best_delta, calls = best_swap_move(evaluator, problem, rng, e, day)
+        delta_calls += calls
+        if partner is not None:
+            code = evaluator.rows[e][day]
+            evaluator.apply(e, day, evaluator.rows[partner][day])
+            evaluator.apply(partner, day, code)
+            delta_calls += 2
+            tabu.append((e, day))
+            tabu.append((partner, day))
+            accepted += 1
+            swaps += 1
+        else:
+            tabu.append((e, day))
+    return attempts, accepted, delta_calls, swaps
+
+# Hàm local repair. Mỗi bước sửa hàng loạt PRD, ô trống, chuỗi làm việc quá dài và V6 liên tiếp, sau đó:
+# - chế độ "conflict" (mặc định): sửa các ô vi phạm nặng nhất qua conflict_repair_pass, dừng sớm khi
+#   REPAIR_PATIENCE bước liên tiếp không giảm fitness;
+# - chế độ "random": Min-Conflicts trên một ô ngẫu nhiên.
+# codes được sửa tại chỗ và kết thúc ở lịch tốt nhất gặp trong quá trình sửa, nên không bao giờ tệ hơn lịch đầu vào.
+# Qua deadline (time.time(), tùy chọn) thì dừng ở đầu bước kế tiếp.
+# Nếu có run_report, ghi số bước đã dùng trên max_steps, số lần đánh giá fitness/delta, số bước được
+# chấp nhận/bị từ chối, số lần hoán đổi ca và số lần phải trả về bản sao lịch tốt nhất.
+def local_repair(codes, problem, rng, max_steps=300, run_report=None, deadline=None):
+    num_employees, num_days = codes.shape
+    manual = problem.manual_mask
+    invalid_prd_days = problem.invalid_prd_days
+    num_sundays = problem.num_sundays
+    evaluator = IncrementalFitness(codes, problem)
+    steps = 0
+    fitness_calls = 1
+    delta_calls = 0
+    attempts = 0
+    accepted = 0
+    swaps = 0
+    tabu = deque(maxlen=TABU_TENURE)
+    # Bản sao lịch tốt nhất đã gặp: các bước sửa hàng loạt chạy lại ở mỗi vòng có thể làm mất cải thiện trước đó
+    best_total = evaluator.total
+    best_codes = codes.copy()
+    stalled = 0
+
+    for _ in range(max_steps):
+        if evaluator.total == 0 or (deadline is not None and time.time() >= deadline):
+            break
+        steps += 1
+
+        # Sửa số ca PRD bằng số Chủ nhật, chỉ gán vào ngày hợp lệ
+        for e in range(num_employees):
+            row = codes[e]
+            shift_pool = problem.shift_pools[e]
+            is_prd = row == PRD
+            prd_count = int(is_prd.sum())
+
+            # Ngày hợp lệ: thứ 2-6, không phải ngày lễ, ngày 5, 20, không bị khóa, không có PRD trước/sau
+            # (kể cả ngày nghỉ cuối kỳ trước)
+            prev_prd = np.concatenate([[SHIFT_IS_OFF[problem.boundary_code[e]]], is_prd[:-1]])
+            next_prd = np.concatenate([is_prd[1:], [False]])
+            available_days = np.flatnonzero(~manual[e] & ~invalid_prd_days & ~prev_prd & ~next_prd)
+
+            # Xóa PRD ở các ngày không hợp lệ
+            invalid_prd = np.flatnonzero(is_prd & invalid_prd_days & ~manual[e])
+            if len(invalid_prd):
+                row[invalid_prd] = rng.choice(shift_pool, size=len(invalid_prd))
+                prd_count -= len(invalid_prd)
+
+            # Nếu thiếu PRD, gán vào ngày hợp lệ
+            if prd_count < num_sundays and len(available_days):
+                needed = num_sundays - prd_count
+                new_prd_days = rng.choice(available_days, size=min(needed, len(available_days)), replace=False)
+                row[new_prd_days] = PRD
+
+            # Nếu thừa PRD, xóa ở ngày hợp lệ và gán ca khác
+            elif prd_count > num_sundays:
+                valid_prd = np.flatnonzero((row == PRD) & ~invalid_prd_days & ~manual[e])
+                excess = prd_count - num_sundays
+                excess_days = rng.choice(valid_prd, size=min(excess, len(valid_prd)), replace=False)
+                row[excess_days] = rng.choice(shift_pool, size=len(excess_days))
+
+        # Sửa các ô trống
+        empty_mask = (codes == EMPTY) & ~manual
+        for e in np.flatnonzero(empty_mask.any(axis=1)):
+            days = np.flatnonzero(empty_mask[e])
+            codes[e, days] = rng.choice(problem.shift_pools[e], size=len(days))
+
+        # Sửa chuỗi làm việc liên tục vượt quá 7 ngày
+        too_long = (boundary_run_lengths(codes, problem) > 7).any(axis=1)
+        for e in np.flatnonzero(too_long):
+            row = codes[e]
+            consecutive_days = int(problem.boundary_run[e])
+            start_idx = -consecutive_days
+            for day in range(num_days):
+                if _IS_WORK[row[day]]:
+                    consecutive_days += 1
+                    if consecutive_days > 7:
+                        repair_day = max(start_idx + 7, 0)
+                        if not manual[e, repair_day]:
+                            row[repair_day] = PRD
+                            consecutive_days = 0
+                            start_idx = day + 1
+                else:
+                    consecutive_days = 0
+                    start_idx = day + 1
+
+        # Sửa ca V6 liên tiếp
+        is_v6 = SHIFT_FAMILY[codes] == FAMILY_V6
+        consecutive_v6 = is_v6[:, 1:] & is_v6[:, :-1] & ~manual[:, 1:] & ~manual[:, :-1]
+        for e in np.flatnonzero(consecutive_v6.any(axis=1)):
+            row = codes[e]
+            shift_pool = problem.shift_pools[e]
+            shift_pool = shift_pool[SHIFT_FAMILY[shift_pool] != FAMILY_V6]
+            for day in range(1, num_days):
+                if not manual[e, day] and not manual[e, day - 1] and \
+                   _FAMILY[row[day]] == FAMILY_V6 and _FAMILY[row[day - 1]] == FAMILY_V6:
+                    if len(shift_pool):
+                        row[day] = rng.choice(shift_pool)
+
+        # Các bước sửa ở trên thay đổi nhiều ô cùng lúc, đánh giá lại trạng thái một lần
+        evaluator = IncrementalFitness(codes, problem)
+        fitness_calls += 1
+
+        # Sửa các vi phạm khác
+        if problem.repair_mode == "conflict":
+            tried, moved, calls, swapped = conflict_repair_pass(evaluator, problem, rng, tabu)
+            attempts += tried
+            accepted += moved
+            delta_calls += calls
+            swaps += swapped
+        else:
+            attempts += 1
+            e = rng.integers(num_employees)
+            day = rng.integers(num_days)
+            if not manual[e, day]:
+                best_code, _, calls = best_cell_move(evaluator, problem, e, day)
+                delta_calls += calls
+                if best_code != evaluator.rows[e][day]:
+                    accepted += 1
+                    evaluator.apply(e, day, best_code)
+
+        if evaluator.total < best_total:
+            best_total = evaluator.total
+            best_codes = codes.copy()
+            stalled = 0
+        elif problem.repair_mode == "conflict":
+            stalled += 1
+            if stalled >= REPAIR_PATIENCE:
+                break
+
+    # Trả về lịch tốt nhất đã gặp (không bao giờ tệ hơn lịch đầu vào)
+    restored = evaluator.total > best_total
+    if restored:
+        codes[:] = best_codes
+
+    if run_report is not None:
+        run_report.count("repair_calls")
+        run_report.count("repair_steps", steps)
+        run_report.count("repair_max_steps", max_steps)
+        run_report.count("accepted_moves", accepted)
+        run_report.count("rejected_moves", attempts - accepted)
+        run_report.count("swap_moves", swaps)
+        run_report.count("restored_repairs", int(restored))
+        run_report.count("fitness_evaluations", fitness_calls)
+        run_report.count("delta_evaluations", delta_calls)
+    return codes
+
+
+# Hàm khởi tạo quần thể: một nửa ngẫu nhiên, một nửa heuristic
+# Khi có lịch warm start, nửa đầu là các bản sao lịch đó (bản đầu giữ nguyên, các bản sau bị đột biến nhẹ)
+# thay cho cá thể ngẫu nhiên. Mọi cá thể được nối tiếp trạng thái biên với kỳ trước.
+def initialize_population(problem, rng, size=POPULATION_SIZE, callback=None):
+    individuals = []
+    for i in range(size):
+        if i < size // 2 and problem.warm_start_codes is not None:
+            individual = initialize_warm_start_individual(problem, rng, 0 if i == 0 else WARM_START_PERTURBATION)
+        elif i < size // 2:
+            individual = initialize_random_individual(problem, rng)
+        else:
+            individual = initialize_heuristic_individual(problem, rng)
+        individuals.append(carry_boundary(individual, problem, rng))
+        if callback:
+            callback("init", i + 1, size)
+    return np.stack(individuals)
+
+# Hàm tạo thế hệ mới từ quần thể đã đánh giá: chọn lọc (elite + tournament), crossover,
+# mutation và local repair. callback(giai đoạn, số đã xong, tổng số) dùng để báo tiến độ,
+# run_report (tùy chọn) nhận thời gian từng giai đoạn. Qua deadline (time.time()) hoặc khi cancel_event được set
+# thì các cá thể còn lại không được local repair để thế hệ kết thúc sớm.
+def evolve_generation(population, fitness_scores, problem, rng, executor=None, callback=None, run_report=None,
+                      deadline=None, cancel_event=None):
+    run_report = run_report or RunReport()
+    population_size = len(population)
+    with run_report.phase("selection"):
+        order = np.argsort(fitness_scores, kind="stable")
+        selected = list(order[:ELITE_SIZE])
+        while len(selected) < population_size:
+            tournament = rng.choice(population_size, TOURNAMENT_SIZE, replace=False)
+            selected.append(tournament[np.argmin(fitness_scores[tournament])])
+        population = population[selected]
+
+    with run_report.phase("crossover"):
+        for i in range(ELITE_SIZE, population_size, 2):
+            if i + 1 < population_size:
+                population[i], population[i + 1] = crossover(population[i], population[i + 1], problem, rng)
+            if callback:
+                callback("crossover", i + 1, population_size)
+
+    with run_report.phase("mutation"):
+        for i in range(ELITE_SIZE, population_size):
+            population[i] = mutation(population[i], problem, rng, MUTATION_RATE)
+            if callback:
+                callback("mutation", i + 1 - ELITE_SIZE, population_size - ELITE_SIZE)
+
+    repair_callback = (lambda done, total: callback("repair", done, total)) if callback else None
+    with run_report.phase("local_repair"):
+        repair_population(population, ELITE_SIZE, problem, rng, executor, callback=repair_callback,
+                          run_report=run_report, deadline=deadline, cancel_event=cancel_event)
+    return population
+
+
+# Bài toán dùng trong tiến trình con, được gửi một lần khi khởi tạo pool
+_worker_problem = None
+
+# Hàm khởi tạo tiến trình con
+def _init_worker(problem):
+    global _worker_problem
+    _worker_problem = problem
+
+# Hàm sửa một cá thể trong tiến trình con với RNG riêng theo seed, trả về kèm bộ đếm của lần sửa
+# (bỏ qua nếu đã qua deadline)
+def _repair_worker(codes, seed, max_steps, deadline=None):
+    run_report = RunReport()
+    if deadline is not None and time.time() >= deadline:
+        run_report.count("skipped_repairs")
+        return codes, run_report.counters
+    codes = local_repair(codes, _worker_problem, np.random.default_rng(seed), max_steps, run_report)
+    return codes, run_report.counters
+
+# Hàm tính fitness một phần quần thể trong tiến trình con
+def _fitness_worker(population):
+    return batch_fitness(population, _worker_problem)
+
+# Hàm tạo pool tiến trình cho GA song song. Dùng "spawn" để tiến trình con không kế thừa
+# các luồng của server Streamlit; bài toán được gửi tường minh, không phụ thuộc st.session_state
+def create_worker_pool(problem, num_workers):
+    return ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(problem,))
+
+# Hàm local repair cho các cá thể population[start:], tuần tự hoặc song song qua executor.
+# Mỗi cá thể nhận một seed riêng sinh từ rng chính nên kết quả chỉ phụ thuộc seed ban đầu,
+# không phụ thuộc thứ tự hoàn thành của các tiến trình. Cá thể bắt đầu sửa sau deadline được giữ nguyên;
+# khi chạy tuần tự, cá thể bắt đầu sửa sau khi cancel_event được set cũng vậy.
+def repair_population(population, start, problem, rng, executor=None, max_steps=300, callback=None, run_report=None,
+                      deadline=None, cancel_event=None):
+    indices = range(start, len(population))
+    seeds = rng.integers(0, 2**63, size=len(indices)).tolist()
+    if executor is None:
+        def repair(i, seed):
+            if (deadline is not None and time.time() >= deadline) or (cancel_event is not None and cancel_event.is_set()):
+                if run_report is not None:
+                    run_report.count("skipped_repairs")
+                return population[i]
+            return local_repair(population[i], problem, np.random.default_rng(seed), max_steps, run_report)
+        results = (repair(i, seed) for i, seed in zip(indices, seeds))
+    else:
+        results = executor.map(_repair_worker, [population[i] for i in indices], seeds,
+                               [max_steps] * len(indices), [deadline] * len(indices))
+    for done, (i, codes) in enumerate(zip(indices, results), start=1):
+        if executor is not None:
+            codes, counters = codes
+            if run_report is not None:
+                for name, amount in counters.items():
+                    run_report.count(name, amount)
+        population[i] = codes
+        if callback:
+            callback(done, len(indices))
+    return population
+
+# Hàm tính fitness quần thể, chia đều cho các tiến trình nếu có executor
+def parallel_batch_fitness(population, problem, executor=None, num_chunks=1):
+    if executor is None or num_chunks <= 1:
+        return batch_fitness(population, problem)
+    chunks = np.array_split(population, min(num_chunks, len(population)))
+    return np.concatenate(list(executor.map(_fitness_worker, chunks)))
+
+
+# Hàm chạy một đảo trong tiến trình con: tối đa `generations` thế hệ, dừng sớm khi đảo này
+# hoặc một đảo khác (qua stop_event) đạt ngưỡng khả thi, hoặc khi qua deadline; trả về kèm RunReport của đảo
+def _island_worker(population, seed_sequence, generations, stop_event, deadline=None):
+    rng = np.random.default_rng(seed_sequence)
+    run_report = RunReport()
+    best_codes = None
+    best_fitness = None
+    generations_run = 0
+    for _ in range(generations):
+        if stop_event is not None and stop_event.is_set():
+            break
+        with run_report.phase("fitness"):
+            fitness_scores = batch_fitness(population, _worker_problem)
+        run_report.count("fitness_evaluations", len(population))
+        best_index = int(np.argmin(fitness_scores))
+        if best_fitness is None or fitness_scores[best_index] < best_fitness:
+            best_fitness = int(fitness_scores[best_index])
+            best_codes = population[best_index].copy()
+        if best_fitness <= HARD_CONSTRAINT_THRESHOLD + SOFT_CONSTRAINT_THRESHOLD:
+            if stop_event is not None:
+                stop_event.set()
+            break
+        if deadline is not None and time.time() >= deadline:
+            break
+        population = evolve_generation(population, fitness_scores, _worker_problem, rng, run_report=run_report,
+                                       deadline=deadline)
+        generations_run += 1
+    return population, best_codes, best_fitness, generations_run, run_report
+
+# Hàm chạy island model: num_islands quần thể độc lập trên các tiến trình riêng, cứ mỗi
+# migration_interval thế hệ thì các cá thể tốt nhất của mỗi đảo được gửi sang đảo kế tiếp (vòng tròn)
+# để thay các cá thể kém nhất. Dừng khi hết ngân sách (budget, mặc định max_generations thế hệ) hoặc có đảo
+# đạt ngưỡng khả thi. callback(số thế hệ đã chạy, max_generations, fitness tốt nhất) được gọi sau mỗi lần trao đổi.
+# run_report (tùy chọn) nhận báo cáo gộp của các đảo và thống kê theo từng lần trao đổi.
+def run_island_model(problem, num_islands, max_generations, seed=None, migration_interval=MIGRATION_INTERVAL,
+                     migration_size=MIGRATION_SIZE, callback=None, run_report=None, budget=None):
+    run_report = run_report or RunReport()
+    budget = budget or SolveBudget(max_generations)
+    root_seed = np.random.SeedSequence(seed)
+    init_rngs = [np.random.default_rng(s) for s in root_seed.spawn(num_islands)]
+    with run_report.phase("initialization"):
+        populations = [initialize_population(problem, rng) for rng in init_rngs]
+    best_codes = None
+    best_fitness = float('inf')
+    generation = 0
+    epoch = 0
+
+    with create_worker_pool(problem, num_islands) as executor, multiprocessing.get_context("spawn").Manager() as manager:
+        stop_event = manager.Event()
+        # Luôn chạy ít nhất một lượt để có lịch tốt nhất, kể cả khi đã hết thời gian
+        while not stop_event.is_set() and (best_codes is None or not budget.exhausted(generation)):
+            remaining = budget.remaining_generations(generation)
+            generations = migration_interval if remaining is None else min(migration_interval, remaining)
+            epoch_start = time.perf_counter()
+            fitness_calls = run_report.counters.get("fitness_evaluations", 0)
+            delta_calls = run_report.counters.get("delta_evaluations", 0)
+            futures = [executor.submit(_island_worker, populations[i],
+                                       np.random.SeedSequence(root_seed.entropy, spawn_key=(i, epoch)),
+                                       generations, stop_event, budget.deadline)
+                       for i in range(num_islands)]
+            results = [future.result() for future in futures]
+            populations = [result[0] for result in results]
+            # Các đảo có thể dừng sớm (ngưỡng khả thi, hạn chót); tính theo đảo chạy nhiều thế hệ nhất
+            generations = max(result[3] for result in results)
+            for _, island_codes, island_fitness, _, island_report in results:
+                run_report.merge(island_report)
+                if island_fitness is not None and island_fitness < best_fitness:
+                    best_fitness = island_fitness
+                    best_codes = island_codes
+            if best_fitness < HARD_CONSTRAINT_WEIGHT and run_report.feasible_at is None:
+                run_report.feasible_at = time.time()
+            generation += generations
+            epoch += 1
+            run_report.add_generation(generation, best_fitness,
+                                      run_report.counters.get("fitness_evaluations", 0) - fitness_calls,
+                                      run_report.counters.get("delta_evaluations", 0) - delta_calls,
+                                      time.perf_counter() - epoch_start)
+            budget.record(best_fitness, generations)
+            if callback:
+                callback(generation, max_generations, best_fitness)
+            if best_fitness <= HARD_CONSTRAINT_THRESHOLD + SOFT_CONSTRAINT_THRESHOLD:
+                budget.stop_reason = "threshold"
+                break
+
+            # Trao đổi cá thể: migration_size cá thể tốt nhất của đảo i thay các cá thể kém nhất của đảo i + 1
+            with run_report.phase("migration"):
+                scores = [batch_fitness(population, problem) for population in populations]
+                run_report.count("fitness_evaluations", sum(len(population) for population in populations))
+                migrants = [populations[i][np.argsort(scores[i], kind="stable")[:migration_size]].copy()
+                            for i in range(num_islands)]
+                for i in range(num_islands):
+                    target = (i + 1) % num_islands
+                    worst = np.argsort(scores[target], kind="stable")[::-1][:migration_size]
+                    populations[target][worst] = migrants[i]
+
+    return best_codes, best_fitness, generation
+
+
+# Hàm kiểm tra tính khả thi của lịch
+def check_feasibility(employees, month_days, selected_shifts, department_filter="Tất cả"):
+    if EmployeeRegistry.of(employees).count(CUSTOMER_SERVICE) < 4 and department_filter in [CUSTOMER_SERVICE, ALL_DEPARTMENTS]:
+        return False, "Cần ít nhất 4 nhân viên Customer Service để phân bổ ca bắt buộc"
+    
+    required_shifts = ["V814", "V614", "V818", "V618", "V829", "V633"]
+    missing_shifts = [s for s in required_shifts if s not in selected_shifts]
+    if missing_shifts:
+        return False, "Thiếu ca bắt buộc: " + ", ".join(missing_shifts)
+    
+    if not any(s for s in selected_shifts if get_shift_start_hour(s) and get_shift_start_hour(s) < 12):
+        return False, "Thiếu ca Sáng (bắt đầu trước 12h)"
+    if not any(s for s in selected_shifts if get_shift_start_hour(s) and get_shift_start_hour(s) >= 12):
+        return False, "Thiếu ca Tối (bắt đầu từ 12h trở đi)"
+    
+    if "PRD" not in selected_shifts:
+        return False, "PRD không được chọn trong danh sách ca"
+    
+    return True, ""
+
+# Hàm phân bổ ca cố định cho Customer Service
+# boundary: trạng thái cuối kỳ trước (xem summarize_boundary), dùng để kiểm tra các ngày đầu kỳ
+# days: chỉ phân bổ cho các ngày này (mặc định mọi ngày); các ô đã có trong manual_shifts không bị dời khi cân bằng
+def assign_fixed_cs_shifts(employees, month_days, manual_shifts, sundays, selected_shifts, boundary=None, days=None):
+    cs_employees = EmployeeRegistry.of(employees).department(CUSTOMER_SERVICE)
+    if len(cs_employees) < 4:
+        return False, "Cần ít nhất 4 nhân viên Customer Service để phân bổ ca cố định"
+    
+    required_shifts = ["V814", "V614", "V818", "V618", "V829", "V633"]
+    alternate_shifts = {"V814": "V614", "V818": "V618", "V829": "V633"}
+    shift_counts = {emp["ID"]: {"14": 0, "18": 0, "29/33": 0} for emp in cs_employees}
+    new_manual_shifts = manual_shifts.copy()
+    assigned_shifts = 0
+    unassigned_days = []
+    boundary = boundary or {}
+    
+    # Hàm kiểm tra giãn cách, ca liên tiếp và không quá 7 ngày làm việc liên tục
+    def is_valid_shift(emp_id, day, shift, temp_schedule):
+        # Kiểm tra không quá 7 ngày làm việc liên tục (cửa sổ chạm đầu kỳ thì nối chuỗi cuối kỳ trước)
+        start_day = max(0, day - 7)
+        consecutive_days = boundary.get(emp_id, (0, ""))[0] if start_day == 0 else 0
+        end_day = min(len(month_days), day + 8)
+        temp_schedule[emp_id][day] = shift  # Thử gán ca để kiểm tra
+        for d in range(start_day, end_day):
+            current_shift = temp_schedule.get(emp_id, [''] * len(month_days))[d]
+            if current_shift not in ["PRD", "AL", "NPL", ""]:
+                consecutive_days += 1
+                if consecutive_days > 7:
+                    temp_schedule[emp_id][day] = ""  # Hủy gán ca
+                    return False, f"Vượt quá 7 ngày làm việc liên tục cho {emp_id} tại ngày {month_days[day].strftime('%d/%m')}"
+            else:
+                consecutive_days = 0
+        temp_schedule[emp_id][day] = ""  # Hủy gán ca sau khi kiểm tra
+        
+        # Giãn cách và ca liên tiếp tra từ bảng cặp ca tính sẵn
+        code = SHIFT_INDEX[shift]
+        
+        # Kiểm tra ca trước (ngày đầu kỳ so với ca ngày cuối kỳ trước)
+        if day > 0:
+            prev_code = SHIFT_INDEX[temp_schedule.get(emp_id, [''] * len(month_days))[day-1]]
+        else:
+            prev_code = SHIFT_INDEX.get(boundary.get(emp_id, (0, ""))[1], EMPTY)
+        if prev_code != EMPTY:
+            # Kiểm tra giãn cách thời gian
+            if REST_VIOLATION[prev_code, code]:
+                return False, f"Giãn cách dưới 10 giờ cho {emp_id} ngày {month_days[day].strftime('%d/%m')}"
+            # Kiểm tra ca VX/V6 liên tiếp
+            if CONSECUTIVE_VX[prev_code, code]:
+                return False, f"Ca VX liên tiếp cho {emp_id} ngày {month_days[day].strftime('%d/%m')}"
+            if CONSECUTIVE_V6[prev_code, code]:
+                return False, f"Ca V6 liên tiếp cho {emp_id} ngày {month_days[day].strftime('%d/%m')}"
+        
+        # Kiểm tra ca sau
+        if day < len(month_days) - 1:
+            next_code = SHIFT_INDEX[temp_schedule.get(emp_id, [''] * len(month_days))[day+1]]
+            if REST_VIOLATION[code, next_code]:
+                return False, f"Giãn cách dưới 10 giờ cho {emp_id} ngày {month_days[day+1].strftime('%d/%m')}"
+            if CONSECUTIVE_VX[code, next_code]:
+                return False, f"Ca VX liên tiếp cho {emp_id} ngày {month_days[day+1].strftime('%d/%m')}"
+            if CONSECUTIVE_V6[code, next_code]:
+                return False, f"Ca V6 liên tiếp cho {emp_id} ngày {month_days[day+1].strftime('%d/%m')}"
+        
+        return True, ""
+
+    # Tạo lịch tạm thời để kiểm tra
+    temp_schedule = {emp["ID"]: [''] * len(month_days) for emp in cs_employees}
+    for (emp_id, day), shift in new_manual_shifts.items():
+        if emp_id in temp_schedule and day < len(month_days):
+            temp_schedule[emp_id][day] = shift
+
+    # Phân bổ ca cố định cho Customer Service
+    for day in range(len(month_days)) if days is None else days:
+        # Lấy danh sách nhân viên còn khả dụng, ưu tiên người có ít ca nhất trong slot
+        available_employees = []
+        for emp in cs_employees:
+            emp_id = emp["ID"]
+            if (emp_id, day) not in new_manual_shifts:
+                is_valid = True
+                for shift in required_shifts:
+                    valid, reason = is_valid_shift(emp_id, day, shift, temp_schedule)
+                    if not valid:
+                        is_valid = False
+                        break
+                if is_valid:
+                    available_employees.append(emp_id)
+        
+        if len(available_employees) < 4:
+            unassigned_days.append(day)
+            continue
+        
+        # Sắp xếp nhân viên theo số ca đã gán trong slot để cân bằng
+        def get_shift_priority(emp_id, slot):
+            return shift_counts[emp_id][slot]
+        
+        # Gán V814 hoặc V614
+        if available_employees:
+            available_employees.sort(key=lambda x: get_shift_priority(x, "14"))
+            emp_id = available_employees.pop(0)
+            shift_options = ["V814", "V614"] if "V814" in selected_shifts and "V614" in selected_shifts else ["V814"] if "V814" in selected_shifts else ["V614"]
+            for shift in shift_options:
+                valid, reason = is_valid_shift(emp_id, day, shift, temp_schedule)
+                if valid:
+                    new_manual_shifts[(emp_id, day)] = shift
+                    temp_schedule[emp_id][day] = shift
+                    shift_counts[emp_id]["14"] += 1
+                    assigned_shifts += 1
+                    break
+        
+        # Gán V818 hoặc V618
+        if available_employees:
+            available_employees.sort(key=lambda x: get_shift_priority(x, "18"))
+            emp_id = available_employees.pop(0)
+            shift_options = ["V818", "V618"] if "V818" in selected_shifts and "V618" in selected_shifts else ["V818"] if "V818" in selected_shifts else ["V618"]
+            for shift in shift_options:
+                valid, reason = is_valid_shift(emp_id, day, shift, temp_schedule)
+                if valid:
+                    new_manual_shifts[(emp_id, day)] = shift
+                    temp_schedule[emp_id][day] = shift
+                    shift_counts[emp_id]["18"] += 1
+                    assigned_shifts += 1
+                    break
+        
+        # Gán 2 ca V829 hoặc V633 (tối đa 1 V633)
+        v633_assigned = False
+        for _ in range(2):
+            if not available_employees:
+                break
+            available_employees.sort(key=lambda x: get_shift_priority(x, "29/33"))
+            emp_id = available_employees.pop(0)
+            if "V633" in selected_shifts and not v633_assigned:
+                shift_options = ["V633", "V829"] if "V829" in selected_shifts else ["V633"]
+            else:
+                shift_options = ["V829"] if "V829" in selected_shifts else ["V633"]
+            for shift in shift_options:
+                valid, reason = is_valid_shift(emp_id, day, shift, temp_schedule)
+                if valid:
+                    new_manual_shifts[(emp_id, day)] = shift
+                    temp_schedule[emp_id][day] = shift
+                    shift_counts[emp_id]["29/33"] += 1
+                    assigned_shifts += 1
+                    if shift == "V633":
+                        v633_assigned = True
+                    break
+    
+    # Thử gán lại cho các ngày chưa đủ ca
+    for day in unassigned_days:
+        available_employees = [emp["ID"] for emp in cs_employees if (emp["ID"], day) not in new_manual_shifts]
+        if len(available_employees) < 4:
+            continue
+        
+        available_employees.sort(key=lambda x: get_shift_priority(x, "14"))
+        if available_employees:
+            emp_id = available_employees.pop(0)
+            shift_options = ["V814", "V614"] if "V814" in selected_shifts and "V614" in selected_shifts else ["V814"] if "V814" in selected_shifts else ["V614"]
+            for shift in shift_options:
+                valid, reason = is_valid_shift(emp_id, day, shift, temp_schedule)
+                if valid:
+                    new_manual_shifts[(emp_id, day)] = shift
+                    temp_schedule[emp_id][day] = shift
+                    shift_counts[emp_id]["14"] += 1
+                    assigned_shifts += 1
+                    break
+        
+        available_employees.sort(key=lambda x: get_shift_priority(x, "18"))
+        if available_employees:
+            emp_id = available_employees.pop(0)
+            shift_options = ["V818", "V618"] if "V818" in selected_shifts and "V618" in selected_shifts else ["V818"] if "V818" in selected_shifts else ["V618"]
+            for shift in shift_options:
+                valid, reason = is_valid_shift(emp_id, day, shift, temp_schedule)
+                if valid:
+                    new_manual_shifts[(emp_id, day)] = shift
+                    temp_schedule[emp_id][day] = shift
+                    shift_counts[emp_id]["18"] += 1
+                    assigned_shifts += 1
+                    break
+        
+        v633_assigned = False
+        for _ in range(2):
+            if not available_employees:
+                break
+            available_employees.sort(key=lambda x: get_shift_priority(x, "29/33"))
+            emp_id = available_employees.pop(0)
+            if "V633" in selected_shifts and not v633_assigned:
+                shift_options = ["V633", "V829"] if "V829" in selected_shifts else ["V633"]
+            else:
+                shift_options = ["V829"] if "V829" in selected_shifts else ["V633"]
+            for shift in shift_options:
+                valid, reason = is_valid_shift(emp_id, day, shift, temp_schedule)
+                if valid:
+                    new_manual_shifts[(emp_id, day)] = shift
+                    temp_schedule[emp_id][day] = shift
+                    shift_counts[emp_id]["29/33"] += 1
+                    assigned_shifts += 1
+                    if shift == "V633":
+                        v633_assigned = True
+                    break
+    
+    # Cân bằng số ca cố định
+    total_days = len(month_days)
+    target_shifts = total_days // len(cs_employees)
+    for slot in ["14", "18", "29/33"]:
+        for _ in range(total_days):
+            max_emp = min(shift_counts, key=lambda x: shift_counts[x][slot])
+            min_emp = max(shift_counts, key=lambda x: shift_counts[x][slot])
+            if shift_counts[max_emp][slot] <= shift_counts[min_emp][slot] + 1:
+                break
+            for day in range(len(month_days)):
+                if (max_emp, day) in new_manual_shifts and new_manual_shifts[(max_emp, day)] in [f"V8{slot}", f"V6{slot}"] \
+                   and (max_emp, day) not in manual_shifts:
+                    if (min_emp, day) not in new_manual_shifts:
+                        shift = new_manual_shifts[(max_emp, day)]
+                        valid, reason = is_valid_shift(min_emp, day, shift, temp_schedule)
+                        if valid:
+                            new_manual_shifts[(min_emp, day)] = shift
+                            temp_schedule[min_emp][day] = shift
+                            del new_manual_shifts[(max_emp, day)]
+                            temp_schedule[max_emp][day] = ""
+                            shift_counts[max_emp][slot] -= 1
+                            shift_counts[min_emp][slot] += 1
+                            break
+    
+    message = f"Đã phân bổ {assigned_shifts} ca cố định cho Customer Service"
+    if unassigned_days:
+        message += f". Chưa phân bổ đủ ca cho {len(unassigned_days)} ngày: {', '.join(month_days[d].strftime('%d/%m') for d in unassigned_days)}"
+    return new_manual_shifts, message
+
+# Bản ghi một vi phạm: mã ràng buộc (khóa của VIOLATION_MESSAGES), chỉ số nhân viên và chỉ số ngày (None nếu vi phạm
+# không gắn với một nhân viên/ngày), mức vi phạm (số lần trọng số cứng/mềm được cộng vào fitness), cứng hay mềm và các
+# giá trị dùng khi hiển thị. Thông báo chỉ được tạo khi hiển thị (format_violation).
+@dataclass
+class Violation:
+    constraint: str
+    emp: int
+    day: int
+    magnitude: int = 1
+    hard: bool = True
+    values: tuple = ()
+
+    @property
+    def penalty(self):
+        return (HARD_CONSTRAINT_WEIGHT if self.hard else SOFT_CONSTRAINT_WEIGHT) * self.magnitude
+
+# Mẫu thông báo theo mã ràng buộc; {emp_id}, {date} và các giá trị {0}, {1}, ... của bản ghi
+VIOLATION_MESSAGES = {
+    "max_consecutive": "{emp_id}: Vượt quá 7 ngày làm liên tục tại ngày {date}",
+    "consecutive_off": "{emp_id}: PRD/AL/NPL liên tiếp ngày {date}",
+    "consecutive_vx": "{emp_id}: Ca VX liên tiếp ngày {date}",
+    "consecutive_v6": "{emp_id}: Ca V6 liên tiếp ngày {date} (ưu tiên tránh)",
+    "rest_gap": "{emp_id}: Giãn cách dưới 10 giờ ngày {date}",
+    "vx_v6_balance": "{emp_id}: Số ca VX ({0}) không bằng V6 ({1})",
+    "vx_min": "{emp_id}: Số ca VX ({0}) nhỏ hơn tối thiểu ({1})",
+    "prd_invalid_day": "{emp_id}: PRD vào ngày không hợp lệ {date}",
+    "leave_not_manual": "{emp_id}: Ca {0} không nhập tay ngày {date}",
+    "prd_count": "{emp_id}: Số ngày PRD ({0}) không bằng số Chủ nhật ({1})",
+    "unselected_shift": "{emp_id}: Ca {0} không trong danh sách ca đã chọn ngày {date}",
+    "empty_cell": "{emp_id}: Ô trống không hợp lệ ngày {date}",
+    "morning_evening": "{emp_id}: Độ lệch ca sáng ({0}) và tối ({1}) vượt quá {2}",
+    "cs_slot_14": "Ngày {date}: V814/V614 có {0} ca (cần 1)",
+    "cs_slot_18": "Ngày {date}: V818/V618 có {0} ca (cần 1)",
+    "cs_slot_29_33": "Ngày {date}: V829/V633 có {0} ca (cần 2)",
+    "cs_v633": "Ngày {date}: V633 có {0} ca (tối đa 1)",
+}
+
+# Hàm tạo thông báo của một vi phạm; employees và month_days là danh sách đã dùng khi đánh giá
+def format_violation(violation, employees, month_days):
+    return format_violations([violation], employees, month_days)[0]
+
+# Hàm tạo danh sách thông báo của các vi phạm (mỗi ngày chỉ định dạng một lần)
+def format_violations(violations, employees, month_days):
+    dates = [d.strftime('%d/%m') for d in month_days]
+    return [VIOLATION_MESSAGES[v.constraint].format(*v.values, emp_id=employees[v.emp]["ID"] if v.emp is not None else "",
+                                                    date=dates[v.day] if v.day is not None else "")
+            for v in violations]
+
+# Hàm đánh giá lịch, trả về (fitness, danh sách Violation). details=False bỏ qua việc tạo bản ghi khi chỉ cần fitness.
+# boundary: trạng thái cuối kỳ trước (xem summarize_boundary); chuỗi ngày làm việc và cặp ca ngày đầu kỳ
+# được kiểm tra nối tiếp ngày cuối kỳ trước
+def evaluate_schedule(schedule, employees, month_days, sundays, vx_min, balance_morning_evening, max_morning_evening_diff,
+                      manual_shifts, selected_shifts, boundary=None, details=True):
+    violations = 0
+    records = [] if details else None
+    boundary = boundary or {}
+    num_days = len(month_days)
+    invalid_prd_days = [is_invalid_prd_day(d) for d in month_days]
+    
+    for e, emp in enumerate(employees):
+        emp_id = emp["ID"]
+        emp_schedule = schedule.get(emp_id, [''] * num_days)
+        trailing_run, last_shift = boundary.get(emp_id, (0, ""))
+        
+        # Ràng buộc cứng
+        # 1. Không quá 7 ngày làm liên tục
+        consecutive_days = trailing_run
+        for day in range(num_days):
+            shift = emp_schedule[day]
+            if shift not in ["PRD", "AL", "NPL", ""]:
+                consecutive_days += 1
+                if consecutive_days > 7:
+                    violations += HARD_CONSTRAINT_WEIGHT * (consecutive_days - 7)
+                    if details:
+                        records.append(Violation("max_consecutive", e, day, consecutive_days - 7))
+            else:
+                consecutive_days = 0
+        
+        # 2. Không PRD/VX/V6 liên tiếp và 3. Giãn cách tối thiểu 10 tiếng (tra từ bảng cặp ca tính sẵn)
+        emp_codes = [SHIFT_INDEX[s] for s in emp_schedule]
+        prev_codes = [SHIFT_INDEX.get(last_shift, EMPTY)] + emp_codes[:-1]
+        for day in range(num_days):
+            prev_code = prev_codes[day]
+            current_code = emp_codes[day]
+            if CONSECUTIVE_OFF[prev_code, current_code]:
+                violations += HARD_CONSTRAINT_WEIGHT
+                if details:
+                    records.append(Violation("consecutive_off", e, day))
+            if CONSECUTIVE_VX[prev_code, current_code]:
+                violations += HARD_CONSTRAINT_WEIGHT
+                if details:
+                    records.append(Violation("consecutive_vx", e, day))
+            if CONSECUTIVE_V6[prev_code, current_code]:
+                violations += SOFT_CONSTRAINT_WEIGHT  # Ràng buộc mềm cho V6 liên tiếp
+                if details:
+                    records.append(Violation("consecutive_v6", e, day, hard=False))
+        
+        for day in range(num_days):
+            if REST_VIOLATION[prev_codes[day], emp_codes[day]]:
+                violations += HARD_CONSTRAINT_WEIGHT
+                if details:
+                    records.append(Violation("rest_gap", e, day))
+        
+        # 4. Số ca VX = V6 và tối thiểu vx_min
+        vx_count = sum(1 for s in emp_schedule if s.startswith("VX"))
+        v6_count = sum(1 for s in emp_schedule if s.startswith("V6"))
+        if vx_count != v6_count:
+            violations += HARD_CONSTRAINT_WEIGHT * abs(vx_count - v6_count)
+            if details:
+                records.append(Violation("vx_v6_balance", e, None, abs(vx_count - v6_count), values=(vx_count, v6_count)))
+        if vx_count < vx_min:
+            violations += HARD_CONSTRAINT_WEIGHT * (vx_min - vx_count)
+            if details:
+                records.append(Violation("vx_min", e, None, vx_min - vx_count, values=(vx_count, vx_min)))
+        
+        # 5. PRD không vào thứ 7, chủ nhật, ngày lễ, ngày 5, ngày 20 trừ khi nhập tay
+        for day in range(num_days):
+            if invalid_prd_days[day] and emp_schedule[day] == "PRD" and (emp_id, day) not in manual_shifts:
+                violations += HARD_CONSTRAINT_WEIGHT
+                if details:
+                    records.append(Violation("prd_invalid_day", e, day))
+        
+        # 6. AL, NPL chỉ được nhập tay
+        for day in range(num_days):
+            shift = emp_schedule[day]
+            if shift in ["AL", "NPL"] and (emp_id, day) not in manual_shifts:
+                violations += HARD_CONSTRAINT_WEIGHT
+                if details:
+                    records.append(Violation("leave_not_manual", e, day, values=(shift,)))
+        
+        # 7. Số ngày PRD bằng số ngày Chủ nhật
+        prd_count = emp_schedule.count("PRD")
+        if prd_count != len(sundays):
+            violations += HARD_CONSTRAINT_WEIGHT * abs(prd_count - len(sundays)) * 2
+            if details:
+                records.append(Violation("prd_count", e, None, abs(prd_count - len(sundays)) * 2,
+                                         values=(prd_count, len(sundays))))
+        
+        # 8. Ca có trong danh sách ca đã chọn (trừ ca thủ công)
+        for day in range(num_days):
+            shift = emp_schedule[day]
+            if (emp_id, day) not in manual_shifts and shift not in ["PRD", "AL", "NPL", ""]:
+                if shift not in selected_shifts:
+                    violations += HARD_CONSTRAINT_WEIGHT
+                    if details:
+                        records.append(Violation("unselected_shift", e, day, values=(shift,)))
+        
+        # 9. Không để trống ca (trừ PRD, AL, NPL)
+        for day in range(num_days):
+            if emp_schedule[day] == "" and (emp_id, day) not in manual_shifts:
+                violations += HARD_CONSTRAINT_WEIGHT
+                if details:
+                    records.append(Violation("empty_cell", e, day))
+        
+        # Ràng buộc mềm: Cân bằng ca sáng-tối
+        if balance_morning_evening:
+            morning_count = sum(1 for s in emp_schedule if s not in ["PRD", "AL", "NPL", ""] and get_shift_start_hour(s) < 12)
+            evening_count = sum(1 for s in emp_schedule if s not in ["PRD", "AL", "NPL", ""] and get_shift_start_hour(s) >= 12)
+            diff = abs(morning_count - evening_count)
+            if diff > max_morning_evening_diff:
+                violations += SOFT_CONSTRAINT_WEIGHT * (diff - max_morning_evening_diff)
+                if details:
+                    records.append(Violation("morning_evening", e, None, diff - max_morning_evening_diff, hard=False,
+                                             values=(morning_count, evening_count, max_morning_evening_diff)))
+    
+    # Ràng buộc cứng: Ca bắt buộc cho Customer Service
+    cs_employees = EmployeeRegistry.of(employees).department(CUSTOMER_SERVICE)
+    for day in range(num_days):
+        cs_shifts = [schedule.get(emp["ID"], [''] * num_days)[day] for emp in cs_employees]
+        v814_v614_count = cs_shifts.count("V814") + cs_shifts.count("V614")
+        v818_v618_count = cs_shifts.count("V818") + cs_shifts.count("V618")
+        v829_v633_count = cs_shifts.count("V829") + cs_shifts.count("V633")
+        v633_count = cs_shifts.count("V633")
+        
+        for constraint, count, lower, upper in (("cs_slot_14", v814_v614_count, 1, 1),
+                                                ("cs_slot_18", v818_v618_count, 1, 1),
+                                                ("cs_slot_29_33", v829_v633_count, 2, 2),
+                                                ("cs_v633", v633_count, 0, 1)):
+            excess = max(lower - count, count - upper, 0)
+            if excess:
+                violations += HARD_CONSTRAINT_WEIGHT * excess
+                if details:
+                    records.append(Violation(constraint, None, day, excess, values=(count,)))
+    
+    return violations, records if details else []
+
+# Hàm tính điểm vi phạm (fitness) của lịch kèm danh sách thông báo vi phạm (hàm tham chiếu cho batch_fitness và
+# bộ đánh giá tăng dần). details=False chỉ tính fitness, trả về danh sách rỗng.
+def calculate_fitness(schedule, employees, month_days, sundays, vx_min, balance_morning_evening, max_morning_evening_diff,
+                      manual_shifts, selected_shifts, boundary=None, details=True):
+    fitness, violations = evaluate_schedule(schedule, employees, month_days, sundays, vx_min, balance_morning_evening,
+                                            max_morning_evening_diff, manual_shifts, selected_shifts, boundary, details)
+    return fitness, format_violations(violations, employees, month_days)
+
+# Hàm phân bổ PRD vào manual_shifts để mỗi nhân viên có số PRD bằng số ngày Chủ nhật, phân bố đều
+# boundary: trạng thái cuối kỳ trước (xem summarize_boundary), dùng để kiểm tra các ngày đầu kỳ
+# preferred_days: dict[emp_id] -> các ngày được chọn trước nếu hợp lệ (ví dụ ngày PRD của lịch warm start)
+def allocate_prd_shifts(employees, month_days, sundays, manual_shifts, boundary=None, preferred_days=None):
+    # Phân bổ PRD để đảm bảo bằng số ngày Chủ nhật và phân bố đều
+    boundary = boundary or {}
+    max_off_per_day = math.ceil(len(employees) / 3)
+    temp_schedule = {emp["ID"]: [''] * len(month_days) for emp in employees}
+    for (emp_id, day), shift in manual_shifts.items():
+        if emp_id in temp_schedule and day < len(month_days):
+            temp_schedule[emp_id][day] = shift
+    
+    # Hàm kiểm tra không quá 7 ngày làm việc liên tục
+    def check_consecutive_work_days(emp_id, day, temp_schedule):
+        start_day = max(0, day - 7)
+        consecutive_days = boundary.get(emp_id, (0, ""))[0] if start_day == 0 else 0
+        end_day = min(len(month_days), day + 8)
+        temp_schedule[emp_id][day] = "PRD"  # Thử gán PRD
+        for d in range(start_day, end_day):
+            current_shift = temp_schedule.get(emp_id, [''] * len(month_days))[d]
+            if current_shift not in ["PRD", "AL", "NPL", ""]:
+                consecutive_days += 1
+                if consecutive_days > 7:
+                    temp_schedule[emp_id][day] = ""  # Hủy gán PRD
+                    return False
+            else:
+                consecutive_days = 0
+        temp_schedule[emp_id][day] = ""  # Hủy gán PRD sau kiểm tra
+        return True
+    
+    # Hàm lấy ca ngày hôm trước (ngày đầu kỳ lấy ca ngày cuối kỳ trước)
+    def previous_shift(emp_id, day):
+        return temp_schedule[emp_id][day-1] if day > 0 else boundary.get(emp_id, (0, ""))[1]
+    
+    # Xóa PRD vi phạm ràng buộc (PRD liên tiếp hoặc quá 7 ngày làm việc liên tục)
+    for emp in employees:
+        emp_id = emp["ID"]
+        for day in range(len(month_days)):
+            # PRD đã có trong manual_shifts được giữ kể cả ở ngày không hợp lệ (coi như nhập tay)
+            if (emp_id, day) in manual_shifts and manual_shifts[(emp_id, day)] == "PRD":
+                # Kiểm tra PRD liên tiếp hoặc vi phạm 7 ngày làm việc
+                prev_ok = previous_shift(emp_id, day) not in ["PRD", "AL", "NPL"]
+                next_ok = day == len(month_days)-1 or temp_schedule[emp_id][day+1] not in ["PRD", "AL", "NPL"]
+                if not (prev_ok and next_ok):
+                    del manual_shifts[(emp_id, day)]
+                    temp_schedule[emp_id][day] = ""
+                elif not check_consecutive_work_days(emp_id, day, temp_schedule):
+                    del manual_shifts[(emp_id, day)]
+                    temp_schedule[emp_id][day] = ""
+    
+    # Tạo danh sách ngày hợp lệ (thứ 2-6, không phải ngày lễ, không phải ngày 5, 20)
+    valid_prd_days = [day for day in range(len(month_days)) 
+                      if not is_invalid_prd_day(month_days[day])]
+    
+    # Phân bổ PRD cho mỗi nhân viên
+    for emp in employees:
+        emp_id = emp["ID"]
+        prd_count = sum(1 for (eid, d), s in manual_shifts.items() if eid == emp_id and s == "PRD")
+        needed_prd = len(sundays) - prd_count
+        
+        if needed_prd > 0:
+            # Đếm số ca PRD mỗi ngày để ưu tiên ngày có ít PRD
+            prd_per_day = {day: sum(1 for e in employees if manual_shifts.get((e["ID"], day), "") == "PRD") 
+                           for day in valid_prd_days}
+            
+            # Lọc các ngày hợp lệ cho nhân viên này
+            available_days = []
+            for day in valid_prd_days:
+                if (emp_id, day) not in manual_shifts:
+                    prev_ok = previous_shift(emp_id, day) not in ["PRD", "AL", "NPL"]
+                    next_ok = day == len(month_days)-1 or temp_schedule[emp_id][day+1] not in ["PRD", "AL", "NPL"]
+                    off_count = sum(1 for e in employees if manual_shifts.get((e["ID"], day), "") in ["PRD", "AL", "NPL"])
+                    if prev_ok and next_ok and off_count < max_off_per_day and check_consecutive_work_days(emp_id, day, temp_schedule):
+                        available_days.append(day)
+            
+            # Sắp xếp ngày theo số lượng PRD (ưu tiên ngày có ít PRD nhất), các ngày ưu tiên của nhân viên đứng trước
+            preferred = set((preferred_days or {}).get(emp_id, ()))
+            available_days.sort(key=lambda d: (d not in preferred, prd_per_day.get(d, 0)))
+            
+            # Gán PRD vào các ngày có ít PRD nhất
+            for day in available_days[:min(needed_prd, len(available_days))]:
+                manual_shifts[(emp_id, day)] = "PRD"
+                temp_schedule[emp_id][day] = "PRD"
+                prd_per_day[day] = prd_per_day.get(day, 0) + 1
+    
+    total_prd = sum(1 for s in manual_shifts.values() if s == "PRD")
+    logging.info(f"Đã phân bổ {total_prd} ca PRD tự động, đảm bảo không quá 1 PRD/ngày và không vi phạm 7 ngày làm việc liên tục")
+    return manual_shifts
+
+# Hàm lấy ca cố định từ lịch warm start (problem: bài toán đã mã hóa với warm_start và các ô nhập tay hiện tại) để
+# không phải phân bổ lại từ đầu, chỉ phân bổ lại phần bị các ô sửa tay làm mất hiệu lực:
+# - ca cố định CS (V814/V614, V818/V618, V829/V633) của một ngày được giữ (thêm vào manual_shifts) nếu sau khi áp
+#   ô nhập tay ngày đó vẫn đủ đúng các ca bắt buộc; các ngày còn lại được phân bổ lại;
+# - các ngày PRD của mỗi nhân viên được allocate_prd_shifts ưu tiên chọn lại nếu vẫn hợp lệ.
+# Trả về (manual_shifts kèm các ô ca cố định CS được giữ, danh sách ngày cần phân bổ lại ca CS,
+# dict[emp_id] -> các ngày PRD của lịch warm start).
+def warm_start_fixed_shifts(problem, manual_shifts):
+    codes = problem.warm_start_codes
+    free = ~problem.manual_mask
+    is_slot = (SHIFT_CS_SLOT[codes] != CS_SLOT_NONE) & problem.is_cs[:, np.newaxis]
+    complete_days = cs_day_penalties(cs_day_counts(codes, problem.is_cs)) == 0
+    complete_days &= ~(is_slot & free & ~problem.selected_mask[codes]).any(axis=0)
+
+    kept = dict(manual_shifts)
+    for e, day in zip(*np.nonzero(is_slot & free & complete_days)):
+        kept[(problem.emp_ids[e], int(day))] = SHIFT_CODES[codes[e, day]]
+    prd_days = {emp_id: np.flatnonzero((codes[e] == PRD) & free[e]).tolist()
+                for e, emp_id in enumerate(problem.emp_ids)}
+    logging.info(f"Warm start: giữ ca cố định CS của {int(complete_days.sum())}/{problem.num_days} ngày")
+    return kept, np.flatnonzero(~complete_days).tolist(), prd_days
+
+# Hàm chạy Memetic Algorithm (một quần thể hoặc island model) trên bài toán đã mã hóa,
+# report(tỉ lệ hoàn thành, thông báo) dùng để báo tiến độ; trả về (lịch tốt nhất, fitness, số thế hệ).
+# budget (tùy chọn, mặc định max_generations thế hệ) giới hạn thêm thời gian và số thế hệ không cải thiện;
+# khi có giới hạn thời gian, tỉ lệ hoàn thành tính theo thời gian đã chạy. Lý do dừng ghi vào run_report.
+# run_report (tùy chọn) nhận thời gian các giai đoạn, bộ đếm, thống kê từng thế hệ và thời điểm
+# (time.time()) lần đầu có lịch không còn vi phạm cứng.
+def run_memetic_algorithm(problem, max_generations, rng, seed=None, num_workers=1, parallel_fitness=False,
+                          num_islands=1, report=None, run_report=None, budget=None):
+    report = report or (lambda fraction, text: None)
+    run_report = run_report or RunReport()
+    budget = budget or SolveBudget(max_generations)
+    if budget.time_limit is not None:
+        phase_report = report
+        report = lambda fraction, text: phase_report(budget.fraction(0), text)
+    best_codes = None
+    best_fitness = float('inf')
+    generation = 0
+
+    # Mô tả tiến độ: số thế hệ đã chạy (trên tổng nếu có), fitness tốt nhất và thời gian còn lại
+    def progress_text(done, fitness):
+        text = f"{done}/{max_generations}" if max_generations else f"{done}"
+        text += f" thế hệ, fitness tốt nhất = {fitness}"
+        if budget.time_limit is not None:
+            text += f", còn {max(budget.time_limit - budget.elapsed(), 0):.0f} giây"
+        return text
+    
+    if num_islands > 1:
+        # Island model: mỗi đảo là một quần thể riêng chạy trên một tiến trình
+        def report_islands(done, total, fitness):
+            report(budget.fraction(done), f"Island model ({num_islands} đảo): {progress_text(done, fitness)}")
+        report(0, f"Khởi tạo {num_islands} đảo...")
+        best_codes, best_fitness, generation = run_island_model(problem, num_islands, max_generations, seed,
+                                                                callback=report_islands, run_report=run_report,
+                                                                budget=budget)
+        logging.info(f"Island model kết thúc sau {generation} thế hệ, fitness = {best_fitness}")
+    else:
+        def report_phase(phase, done, total):
+            if phase == "init":
+                report(min(done / total, 0.2), f"Khởi tạo cá thể {done}/{total}...")
+                return
+            start, width, label = {"crossover": (0.4, 0.2, "crossover"), "mutation": (0.6, 0.2, "mutation"),
+                                   "repair": (0.8, 0.1, "local repair")}[phase]
+            report(min(start + done / total * width, start + width),
+                   f"Thực hiện {label} {done}/{total} trong thế hệ {generation + 1}...")
+        
+        with run_report.phase("initialization"):
+            population = initialize_population(problem, rng, POPULATION_SIZE, callback=report_phase)
+        
+        # Pool tiến trình cho local repair (và tùy chọn tính fitness) khi chạy song song
+        with create_worker_pool(problem, num_workers) if num_workers > 1 else nullcontext() as executor:
+            # Luôn đánh giá quần thể khởi tạo để có lịch tốt nhất, kể cả khi đã hết thời gian
+            while best_codes is None or not budget.exhausted(generation):
+                generation_start = time.perf_counter()
+                fitness_calls = run_report.counters.get("fitness_evaluations", 0)
+                delta_calls = run_report.counters.get("delta_evaluations", 0)
+                # Đánh giá toàn bộ quần thể trong một lần gọi
+                report(0.2, f"Đánh giá {POPULATION_SIZE} cá thể trong thế hệ {generation + 1}...")
+                with run_report.phase("fitness"):
+                    if parallel_fitness:
+                        fitness_scores = parallel_batch_fitness(population, problem, executor, num_workers)
+                    else:
+                        fitness_scores = batch_fitness(population, problem)
+                run_report.count("fitness_evaluations", len(population))
+                best_index = int(np.argmin(fitness_scores))
+                if fitness_scores[best_index] < best_fitness:
+                    best_fitness = int(fitness_scores[best_index])
+                    best_codes = population[best_index].copy()
+                    logging.info(f"Thế hệ {generation}: Cập nhật lịch tốt nhất, fitness = {best_fitness}")
+                    if best_fitness < HARD_CONSTRAINT_WEIGHT and run_report.feasible_at is None:
+                        run_report.feasible_at = time.time()
+                budget.record(best_fitness)
+                
+                if best_fitness <= HARD_CONSTRAINT_THRESHOLD + SOFT_CONSTRAINT_THRESHOLD:
+                    logging.info(f"Tìm thấy lịch khả thi tại thế hệ {generation}, fitness = {best_fitness}")
+                    budget.stop_reason = "threshold"
+                    break
+                
+                population = evolve_generation(population, fitness_scores, problem, rng, executor, callback=report_phase,
+                                               run_report=run_report, deadline=budget.deadline,
+                                               cancel_event=budget.cancel_event)
+                
+                generation += 1
+                run_report.add_generation(generation, best_fitness,
+                                          run_report.counters.get("fitness_evaluations", 0) - fitness_calls,
+                                          run_report.counters.get("delta_evaluations", 0) - delta_calls,
+                                          time.perf_counter() - generation_start)
+                report(min(0.9 + budget.fraction(generation) * 0.1, 0.99), f"Hoàn tất {progress_text(generation, best_fitness)}...")
+    
+    run_report.stop_reason = budget.stop_reason
+    logging.info(f"Memetic Algorithm dừng vì {budget.describe()} sau {generation} thế hệ")
+    return best_codes, best_fitness, generation
+
+
+# Đầu vào của bộ xếp lịch: toàn bộ dữ liệu cần thiết, không phụ thuộc Streamlit
+@dataclass
+class SchedulingProblem:
+    employees: list
+    month_days: list
+    selected_shifts: list
+    manual_shifts: dict = field(default_factory=dict)
+    vx_min: int = 3
+    department_filter: str = "Tất cả"
+    balance_morning_evening: bool = True
+    max_morning_evening_diff: int = 4
+    # Số thế hệ tối đa (None = không giới hạn, khi đó cần time_limit)
+    max_generations: int = 10
+    seed: int = None
+    num_workers: int = 1
+    parallel_fitness: bool = False
+    num_islands: int = 1
+    # Lịch khởi tạo (warm start) của kỳ này, dạng dict[emp_id] -> list[str]
+    warm_start: dict = None
+    # Trạng thái cuối kỳ trước, dạng dict[emp_id] -> (số ngày làm liên tục, ca ngày cuối), xem summarize_boundary
+    boundary: dict = None
+    # Chế độ sửa chữa của local_repair: "conflict" hoặc "random" (Min-Conflicts trên ô ngẫu nhiên)
+    repair_mode: str = REPAIR_MODE
+    # Backend xếp lịch: "memetic", "exact" (schedule_exact.py) hoặc "auto" (xem choose_backend)
+    backend: str = "auto"
+    # Chế độ anytime: thời gian chạy tối đa (giây, tính cả phân bổ ca cố định/PRD) và số thế hệ liên tiếp không
+    # cải thiện fitness trước khi dừng; None = không giới hạn. Hết ngân sách thì trả về lịch tốt nhất đến lúc đó.
+    time_limit: float = None
+    stagnation_limit: int = None
+    # Chạy nền: sự kiện hủy (threading.Event hoặc tương tự; khi được set, bộ giải dừng ở thế hệ kế tiếp) và
+    # hàm on_improvement(fitness) được gọi mỗi khi fitness tốt nhất giảm
+    cancel_event: object = None
+    on_improvement: object = None
+
+    # Danh sách chỉ số các ngày Chủ nhật trong kỳ
+    @property
+    def sundays(self):
+        return [i for i, d in enumerate(self.month_days) if d.weekday() == 6]
+
+    # Danh sách nhân viên luôn được giữ dạng danh bạ để các lần lấy bộ phận và mã hóa bài toán dùng chung chỉ mục
+    def __post_init__(self):
+        self.employees = EmployeeRegistry.of(self.employees)
+
+    # Nhân viên thuộc bộ phận được chọn (danh bạ con)
+    def scheduled_employees(self):
+        return self.employees.department(self.department_filter)
+
+
+# Kết quả của solve(): lịch tốt nhất, manual_shifts sau khi bổ sung ca cố định/PRD và các vi phạm còn lại
+# (danh sách Violation, chỉ số nhân viên theo problem.scheduled_employees(); hiển thị bằng format_violations)
+@dataclass
+class SolveResult:
+    schedule: dict
+    manual_shifts: dict
+    fitness: float
+    violations: list
+    generations: int = 0
+    elapsed_time: float = 0.0
+    message: str = ""
+    fitness_evaluations: int = 0
+    # Số giây từ lúc bắt đầu đến khi có lịch không còn vi phạm cứng (None nếu chưa đạt)
+    time_to_feasible: float = None
+    run_report: RunReport = None
+    # Backend đã tạo kết quả và, nếu backend chứng minh được bài toán vô nghiệm, danh sách lý do (chứng cứ)
+    backend: str = "memetic"
+    certificate: list = field(default_factory=list)
+    # Lý do dừng (khóa của SolveBudget.STOP_REASONS), None nếu không chạy Memetic Algorithm
+    stop_reason: str = None
+
+
+# Số nhân viên tối đa để backend "auto" dùng bộ giải chính xác (khi mọi nhân viên được xếp đều thuộc CS)
+EXACT_MAX_EMPLOYEES = 8
+
+# Các backend xếp lịch: tên -> hàm (problem, progress_callback) -> SolveResult
+SOLVER_BACKENDS = {}
+
+# Tên hiển thị của các lựa chọn backend
+BACKEND_LABELS = {
+    "auto": "Tự động",
+    "memetic": "Memetic Algorithm",
+    "exact": f"Chính xác (CS tối đa {EXACT_MAX_EMPLOYEES} người)",
+}
+
+# Hàm đăng ký một backend xếp lịch
+def register_backend(name, solve_fn):
+    SOLVER_BACKENDS[name] = solve_fn
+    return solve_fn
+
+# Hàm chọn backend cho bài toán: "auto" dùng bộ giải chính xác cho bộ phận Customer Service nhỏ,
+# còn lại dùng Memetic Algorithm
+def choose_backend(problem):
+    if problem.backend != "auto":
+        return problem.backend
+    employees = problem.scheduled_employees()
+    if employees and len(employees) <= EXACT_MAX_EMPLOYEES and employees.count(CUSTOMER_SERVICE) == len(employees):
+        return "exact"
+    return "memetic"
+
+# Hàm xếp lịch tự động qua backend được chọn. Với backend "auto", nếu bộ giải chính xác hết giới hạn tìm kiếm
+# mà chưa tìm được lịch cũng chưa chứng minh vô nghiệm thì chuyển sang Memetic Algorithm.
+# progress_callback(tỉ lệ hoàn thành, thông báo) được gọi trong suốt quá trình chạy.
+def solve(problem, progress_callback=None):
+    backend = choose_backend(problem)
+    if backend not in SOLVER_BACKENDS:
+        # Backend "exact" tự đăng ký khi module được nạp
+        import schedule_exact  # noqa: F401
+    result = SOLVER_BACKENDS[backend](problem, progress_callback)
+    cancelled = problem.cancel_event is not None and problem.cancel_event.is_set()
+    if problem.backend == "auto" and backend != "memetic" and not result.schedule and not result.certificate and not cancelled:
+        if problem.time_limit is not None:
+            remaining = problem.time_limit - result.elapsed_time
+            # Bộ giải chính xác chỉ kiểm tra đồng hồ sau mỗi lô nút nên có thể đã dùng hết thời gian: trả về kết quả
+            # "chưa xác định" của nó thay vì chạy Memetic Algorithm không còn ngân sách
+            if remaining <= 0:
+                logging.info(f"{result.message}. Hết thời gian cho phép, không chuyển sang Memetic Algorithm")
+                return result
+            problem = replace(problem, time_limit=remaining)
+        logging.info(f"{result.message}. Chuyển sang Memetic Algorithm")
+        return solve_memetic(problem, progress_callback)
+    return result
+
+# Hàm xếp lịch bằng Memetic Algorithm: phân bổ ca cố định Customer Service, phân bổ PRD rồi chạy GA.
+def solve_memetic(problem, progress_callback=None):
+    report = progress_callback or (lambda fraction, text: None)
+    start_time = time.time()
+    budget = SolveBudget(problem.max_generations, problem.time_limit, problem.stagnation_limit, problem.cancel_event,
+                         problem.on_improvement)
+    month_days = problem.month_days
+    sundays = problem.sundays
+    logging.info(f"Bắt đầu tạo lịch với Memetic Algorithm: {len(problem.employees)} nhân viên, {len(month_days)} ngày, bộ phận: {problem.department_filter}, max_generations: {problem.max_generations}, time_limit: {problem.time_limit}")
+    
+    employees = problem.scheduled_employees()
+    if not employees:
+        message = "Không có nhân viên để tạo lịch" if not problem.employees else f"Không có nhân viên thuộc bộ phận {problem.department_filter}"
+        logging.error(message)
+        return SolveResult({}, dict(problem.manual_shifts), float('inf'), [], message=message, run_report=RunReport())
+    
+    run_report = RunReport()
+    # Phân bổ ca cố định (bỏ qua nếu không đủ nhân viên Customer Service). Khi warm start, ca cố định CS và PRD
+    # được lấy từ lịch warm start, chỉ các ngày/ô bị ô sửa tay làm mất hiệu lực được phân bổ lại.
+    with run_report.phase("cs_fixed"):
+        fixed_shifts, cs_days, prd_days = dict(problem.manual_shifts), None, None
+        if problem.warm_start:
+            fixed_shifts, cs_days, prd_days = warm_start_fixed_shifts(EncodedProblem(
+                employees, month_days, sundays, problem.vx_min, problem.balance_morning_evening,
+                problem.max_morning_evening_diff, fixed_shifts, problem.selected_shifts, problem.warm_start,
+                problem.boundary), fixed_shifts)
+        manual_shifts, message = assign_fixed_cs_shifts(employees, month_days, fixed_shifts, sundays, problem.selected_shifts,
+                                                        problem.boundary, cs_days)
+    if manual_shifts is False:
+        manual_shifts = fixed_shifts
+    logging.info(message)
+    
+    # Phân bổ PRD để đảm bảo bằng số ngày Chủ nhật và phân bố đều
+    with run_report.phase("prd_allocation"):
+        manual_shifts = allocate_prd_shifts(employees, month_days, sundays, manual_shifts, problem.boundary, prd_days)
+    
+    # Lõi GA chạy trên mảng mã ca, chỉ chuyển về dict ở đầu ra
+    encoded = EncodedProblem(employees, month_days, sundays, problem.vx_min, problem.balance_morning_evening,
+                             problem.max_morning_evening_diff, manual_shifts, problem.selected_shifts,
+                             problem.warm_start, problem.boundary)
+    encoded.repair_mode = problem.repair_mode
+    rng = np.random.default_rng(problem.seed)
+    best_codes, best_fitness, generation = run_memetic_algorithm(
+        encoded, problem.max_generations, rng, problem.seed, problem.num_workers, problem.parallel_fitness,
+        problem.num_islands, report, run_report, budget)
+    
+    # Sửa chữa lần cuối trong thời gian còn lại, chỉ giữ nếu fitness giảm (kết quả không được tệ hơn lịch tốt nhất
+    # đã báo qua on_improvement); bỏ qua khi đã hết thời gian cho phép hoặc lần chạy bị hủy
+    best_schedule = None
+    if best_codes is not None:
+        if budget.expired() or budget.cancelled():
+            logging.info("Bỏ qua sửa chữa lần cuối vì hết thời gian hoặc đã bị hủy")
+        else:
+            with run_report.phase("final_repair"):
+                repaired = local_repair(best_codes.copy(), encoded, rng, run_report=run_report,
+                                        deadline=budget.deadline)
+                if array_fitness(repaired, encoded) < array_fitness(best_codes, encoded):
+                    best_codes = repaired
+        best_schedule = decode_schedule(best_codes, encoded.emp_ids)
+    
+    elapsed_time = time.time() - start_time
+    if best_schedule and any(shifts for shifts in best_schedule.values()):
+        with run_report.phase("final_evaluation"):
+            fitness, violations = evaluate_schedule(best_schedule, employees, month_days, sundays, problem.vx_min,
+                                                    problem.balance_morning_evening, problem.max_morning_evening_diff,
+                                                    manual_shifts, problem.selected_shifts, problem.boundary)
+        if run_report.feasible_at is not None:
+            time_to_feasible = run_report.feasible_at - start_time
+        else:
+            # Lần sửa chữa cuối có thể đưa lịch về khả thi
+            time_to_feasible = elapsed_time if fitness < HARD_CONSTRAINT_WEIGHT else None
+        shift_count = sum(len([s for s in shifts if s]) for shifts in best_schedule.values())
+        logging.info(f"Kết thúc Memetic Algorithm. Fitness tốt nhất: {fitness}, tổng số ca: {shift_count}, thời gian: {elapsed_time:.2f} giây")
+        logging.info(f"Thời gian theo giai đoạn: {run_report.to_dict()['timings']}, bộ đếm: {run_report.counters}")
+        if violations and logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info(f"Vi phạm còn lại: {'; '.join(format_violations(violations, employees, month_days))}")
+        report(1.0, f"Hoàn tất! Fitness tốt nhất: {fitness} trong {elapsed_time:.2f} giây ({budget.describe()})")
+        return SolveResult(best_schedule, manual_shifts, fitness, violations, generation, elapsed_time, message,
+                           run_report.counters.get("fitness_evaluations", 0), time_to_feasible, run_report,
+                           stop_reason=budget.stop_reason)
+    else:
+        logging.error(f"Không tìm được lịch hợp lệ sau {generation} thế hệ")
+        report(1.0, f"Thất bại! Không tìm được lịch hợp lệ sau {generation} thế hệ")
+        return SolveResult({}, manual_shifts, float('inf'), [], generation, elapsed_time, message,
+                           run_report.counters.get("fitness_evaluations", 0), run_report=run_report,
+                           stop_reason=budget.stop_reason)
+
+register_backend("memetic", solve_memetic)
@@ -0,0 +1,577 @@
+import logging
+import time
+import numpy as np
+from schedule_engine import (
+    HARD_CONSTRAINT_WEIGHT, PRD, V633, FAMILY_VX, FAMILY_V6, REST_VIOLATION, CONSECUTIVE_VX, CONSECUTIVE_OFF,
+    SHIFT_IS_WORK, SHIFT_FAMILY, SHIFT_CS_SLOT, SHIFT_CODES, EncodedProblem, RunReport, SolveResult,
+    array_fitness, evaluate_schedule, format_violations, decode_schedule, local_repair, register_backend
+)
+
+# Giới hạn tìm kiếm: số nút và số giây. Vượt giới hạn thì trả về kết quả chưa kết luận (không lịch, không chứng cứ).
+EXACT_NODE_LIMIT = 300_000
+EXACT_TIME_LIMIT = 20.0
+# Khi backend "auto" chọn bộ giải chính xác chỉ cho nó vài giây; chưa có kết luận thì solve() chuyển sang Memetic
+AUTO_EXACT_TIME_LIMIT = 3.0
+# Số nút của lần duyệt đầu tiên; mỗi lần khởi động lại (thứ tự thử ngẫu nhiên khác) giới hạn tăng gấp đôi
+RESTART_NODES = 1_000
+
+# Số ca bắt buộc mỗi ngày theo slot CS (14, 18, 29/33); V633 tối đa 1 ca mỗi ngày
+SLOT_DEMAND = (1, 1, 2)
+SLOT_LABELS = ("14", "18", "29/33")
+
+# Cặp ca [hôm trước, hôm sau] vi phạm ràng buộc cứng: giãn cách dưới 10 giờ, VX liên tiếp, PRD/AL/NPL liên tiếp
+HARD_PAIR = (REST_VIOLATION | CONSECUTIVE_VX | CONSECUTIVE_OFF).tolist()
+
+_IS_WORK = SHIFT_IS_WORK.tolist()
+_FAMILY = SHIFT_FAMILY.tolist()
+_CS_SLOT = SHIFT_CS_SLOT.tolist()
+
+
+# Hàm lọc các mã ca bị trội trong một pool: ca a trội hơn ca b nếu cùng nhóm VX/V8/V6, cùng slot CS (và cùng là V633
+# hay không) và mọi cặp ca vi phạm ràng buộc cứng với a cũng vi phạm với b. Nếu có lịch khả thi dùng b thì thay b bằng
+# a vẫn khả thi, nên chỉ cần thử các ca không bị trội (vài ca thay vì vài chục ca mỗi ô).
+def dominant_codes(shift_pool):
+    def signature(code):
+        return _FAMILY[code], _CS_SLOT[code], code == V633
+
+    def dominates(a, b):
+        return signature(a) == signature(b) and all(
+            (not HARD_PAIR[a][other] or HARD_PAIR[b][other]) and (not HARD_PAIR[other][a] or HARD_PAIR[other][b])
+            for other in range(len(HARD_PAIR)))
+
+    return [b for b in shift_pool
+            if not any(a != b and dominates(a, b) and (a < b or not dominates(b, a)) for a in shift_pool)]
+
+
+# Vượt giới hạn số nút hoặc thời gian tìm kiếm, hoặc lần chạy bị hủy (problem.cancel_event)
+class SearchLimitReached(Exception):
+    pass
+
+
+# Bộ giải chính xác (branch-and-bound) cho các ràng buộc cứng: ca bắt buộc CS mỗi ngày, số PRD bằng số Chủ nhật
+# và chỉ vào ngày hợp lệ, VX = V6 và tối thiểu vx_min, không quá 7 ngày làm liên tục, giãn cách và ca liên tiếp.
+# Duyệt từng ô theo ngày rồi theo nhân viên. Sau mỗi lần gán kiểm tra cận của nhân viên (PRD còn thiếu, chênh lệch
+# VX/V6, ngày nghỉ kế tiếp) và của ngày (ca bắt buộc còn thiếu so với số nhân viên CS còn trống); cuối mỗi ngày kiểm
+# tra cận toàn cục của CS: tổng số ô PRD/VX còn cần không vượt số ô ngoài ca bắt buộc của các ngày còn lại, và số
+# nhân viên buộc phải nghỉ trong k ngày tới không vượt số ô nghỉ có thể có. Ràng buộc mềm (V6 liên tiếp, cân bằng
+# sáng-tối) chỉ dùng để sắp thứ tự thử. Lần duyệt nào hết giới hạn nút của nó thì khởi động lại với thứ tự thử khác
+# và giới hạn gấp đôi; lần duyệt nào đi hết cây mà không có lịch là chứng minh vô nghiệm.
+class ExactSearch:
+    def __init__(self, problem, month_days, node_limit=EXACT_NODE_LIMIT, time_limit=EXACT_TIME_LIMIT, seed=None,
+                 cancel_event=None):
+        self.problem = problem
+        self.month_days = month_days
+        self.node_limit = node_limit
+        self.time_limit = time_limit
+        self.cancel_event = cancel_event
+        self.num_employees = num_employees = problem.num_employees
+        self.num_days = num_days = problem.num_days
+        self.manual = problem.manual_mask.tolist()
+        self.codes = problem.manual_codes.tolist()
+        self.invalid_prd_days = problem.invalid_prd_days.tolist()
+        self.is_cs = problem.is_cs.tolist()
+        self.cs_employees = [e for e in range(num_employees) if self.is_cs[e]]
+        self.pools = [dominant_codes(shift_pool.tolist()) for shift_pool in problem.shift_pools]
+        self.num_sundays = problem.num_sundays
+        self.vx_min = problem.vx_min
+        self.rng = np.random.default_rng(seed)
+        self.nodes = 0
+        self.backtracks = 0
+        self.restarts = 0
+        # Số lần cắt nhánh theo ngày, ngày nhiều nhất được dùng làm chứng cứ khi bài toán vô nghiệm
+        self.day_failures = [0] * num_days
+
+        # Theo nhân viên: số PRD/VX/V6 nhập tay, số ô trống và ô trống hợp lệ cho PRD sau mỗi ngày,
+        # ngày nghỉ nhập tay gần nhất sau mỗi ngày, số ca làm nhập tay liên tiếp ngay sau mỗi ngày
+        self.manual_prd = [0] * num_employees
+        self.manual_vx = [0] * num_employees
+        self.manual_v6 = [0] * num_employees
+        self.free_after = [[0] * num_days for _ in range(num_employees)]
+        self.free_prd_after = [[0] * num_days for _ in range(num_employees)]
+        self.next_manual_off = [[num_days] * num_days for _ in range(num_employees)]
+        self.manual_streak = [[0] * num_days for _ in range(num_employees)]
+        # Ngày trống hợp lệ cho PRD gần nhất tính đến mỗi ngày (-1 nếu không có)
+        self.last_prd_option = [[-1] * num_days for _ in range(num_employees)]
+        for e in range(num_employees):
+            option = -1
+            for day in range(num_days):
+                if not self.manual[e][day] and not self.invalid_prd_days[day]:
+                    option = day
+                self.last_prd_option[e][day] = option
+            free = free_prd = streak = 0
+            next_manual_off = num_days
+            for day in range(num_days - 1, -1, -1):
+                self.free_after[e][day] = free
+                self.free_prd_after[e][day] = free_prd
+                self.next_manual_off[e][day] = next_manual_off
+                self.manual_streak[e][day] = streak
+                code = self.codes[e][day]
+                streak = streak + 1 if self.manual[e][day] and _IS_WORK[code] else 0
+                if not self.manual[e][day]:
+                    free += 1
+                    if not self.invalid_prd_days[day]:
+                        free_prd += 1
+                else:
+                    self.manual_prd[e] += code == PRD
+                    self.manual_vx[e] += _FAMILY[code] == FAMILY_VX
+                    self.manual_v6[e] += _FAMILY[code] == FAMILY_V6
+                    if not _IS_WORK[code]:
+                        next_manual_off = day
+
+        # Theo ngày: số ca bắt buộc đã nhập tay (14, 18, 29/33, V633), số nhân viên CS còn trống sau mỗi vị trí,
+        # số ô ngoài ca bắt buộc của CS (capacity) và số ô đó có thể xếp PRD (off_capacity)
+        self.day_counts = [[0, 0, 0, 0] for _ in range(num_days)]
+        self.free_rest = [[0] * num_employees for _ in range(num_days)]
+        self.free_cs = [0] * num_days
+        self.capacity = [0] * num_days
+        self.off_capacity = [0] * num_days
+        for day in range(num_days):
+            rest = 0
+            for e in range(num_employees - 1, -1, -1):
+                self.free_rest[day][e] = rest
+                if not self.is_cs[e]:
+                    continue
+                if self.manual[e][day]:
+                    self._count_slot(day, self.codes[e][day], 1)
+                else:
+                    rest += 1
+            self.free_cs[day] = rest
+            self.capacity[day] = max(rest - self._missing(day), 0)
+            self.off_capacity[day] = 0 if self.invalid_prd_days[day] else self.capacity[day]
+        # Tổng capacity và off_capacity của các ngày sau mỗi ngày
+        self.capacity_after = [0] * num_days
+        self.off_capacity_after = [0] * num_days
+        for day in range(num_days - 2, -1, -1):
+            self.capacity_after[day] = self.capacity_after[day + 1] + self.capacity[day + 1]
+            self.off_capacity_after[day] = self.off_capacity_after[day + 1] + self.off_capacity[day + 1]
+
+        # Trạng thái khi duyệt: số VX, V6, PRD đã gán (không tính ô nhập tay), độ dài chuỗi làm việc đến từng ngày
+        self.vx = [0] * num_employees
+        self.v6 = [0] * num_employees
+        self.prd = [0] * num_employees
+        self.runs = [[0] * num_days for _ in range(num_employees)]
+        # Thứ tự thử: hạng phụ của từng mã ca và độ lệch tiến độ PRD/VX của từng nhân viên (thay đổi mỗi lần khởi động lại)
+        self.code_order = list(range(len(SHIFT_CODES)))
+        self.pace_shift = [0] * num_employees
+        self.initial_codes = [row[:] for row in self.codes]
+        self.initial_day_counts = [counts[:] for counts in self.day_counts]
+
+    # Hàm đưa trạng thái duyệt về ban đầu trước một lần khởi động lại, xáo thứ tự thử
+    def _restart(self):
+        self.restarts += 1
+        self.day_failures = [0] * self.num_days
+        self.codes = [row[:] for row in self.initial_codes]
+        self.day_counts = [counts[:] for counts in self.initial_day_counts]
+        self.vx = [0] * self.num_employees
+        self.v6 = [0] * self.num_employees
+        self.prd = [0] * self.num_employees
+        self.runs = [[0] * self.num_days for _ in range(self.num_employees)]
+        self.code_order = self.rng.permutation(len(SHIFT_CODES)).tolist()
+        self.pace_shift = self.rng.integers(-3, 4, size=self.num_employees).tolist()
+
+    def _count_slot(self, day, code, sign):
+        slot = _CS_SLOT[code]
+        if slot:
+            counts = self.day_counts[day]
+            counts[slot - 1] += sign
+            if code == V633:
+                counts[3] += sign
+
+    # Số ca bắt buộc CS còn thiếu của một ngày
+    def _missing(self, day):
+        counts = self.day_counts[day]
+        return sum(max(demand - counts[slot], 0) for slot, demand in enumerate(SLOT_DEMAND))
+
+    # Số PRD còn phải xếp và số VX còn thiếu (để VX = V6 và đạt vx_min) của nhân viên e
+    def _needs(self, e):
+        prd_needed = self.num_sundays - self.prd[e] - self.manual_prd[e]
+        vx_total = self.vx[e] + self.manual_vx[e]
+        v6_total = self.v6[e] + self.manual_v6[e]
+        return prd_needed, max(self.vx_min, v6_total) - vx_total
+
+    # Hàm kiểm tra các điều kiện cần trước khi tìm kiếm, trả về danh sách lý do vô nghiệm (rỗng nếu chưa thấy)
+    def precheck(self):
+        reasons = []
+        problem = self.problem
+        if not self.cs_employees:
+            reasons.append("Không có nhân viên Customer Service để xếp ca bắt buộc mỗi ngày")
+        # Nhân viên CS có ca thuộc từng slot trong tập ca được chọn; thiếu người cho cả kỳ thì chỉ báo một lần
+        eligible = [[e for e in self.cs_employees if any(_CS_SLOT[code] == slot + 1 for code in self.pools[e])]
+                    for slot in range(len(SLOT_DEMAND))]
+        short_slots = set()
+        for slot, demand in enumerate(SLOT_DEMAND):
+            if self.cs_employees and not eligible[slot]:
+                reasons.append(f"Không nhân viên CS nào có thể nhận ca bắt buộc slot {SLOT_LABELS[slot]}")
+                short_slots.add(slot)
+            elif self.cs_employees and len(eligible[slot]) < demand:
+                reasons.append(f"Chỉ {len(eligible[slot])} nhân viên CS có thể nhận ca slot {SLOT_LABELS[slot]} "
+                               f"nhưng mỗi ngày cần {demand} ca")
+                short_slots.add(slot)
+        for day, date in enumerate(self.month_days if self.cs_employees else []):
+            counts = self.day_counts[day]
+            label = date.strftime('%d/%m')
+            for slot, demand in enumerate(SLOT_DEMAND):
+                if counts[slot] > demand:
+                    reasons.append(f"Ngày {label}: ca nhập tay slot {SLOT_LABELS[slot]} vượt quá {demand} ca")
+            if counts[3] > 1:
+                reasons.append(f"Ngày {label}: nhập tay hơn 1 ca V633")
+            if self._missing(day) > self.free_cs[day]:
+                reasons.append(f"Ngày {label}: cần thêm {self._missing(day)} ca bắt buộc CS nhưng chỉ còn "
+                               f"{self.free_cs[day]} nhân viên CS trống")
+                continue
+            # Đủ người trống nhưng không đủ người nhận được ca của một slot
+            for slot, demand in enumerate(SLOT_DEMAND):
+                available = sum(not self.manual[e][day] for e in eligible[slot])
+                if slot not in short_slots and counts[slot] + available < demand:
+                    reasons.append(f"Ngày {label}: slot {SLOT_LABELS[slot]} cần {demand} ca nhưng chỉ có "
+                                   f"{counts[slot]} ca nhập tay và {available} nhân viên CS trống nhận được ca này")
+        for e, emp_id in enumerate(problem.emp_ids):
+            free_prd = self.free_prd_after[e][0] + (not self.manual[e][0] and not self.invalid_prd_days[0])
+            if self.manual_prd[e] > self.num_sundays:
+                reasons.append(f"{emp_id}: nhập tay {self.manual_prd[e]} PRD, nhiều hơn số Chủ nhật ({self.num_sundays})")
+            elif self.manual_prd[e] + free_prd < self.num_sundays:
+                reasons.append(f"{emp_id}: chỉ còn {free_prd} ngày hợp lệ để xếp {self.num_sundays - self.manual_prd[e]} PRD")
+            if self.vx_min > 0 and not any(_FAMILY[code] == FAMILY_VX for code in self.pools[e]):
+                reasons.append(f"{emp_id}: không có ca VX nào được chọn để đạt tối thiểu {self.vx_min} ca VX")
+            previous = int(problem.boundary_code[e])
+            run = int(problem.boundary_run[e])
+            for day, date in enumerate(self.month_days):
+                code = self.codes[e][day]
+                if not self.manual[e][day]:
+                    previous = run = 0
+                    continue
+                if HARD_PAIR[previous][code]:
+                    reasons.append(f"{emp_id}: ca nhập tay {SHIFT_CODES[previous] or 'kỳ trước'} → {SHIFT_CODES[code]} "
+                                   f"ngày {date.strftime('%d/%m')} vi phạm giãn cách/ca liên tiếp")
+                run = run + 1 if _IS_WORK[code] else 0
+                if run == 8:
+                    reasons.append(f"{emp_id}: ca nhập tay tạo chuỗi quá 7 ngày làm liên tục đến ngày {date.strftime('%d/%m')}")
+                previous = code
+        # Mỗi PRD và mỗi ca VX của CS chiếm một ô ngoài ca bắt buộc; PRD chỉ vào ô của ngày hợp lệ (off_capacity)
+        if self.cs_employees:
+            prd_needed = sum(max(self._needs(e)[0], 0) for e in self.cs_employees)
+            prd_capacity = sum(self.off_capacity)
+            if prd_needed > prd_capacity:
+                reasons.append(f"Nhân viên CS cần {prd_needed} PRD nhưng sau khi xếp đủ ca bắt buộc mỗi ngày chỉ còn "
+                               f"{prd_capacity} ô ở ngày hợp lệ cho PRD")
+            needed = sum(max(self._needs(e)[0], 0) + max(self._needs(e)[1], 0) for e in self.cs_employees)
+            total_capacity = sum(self.capacity)
+            if needed > total_capacity:
+                reasons.append(f"Nhân viên CS cần {needed} ô PRD/VX nhưng sau khi xếp đủ ca bắt buộc mỗi ngày chỉ còn "
+                               f"{total_capacity} ô")
+        return reasons
+
+    # Hàm kiểm tra cận của nhân viên e sau khi gán ngày day: PRD còn thiếu phải xếp được vào các ngày hợp lệ còn
+    # trống, chênh lệch VX/V6 và số VX tối thiểu phải bù được bằng các ô làm việc còn trống, và số PRD còn thiếu phải
+    # đủ để chia các ngày còn lại thành chuỗi làm việc không quá 7 ngày
+    def _employee_feasible(self, e, day):
+        prd_needed, vx_needed = self._needs(e)
+        if prd_needed < 0 or prd_needed > self.free_prd_after[e][day]:
+            return False
+        vx_total = self.vx[e] + self.manual_vx[e]
+        v6_total = self.v6[e] + self.manual_v6[e]
+        target = max(vx_total, v6_total, self.vx_min)
+        if 2 * target - vx_total - v6_total > self.free_after[e][day] - prd_needed:
+            return False
+        # VX không được xếp hai ngày liền nhau
+        if target - vx_total > (self.free_after[e][day] + 1) // 2:
+            return False
+        return self._min_prd_for_runs(e, day) <= prd_needed
+
+    # Hàm tính số PRD ít nhất phải xếp sau ngày day để nhân viên e không làm quá 7 ngày liên tục. Các ô nghỉ nhập tay
+    # chia phần còn lại thành các đoạn độc lập; trong mỗi đoạn đặt PRD muộn nhất có thể là tối ưu.
+    def _min_prd_for_runs(self, e, day):
+        return self._min_prd_from(e, day, self.runs[e][day])
+
+    def _min_prd_from(self, e, position, run):
+        count = 0
+        while True:
+            deadline = position + 8 - run
+            stop = self.next_manual_off[e][position]
+            if deadline >= stop:
+                if stop >= self.num_days:
+                    return count
+                position, run = stop, 0
+                continue
+            option = self.last_prd_option[e][deadline]
+            if option <= position:
+                return self.num_days
+            position, run, count = option, 0, count + 1
+
+    # Hàm kiểm tra ngày day sau khi gán nhân viên e: không vượt số ca bắt buộc, và các ca còn thiếu giao được cho
+    # các nhân viên CS sau e còn trống
+    def _day_feasible(self, day, e):
+        counts = self.day_counts[day]
+        if counts[3] > 1 or any(counts[slot] > demand for slot, demand in enumerate(SLOT_DEMAND)):
+            return False
+        return self._missing(day) <= self.free_rest[day][e] and self._slots_assignable(day, e + 1)
+
+    # Hàm kiểm tra cận toàn cục của CS sau khi gán ô (e, day): tổng số ô PRD/VX còn cần không vượt số ô ngoài ca bắt
+    # buộc còn lại (kể cả phần còn trống của ngày day), và số nhân viên buộc phải nghỉ trong k ngày tới không vượt số ô
+    # nghỉ có thể có. Nhân viên chưa gán ngày day được tính như làm ngày day, bù lại ô ngoài ca bắt buộc còn trống của
+    # ngày day được tính là ô nghỉ. Xong ngày thì kiểm tra thêm các ca bắt buộc ngày hôm sau.
+    def _cs_feasible(self, day, e):
+        end_of_day = e == self.num_employees - 1
+        today = 0 if end_of_day else max(self.free_rest[day][e] - self._missing(day), 0)
+        today_off = 0 if self.invalid_prd_days[day] else today
+        needed = prd_total = 0
+        for other in self.cs_employees:
+            prd_needed, vx_needed = self._needs(other)
+            prd_total += prd_needed
+            needed += prd_needed + max(vx_needed, 0)
+        if needed > self.capacity_after[day] + today or prd_total > self.off_capacity_after[day] + today_off:
+            return False
+
+        runs = []
+        for other in self.cs_employees:
+            if other <= e or self.manual[other][day]:
+                runs.append((self.runs[other][day], other))
+            else:
+                runs.append(((self.runs[other][day - 1] if day else int(self.problem.boundary_run[other])) + 1, other))
+        off_capacity = today_off
+        for k in range(1, 8):
+            if day + k >= self.num_days:
+                break
+            off_capacity += self.off_capacity[day + k]
+            forced = sum(1 for run, other in runs if run >= 8 - k and self.next_manual_off[other][day] > day + k)
+            if forced > off_capacity:
+                return False
+        if not end_of_day or day + 1 >= self.num_days:
+            return True
+        return self._prd_windows_feasible(day) and self._slots_assignable(day + 1, 0)
+
+    # Hàm kiểm tra khi xong ngày day: nhân viên CS không còn dư PRD (số PRD còn thiếu vừa đủ chia các chuỗi làm việc)
+    # phải đặt PRD kế tiếp trong một khoảng ngày xác định; với mọi khoảng [a, b] dài tối đa 8 ngày, số nhân viên có
+    # khoảng bắt buộc nằm trong [a, b] không vượt số ô nghỉ có thể có của [a, b]
+    def _prd_windows_feasible(self, day):
+        windows = []
+        for e in self.cs_employees:
+            run = self.runs[e][day]
+            deadline = day + 8 - run
+            if deadline >= self.next_manual_off[e][day]:
+                continue
+            prd_needed = self._needs(e)[0]
+            if self._min_prd_from(e, day, run) < prd_needed:
+                continue
+            earliest = next((x for x in range(day + 1, deadline + 1)
+                             if not self.manual[e][x] and not self.invalid_prd_days[x]
+                             and self._min_prd_from(e, x, 0) <= prd_needed - 1), deadline)
+            windows.append((earliest, deadline))
+        if len(windows) < 2:
+            return True
+        for start in {earliest for earliest, _ in windows}:
+            for end in {deadline for _, deadline in windows}:
+                if end < start:
+                    continue
+                inside = sum(1 for earliest, deadline in windows if start <= earliest and deadline <= end)
+                if inside > sum(self.off_capacity[start:end + 1]):
+                    return False
+        return True
+
+    # Hàm kiểm tra các ca bắt buộc còn thiếu của ngày day (đã gán xong ngày trước) có thể giao cho các nhân viên CS
+    # còn trống từ vị trí first trở đi, mỗi người một ca: ghép cặp slot - nhân viên theo mã ca còn hợp lệ sau ca hôm
+    # trước và trước ô nhập tay hôm sau
+    def _slots_assignable(self, day, first):
+        counts = self.day_counts[day]
+        slots = [slot for slot, demand in enumerate(SLOT_DEMAND) for _ in range(demand - counts[slot])]
+        if not slots:
+            return True
+        following = day + 1 < self.num_days
+        options = []
+        for slot in slots:
+            candidates = []
+            for e in self.cs_employees:
+                if e < first or self.manual[e][day] or (self.runs[e][day - 1] if day else self.problem.boundary_run[e]) >= 7:
+                    continue
+                previous = self.codes[e][day - 1] if day else int(self.problem.boundary_code[e])
+                after = self.codes[e][day + 1] if following and self.manual[e][day + 1] else 0
+                if any(_CS_SLOT[code] == slot + 1 and not HARD_PAIR[previous][code] and not HARD_PAIR[code][after]
+                       for code in self.pools[e]):
+                    candidates.append(e)
+            options.append(candidates)
+        # Ghép cặp bằng đường tăng (số slot thiếu mỗi ngày tối đa 4)
+        owner = {}
+
+        def augment(index, visited):
+            for e in options[index]:
+                if e not in visited:
+                    visited.add(e)
+                    if e not in owner or augment(owner[e], visited):
+                        owner[e] = index
+                        return True
+            return False
+
+        return all(augment(index, set()) for index in range(len(slots)))
+
+    # Hàm sắp thứ tự mã ca thử cho ô (e, day). Số ô PRD/VX của mỗi nhân viên CS được rải đều theo kỳ: nhân viên đang
+    # chậm tiến độ (hoặc đã làm 6 ngày liên tục) thử PRD/VX trước, còn lại thử ca bắt buộc còn thiếu trước. Giữa PRD
+    # và VX, loại nào còn thiếu nhiều hơn so với số ô còn xếp được thì thử trước; trong mỗi nhóm ưu tiên nhóm ca còn
+    # thiếu VX/V6 và tránh V6 liên tiếp.
+    def _candidates(self, e, day, previous, run):
+        counts = self.day_counts[day]
+        prd_needed, vx_needed = self._needs(e)
+        done = self.prd[e] + self.vx[e]
+        nonslot_first = not self.is_cs[e] or run >= 6 or \
+            done * self.num_days < (done + prd_needed + max(vx_needed, 0)) * (day + 1 + self.pace_shift[e])
+        # Nhóm ca còn thiếu để đạt VX = V6 >= vx_min được ưu tiên, ca V8 trung tính, nhóm đã đủ thử sau cùng
+        vx_total = self.vx[e] + self.manual_vx[e]
+        v6_total = self.v6[e] + self.manual_v6[e]
+        target = max(vx_total, v6_total, self.vx_min)
+        short = {FAMILY_VX: target > vx_total, FAMILY_V6: target > v6_total}
+
+        candidates = []
+        for code in self.pools[e]:
+            slot = _CS_SLOT[code] if self.is_cs[e] else 0
+            if slot and counts[slot - 1] >= SLOT_DEMAND[slot - 1]:
+                continue
+            family = _FAMILY[code]
+            rank = ((slot == 0) != nonslot_first, 0 if short.get(family) else 2 if family in short else 1,
+                    family == FAMILY_V6 and _FAMILY[previous] == FAMILY_V6, self.code_order[code])
+            candidates.append((rank, code))
+        candidates = [code for _, code in sorted(candidates)]
+        if not self.invalid_prd_days[day] and prd_needed > 0:
+            prd_first = run >= 6 or (nonslot_first and prd_needed * (self.free_after[e][day] + 1) >=
+                                     max(vx_needed, 0) * (self.free_prd_after[e][day] + 1))
+            position = 0 if prd_first else sum(1 for code in candidates if not _CS_SLOT[code]) if nonslot_first \
+                else len(candidates)
+            candidates.insert(position, PRD)
+        return candidates
+
+    # Hàm cập nhật bộ đếm khi gán mã ca cho ô trống (e, day), sign=-1 để hoàn tác
+    def _apply(self, e, day, code, sign):
+        family = _FAMILY[code]
+        if family == FAMILY_VX:
+            self.vx[e] += sign
+        elif family == FAMILY_V6:
+            self.v6[e] += sign
+        if code == PRD:
+            self.prd[e] += sign
+        if self.is_cs[e]:
+            self._count_slot(day, code, sign)
+
+    def _out_of_budget(self):
+        return (self.nodes >= self.node_limit or time.perf_counter() - self.start > self.time_limit
+                or (self.cancel_event is not None and self.cancel_event.is_set()))
+
+    def _check_limits(self):
+        self.nodes += 1
+        if self.nodes >= self.attempt_limit or (self.nodes % 1000 == 0 and self._out_of_budget()):
+            raise SearchLimitReached()
+
+    # Hàm duyệt đệ quy ô thứ index (theo ngày rồi theo nhân viên), trả về True nếu tìm được lịch
+    def _search(self, index):
+        if index == self.num_days * self.num_employees:
+            return True
+        day, e = divmod(index, self.num_employees)
+        self._check_limits()
+        previous = self.codes[e][day - 1] if day > 0 else int(self.problem.boundary_code[e])
+        run = self.runs[e][day - 1] if day > 0 else int(self.problem.boundary_run[e])
+        manual = self.manual[e][day]
+        end_of_day = e == self.num_employees - 1
+        # Ô nhập tay ngay sau: mã ca phải ghép hợp lệ với nó và chuỗi làm việc nối tiếp không quá 7 ngày
+        after = self.codes[e][day + 1] if day + 1 < self.num_days and self.manual[e][day + 1] else 0
+        streak = self.manual_streak[e][day]
+        for code in [self.codes[e][day]] if manual else self._candidates(e, day, previous, run):
+            if HARD_PAIR[previous][code] or HARD_PAIR[code][after] or (_IS_WORK[code] and run + streak >= 7):
+                continue
+            self.codes[e][day] = code
+            self.runs[e][day] = run + 1 if _IS_WORK[code] else 0
+            if not manual:
+                self._apply(e, day, code, 1)
+            if self._employee_feasible(e, day) and self._day_feasible(day, e) \
+                    and (not (self.is_cs[e] or end_of_day) or self._cs_feasible(day, e)) \
+                    and self._search(index + 1):
+                return True
+            if not manual:
+                self._apply(e, day, code, -1)
+            self.backtracks += 1
+        self.day_failures[day] += 1
+        if not manual:
+            self.codes[e][day] = 0
+        return False
+
+    # Hàm chạy tìm kiếm, trả về (trạng thái "feasible"/"infeasible"/"unknown", mã ca hoặc None, chứng cứ)
+    def run(self):
+        self.start = time.perf_counter()
+        reasons = self.precheck()
+        if reasons:
+            return "infeasible", None, reasons
+        attempt_nodes = RESTART_NODES
+        while True:
+            self.attempt_limit = min(self.nodes + attempt_nodes, self.node_limit)
+            try:
+                found = self._search(0)
+                break
+            except SearchLimitReached:
+                if self._out_of_budget():
+                    return "unknown", None, []
+                attempt_nodes *= 2
+                self._restart()
+        if found:
+            return "feasible", self.codes, []
+        worst_day = max(range(self.num_days), key=lambda day: self.day_failures[day])
+        return "infeasible", None, [
+            f"Đã duyệt hết {self.nodes} nút, không tồn tại lịch thỏa mọi ràng buộc cứng; "
+            f"ngày bị cắt nhánh nhiều nhất: {self.month_days[worst_day].strftime('%d/%m')}"]
+
+
+# Backend "exact": giải chính xác các ràng buộc cứng bằng ExactSearch. Trả về lịch đã chứng minh không vi phạm
+# ràng buộc cứng, hoặc chứng cứ vô nghiệm, hoặc (khi hết giới hạn tìm kiếm) kết quả rỗng không có chứng cứ.
+def solve_exact(problem, progress_callback=None):
+    report = progress_callback or (lambda fraction, text: None)
+    start_time = time.time()
+    month_days = problem.month_days
+    manual_shifts = dict(problem.manual_shifts)
+    employees = problem.scheduled_employees()
+    run_report = RunReport()
+    if not employees:
+        message = "Không có nhân viên để tạo lịch"
+        return SolveResult({}, manual_shifts, float('inf'), [], message=message, run_report=run_report,
+                           backend="exact", certificate=[message])
+
+    encoded = EncodedProblem(employees, month_days, problem.sundays, problem.vx_min, problem.balance_morning_evening,
+                             problem.max_morning_evening_diff, manual_shifts, problem.selected_shifts,
+                             boundary=problem.boundary)
+    report(0.0, f"Tìm kiếm chính xác cho {len(employees)} nhân viên...")
+    time_limit = AUTO_EXACT_TIME_LIMIT if problem.backend == "auto" else EXACT_TIME_LIMIT
+    if problem.time_limit is not None:
+        time_limit = min(time_limit, problem.time_limit)
+    search = ExactSearch(encoded, month_days, time_limit=time_limit, seed=problem.seed, cancel_event=problem.cancel_event)
+    with run_report.phase("exact_search"):
+        status, codes, certificate = search.run()
+    run_report.count("exact_nodes", search.nodes)
+    run_report.count("exact_backtracks", search.backtracks)
+    run_report.count("exact_restarts", search.restarts)
+    elapsed_time = time.time() - start_time
+    logging.info(f"Tìm kiếm chính xác: {status}, {search.nodes} nút, {search.backtracks} lần quay lui, {elapsed_time:.2f} giây")
+
+    if status != "feasible":
+        if status == "infeasible":
+            message = "Bài toán vô nghiệm: " + "; ".join(certificate)
+        else:
+            message = f"Tìm kiếm chính xác dừng sau {search.nodes} nút mà chưa có kết luận"
+        report(1.0, message)
+        return SolveResult({}, manual_shifts, float('inf'), [], 0, elapsed_time, message, 0,
+                           run_report=run_report, backend="exact", certificate=certificate)
+
+    # Tìm kiếm chỉ xét ràng buộc cứng; chạy thêm local repair để giảm vi phạm mềm, giữ lại nếu fitness tốt hơn
+    best_codes = np.array(codes, dtype=np.int8)
+    with run_report.phase("final_repair"):
+        repaired = local_repair(best_codes.copy(), encoded, np.random.default_rng(problem.seed), run_report=run_report)
+        if array_fitness(repaired, encoded) < array_fitness(best_codes, encoded):
+            best_codes = repaired
+    schedule = decode_schedule(best_codes, encoded.emp_ids)
+    with run_report.phase("final_evaluation"):
+        fitness, violations = evaluate_schedule(schedule, employees, month_days, problem.sundays, problem.vx_min,
+                                                problem.balance_morning_evening, problem.max_morning_evening_diff,
+                                                manual_shifts, problem.selected_shifts, problem.boundary)
+    if fitness >= HARD_CONSTRAINT_WEIGHT:
+        # Không xảy ra nếu mô hình khớp với calculate_fitness; ghi lại để phát hiện sai lệch
+        logging.error(f"Lịch của bộ giải chính xác còn vi phạm cứng: {'; '.join(format_violations(violations, employees, month_days))}")
+    message = f"Bộ giải chính xác tìm được lịch sau {search.nodes} nút"
+    report(1.0, f"Hoàn tất! Fitness: {fitness} trong {elapsed_time:.2f} giây")
+    return SolveResult(schedule, manual_shifts, fitness, violations, 0, elapsed_time, message, 1, elapsed_time,
+                       run_report, backend="exact")
+
+
+register_backend("exact", solve_exact)
@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from functools import lru_cache
+from schedule_db import (
+    DB_PATH, DEFAULT_STORE, create_solver_job, start_solver_job, update_solver_job_progress, finish_solver_job,
+    request_solver_job_cancel, fail_interrupted_solver_jobs, save_employee_schedules_to_db, save_run_report_to_db,
+    load_schedule_from_db, load_manual_shifts_from_db, save_schedule_version
+)
+from schedule_engine import EmployeeRegistry, solve, format_violations
+
+# Số lần xếp lịch chạy đồng thời; các lần chạy khác chờ trong hàng đợi
+JOB_WORKERS = 2
+
+# Khoảng thời gian tối thiểu (giây) giữa hai lần ghi tiến độ vào DB (mỗi lần ghi cũng đọc cờ hủy)
+PROGRESS_INTERVAL = 0.5
+
+
+# Bộ chạy nền cho solve(): mỗi lần xếp lịch là một dòng trong bảng solver_jobs và chạy trên một luồng của pool,
+# nên phiên Streamlit không bị chặn và kết quả không mất khi tải lại trang. Tiến độ, fitness tốt nhất và trạng thái
+# được ghi vào DB để giao diện đọc lại; hủy qua cờ trong DB (kiểm tra mỗi lần ghi tiến độ) hoặc trực tiếp bằng cancel().
+# Khi chạy xong, lịch và ca thủ công chỉ được ghi cho các nhân viên đã xếp, nên các bộ phận khác nhau của cùng kỳ
+# có thể xếp lịch song song.
+class SolverJobRunner:
+    def __init__(self, max_workers=JOB_WORKERS, db_path=DB_PATH):
+        self.db_path = db_path
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="solver-job")
+        self.cancel_events = {}
+        self._lock = threading.Lock()
+        # Các lần chạy còn dang dở trong DB thuộc về tiến trình trước (ứng dụng đã khởi động lại)
+        interrupted = fail_interrupted_solver_jobs(db_path)
+        if interrupted:
+            logging.warning(f"Đánh dấu lỗi {interrupted} lần xếp lịch bị gián đoạn")
+
+    # Hàm đưa một bài toán vào hàng đợi, trả về id lần chạy
+    def submit(self, problem, store=DEFAULT_STORE):
+        # Lần chạy dùng bản sao danh bạ nhân viên: giao diện vẫn có thể thêm/sửa/xóa nhân viên trong lúc chạy
+        problem = replace(problem, employees=EmployeeRegistry(problem.employees))
+        job_id = create_solver_job(problem.month_days, problem.department_filter, store, self.db_path)
+        with self._lock:
+            self.cancel_events[job_id] = threading.Event()
+        self.executor.submit(self._run, job_id, problem, store)
+        logging.info(f"Đưa lần xếp lịch {job_id} ({problem.department_filter}) vào hàng đợi")
+        return job_id
+
+    # Hàm yêu cầu hủy một lần chạy, trả về True nếu lần chạy chưa kết thúc
+    def cancel(self, job_id):
+        with self._lock:
+            event = self.cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        return request_solver_job_cancel(job_id, self.db_path)
+
+    def _run(self, job_id, problem, store):
+        with self._lock:
+            cancel_event = self.cancel_events[job_id]
+        try:
+            if not start_solver_job(job_id, self.db_path):
+                return
+            self._solve(job_id, problem, store, cancel_event)
+        except Exception as e:
+            logging.exception(f"Lần xếp lịch {job_id} bị lỗi")
+            finish_solver_job(job_id, "failed", f"Lỗi: {e}", db_path=self.db_path)
+        finally:
+            with self._lock:
+                self.cancel_events.pop(job_id, None)
+
+    def _solve(self, job_id, problem, store, cancel_event):
+        state = {"best_fitness": None, "message": "", "written_at": 0.0}
+
+        def write_progress(fraction):
+            state["written_at"] = time.monotonic()
+            if update_solver_job_progress(job_id, fraction, state["message"], state["best_fitness"], self.db_path):
+                cancel_event.set()
+
+        def report(fraction, text):
+            state["message"] = text
+            if time.monotonic() - state["written_at"] >= PROGRESS_INTERVAL:
+                write_progress(fraction)
+
+        def on_improvement(fitness):
+            state["best_fitness"] = fitness
+
+        problem = replace(problem, cancel_event=cancel_event, on_improvement=on_improvement)
+        result = solve(problem, report)
+        save_run_report_to_db(result, problem.month_days, store, self.db_path)
+        if cancel_event.is_set():
+            finish_solver_job(job_id, "cancelled", "Đã hủy, lịch hiện tại được giữ nguyên", state["best_fitness"],
+                              db_path=self.db_path)
+            logging.info(f"Lần xếp lịch {job_id} đã bị hủy")
+            return
+
+        month_days = problem.month_days
+        if not result.schedule:
+            # Không có lịch (vô nghiệm, không có nhân viên hoặc GA không tìm được): giữ nguyên lịch và ca nhập tay đã lưu
+            if result.certificate:
+                message = "Không tồn tại lịch thỏa mọi ràng buộc cứng"
+            elif not problem.scheduled_employees():
+                message = result.message
+            else:
+                message = state["message"] or "Không tìm được lịch hợp lệ"
+            finish_solver_job(job_id, "failed", message, details=result.certificate, db_path=self.db_path)
+            logging.warning(f"Lần xếp lịch {job_id} không tạo được lịch: {message}")
+            return
+
+        emp_ids = [emp["ID"] for emp in problem.scheduled_employees()]
+        # Như khi xếp lịch trực tiếp: các ca xếp được cũng trở thành ca nhập tay (giữ ca nhập tay sẵn có)
+        manual_shifts = dict(result.manual_shifts)
+        for emp_id, shifts in result.schedule.items():
+            for day, shift in enumerate(shifts):
+                if shift:
+                    manual_shifts.setdefault((emp_id, day), shift)
+        save_employee_schedules_to_db(result.schedule, manual_shifts, month_days, emp_ids, store, self.db_path)
+        save_schedule_version(load_schedule_from_db(month_days, store, self.db_path),
+                              load_manual_shifts_from_db(month_days, store, self.db_path), month_days, "solver",
+                              result.fitness, store, self.db_path)
+        details = format_violations(result.violations, problem.scheduled_employees(), month_days)
+        finish_solver_job(job_id, "done", state["message"], result.fitness, details, self.db_path)
+        logging.info(f"Lần xếp lịch {job_id} hoàn tất: {state['message']}")
+
+
+# Hàm lấy bộ chạy nền dùng chung cho cả tiến trình (mọi phiên Streamlit dùng chung một hàng đợi)
+@lru_cache(maxsize=None)
+def get_job_runner(db_path=DB_PATH):
+    return SolverJobRunner(db_path=db_path)
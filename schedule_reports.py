@@ -0,0 +1,162 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from schedule_engine import (
+    NUM_SHIFT_CODES, SHIFT_CODES, SHIFT_FAMILY, SHIFT_IS_MORNING, FAMILY_OFF, Violation, encode_schedule,
+    format_violation
+)
+
+# Nhóm thống kê của từng mã ca: ô trống, PRD, AL, NPL, rồi mỗi nhóm ca VX/V8/V6 tách ca sáng và ca chiều
+STAT_EMPTY, STAT_PRD, STAT_AL, STAT_NPL = 0, 1, 2, 3
+STAT_MORNING = [4, 6, 8]
+STAT_EVENING = [5, 7, 9]
+STAT_VX, STAT_V8, STAT_V6 = [4, 5], [6, 7], [8, 9]
+NUM_STAT_CATEGORIES = 10
+
+# Hàm dựng bảng mã ca -> nhóm thống kê
+def build_stat_table():
+    category = np.zeros(NUM_SHIFT_CODES, dtype=np.intp)
+    for code, shift in enumerate(SHIFT_CODES):
+        if shift in ("PRD", "AL", "NPL"):
+            category[code] = {"PRD": STAT_PRD, "AL": STAT_AL, "NPL": STAT_NPL}[shift]
+        elif SHIFT_FAMILY[code] != FAMILY_OFF:
+            category[code] = 2 + 2 * SHIFT_FAMILY[code] + (0 if SHIFT_IS_MORNING[code] else 1)
+    return category
+
+STAT_CATEGORY = build_stat_table()
+
+# Số bộ thống kê giữ lại trong bộ nhớ đệm (mỗi bộ ứng với một lịch và một danh sách nhân viên)
+STATS_CACHE_SIZE = 8
+
+# Hàm chia kỳ lịch thành các tuần bắt đầu từ Thứ Hai, trả về (chỉ số ngày của từng tuần, nhãn tuần)
+@lru_cache(maxsize=32)
+def split_weeks(month_days):
+    week_indices = []
+    for i, date in enumerate(month_days):
+        if date.weekday() == 0 or not week_indices:  # Thứ Hai
+            week_indices.append([])
+        week_indices[-1].append(i)
+    week_labels = [f"Tuần {i+1} ({month_days[week[0]].strftime('%d/%m')}-{month_days[week[-1]].strftime('%d/%m')})"
+                   for i, week in enumerate(week_indices)]
+    return week_indices, week_labels
+
+# Thống kê của một lịch: đếm số ô theo nhóm thống kê cho từng ngày và từng nhân viên bằng hai lần bincount trên
+# mảng mã ca, rồi suy ra số ca nghỉ/ngày, thống kê tuần (cộng theo đoạn ngày của từng tuần) và tổng ca của từng
+# nhân viên. Dùng chung cho hàng tổng ca nghỉ/ngày ở Tab 2, thống kê tuần ở Tab 3 và hai báo cáo CSV.
+class ScheduleStats:
+    def __init__(self, codes, emp_ids, month_days):
+        self.emp_ids = emp_ids
+        self.week_indices, self.week_labels = split_weeks(tuple(month_days))
+        num_emps, num_days = codes.shape
+        category = STAT_CATEGORY[codes]
+        self.day_counts = np.bincount(
+            (category * num_days + np.arange(num_days)).ravel(), minlength=NUM_STAT_CATEGORIES * num_days
+        ).reshape(NUM_STAT_CATEGORIES, num_days)
+        self.emp_counts = np.bincount(
+            (category * num_emps + np.arange(num_emps)[:, np.newaxis]).ravel(),
+            minlength=NUM_STAT_CATEGORIES * num_emps
+        ).reshape(NUM_STAT_CATEGORIES, num_emps)
+        self.daily_off = self.day_counts[[STAT_PRD, STAT_AL, STAT_NPL]].sum(axis=0)
+        week_starts = [week[0] for week in self.week_indices]
+        week_counts = np.add.reduceat(self.day_counts, week_starts, axis=1) if num_days else self.day_counts
+        self.weekly_stats = [{
+            'prd': int(week_counts[STAT_PRD, w]),
+            'al': int(week_counts[STAT_AL, w]),
+            'npl': int(week_counts[STAT_NPL, w]),
+            'morning': int(week_counts[STAT_MORNING, w].sum()),
+            'evening': int(week_counts[STAT_EVENING, w].sum())
+        } for w in range(len(self.week_indices))]
+
+    # Hàm trả về thống kê dạng (weekly_stats, daily_stats, week_labels, week_indices) như calculate_weekly_stats
+    def weekly(self):
+        return self.weekly_stats, {'off': self.daily_off.tolist()}, self.week_labels, self.week_indices
+
+    # Hàm trả về dòng thống kê tuần dạng chuỗi cho từng tuần
+    def weekly_texts(self):
+        return [f"PRD: {stats['prd']}, AL: {stats['al']}, NPL: {stats['npl']}, Sáng: {stats['morning']}, "
+                f"Chiều: {stats['evening']}" for stats in self.weekly_stats]
+
+    # Hàm trả về tổng số ca của từng nhân viên theo cột báo cáo chi tiết
+    def employee_totals(self):
+        counts = self.emp_counts
+        return {
+            "Ca Sáng": counts[STAT_MORNING].sum(axis=0),
+            "Ca Tối": counts[STAT_EVENING].sum(axis=0),
+            "Ca VX": counts[STAT_VX].sum(axis=0),
+            "Ca V6": counts[STAT_V6].sum(axis=0),
+            "Ca V8": counts[STAT_V8].sum(axis=0),
+            "PRD": counts[STAT_PRD],
+            "AL": counts[STAT_AL],
+            "NPL": counts[STAT_NPL]
+        }
+
+# Bộ nhớ đệm thống kê theo nội dung lịch: khóa là (kỳ lịch, danh sách nhân viên, mảng mã ca), nên các lần gọi
+# trong cùng một lần hiển thị (Tab 2, Tab 3, các báo cáo CSV) và các lần tải lại trang khi lịch không đổi dùng lại
+# cùng một kết quả, còn mọi chỉnh sửa ô (kể cả sửa trực tiếp list trong lịch) đều cho khóa mới.
+class ScheduleStatsCache:
+    def __init__(self, max_entries=STATS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = {}
+
+    # Hàm lấy thống kê của lịch dict[emp_id] -> list[str] cho danh sách nhân viên employees
+    def get(self, schedule, employees, month_days):
+        emp_ids = tuple(emp["ID"] for emp in employees)
+        codes = encode_schedule(schedule, emp_ids, len(month_days))
+        key = (tuple(month_days), emp_ids, codes.tobytes())
+        stats = self.entries.pop(key, None)
+        if stats is None:
+            stats = ScheduleStats(codes, emp_ids, month_days)
+        # Đưa khóa vừa dùng về cuối, bỏ khóa dùng lâu nhất khi đầy
+        self.entries[key] = stats
+        if len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+        return stats
+
+# Hàm tính thống kê số ca mỗi tuần
+def calculate_weekly_stats(schedule, filtered_employees, month_days, cache=None):
+    return (cache or ScheduleStatsCache()).get(schedule, filtered_employees, month_days).weekly()
+
+# Hàm dựng báo cáo Lịch: mỗi hàng là một nhân viên, thêm hàng thống kê tuần và tổng ca nghỉ/ngày
+def build_schedule_report(schedule, employees, month_days, stats=None):
+    stats = stats or ScheduleStatsCache().get(schedule, employees, month_days)
+    df_report = pd.DataFrame(schedule).T
+    df_report.index.name = "ID Nhân viên"
+    df_report.columns = [d.strftime("%d/%m") for d in month_days]
+    weekly_stats_row = [""] * len(month_days)
+    for week, stats_text in zip(stats.week_indices, stats.weekly_texts()):
+        for day in week:
+            weekly_stats_row[day] = stats_text
+    df_report.loc["Thống kê tuần"] = weekly_stats_row
+    df_report.loc["Tổng ca nghỉ/ngày"] = stats.daily_off.tolist()
+    return df_report
+
+# Hàm dựng báo cáo chi tiết: số ca sáng/tối, VX/V6/V8, PRD/AL/NPL của từng nhân viên
+def build_detail_report(schedule, employees, month_days, stats=None):
+    stats = stats or ScheduleStatsCache().get(schedule, employees, month_days)
+    report_data = {
+        "ID Nhân viên": [emp["ID"] for emp in employees],
+        "Họ Tên": [emp["Họ Tên"] for emp in employees],
+        "Bộ phận": [emp["Bộ phận"] for emp in employees]
+    }
+    report_data.update({column: counts.tolist() for column, counts in stats.employee_totals().items()})
+    df_report = pd.DataFrame(report_data)
+    return df_report
+
+# Hàm dựng báo cáo vi phạm: mỗi bản ghi Violation (của evaluate_schedule) là một dòng gồm mã ràng buộc, nhân viên,
+# ngày, mức vi phạm, loại và thông báo; các thông báo dạng chuỗi (lý do không khả thi, chứng cứ vô nghiệm) chỉ có
+# cột thông báo
+def build_violation_report(violations, employees=(), month_days=()):
+    rows = []
+    for violation in violations:
+        if isinstance(violation, Violation):
+            rows.append({
+                "Ràng buộc": violation.constraint,
+                "ID Nhân viên": employees[violation.emp]["ID"] if violation.emp is not None else "",
+                "Ngày": month_days[violation.day].strftime('%d/%m') if violation.day is not None else "",
+                "Mức": violation.magnitude,
+                "Loại": "Cứng" if violation.hard else "Mềm",
+                "Vi phạm": format_violation(violation, employees, month_days),
+            })
+        else:
+            rows.append({"Vi phạm": violation})
+    return pd.DataFrame(rows, columns=["Ràng buộc", "ID Nhân viên", "Ngày", "Mức", "Loại", "Vi phạm"])
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from schedule_engine import EmployeeRegistry, EncodedProblem, get_default_shifts, get_month_days
+
+RANKS = ["Junior", "Senior", "Manager"]
+DEPARTMENTS = ["Cashier", "Customer Service"]
+SHIFTS = sorted(get_default_shifts("Tất cả"))
+
+
+def random_employee(rng, emp_id):
+    return {"ID": emp_id, "Họ Tên": f"Nhân viên {emp_id}", "Cấp bậc": str(rng.choice(RANKS)),
+            "Bộ phận": str(rng.choice(DEPARTMENTS))}
+
+
+# Hàm so sánh chỉ mục, mặt nạ, danh bạ con và danh sách ca của danh bạ với một danh bạ dựng lại từ đầu
+def assert_matches_rebuild(registry):
+    rebuilt = EmployeeRegistry(registry.employees)
+    assert registry.ids == rebuilt.ids
+    assert registry.index == rebuilt.index
+    assert {k: v for k, v in registry.by_department.items() if v} == rebuilt.by_department
+    assert {k: v for k, v in registry.by_rank.items() if v} == rebuilt.by_rank
+    assert registry.is_cs.tolist() == rebuilt.is_cs.tolist()
+    assert registry.morning_only.tolist() == rebuilt.morning_only.tolist()
+    for department in DEPARTMENTS + ["Tất cả"]:
+        assert registry.department(department).employees == rebuilt.department(department).employees
+        assert registry.count(department) == rebuilt.count(department)
+    pools, pool_sets = registry.shift_pools(SHIFTS)
+    expected_pools, expected_sets = rebuilt.shift_pools(SHIFTS)
+    assert [p.tolist() for p in pools] == [p.tolist() for p in expected_pools]
+    assert pool_sets == expected_sets
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_changes_match_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    registry = EmployeeRegistry(random_employee(rng, f"E{i:03d}") for i in range(5))
+    next_id = 5
+    for step in range(150):
+        action = rng.random()
+        if action < 0.4 or not len(registry):
+            assert registry.add(random_employee(rng, f"E{next_id:03d}"))
+            next_id += 1
+        elif action < 0.85:
+            emp_id = registry.ids[rng.integers(len(registry))]
+            new_id = f"E{next_id:03d}" if rng.random() < 0.3 else emp_id
+            next_id += new_id != emp_id
+            assert registry.update(emp_id, random_employee(rng, new_id))
+        else:
+            registry.remove(registry.ids[rng.integers(len(registry))])
+        if step % 10 == 0:
+            assert_matches_rebuild(registry)
+    assert_matches_rebuild(registry)
+
+
+def test_duplicate_ids_are_rejected():
+    rng = np.random.default_rng(0)
+    registry = EmployeeRegistry([random_employee(rng, "A"), random_employee(rng, "B")])
+    assert not registry.add(random_employee(rng, "A"))
+    assert not registry.update("A", random_employee(rng, "B"))
+    assert registry.ids == ["A", "B"]
+
+
+def test_encoded_problem_is_not_changed_by_later_edits():
+    rng = np.random.default_rng(0)
+    registry = EmployeeRegistry(random_employee(rng, f"E{i}") for i in range(4))
+    month_days = get_month_days(2025, 1)
+    problem = EncodedProblem(registry, month_days, [], 3, True, 4, {}, SHIFTS)
+    ids, is_cs = list(problem.emp_ids), problem.is_cs.tolist()
+    registry.add(random_employee(rng, "E9"))
+    registry.update("E0", dict(registry.get("E0"), **{"Bộ phận": "Customer Service", "ID": "E0x"}))
+    assert problem.emp_ids == ids and problem.is_cs.tolist() == is_cs
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from schedule_engine import (
+    SHIFT_CODES, SHIFT_INDEX, NUM_SHIFT_CODES, OFF_SHIFTS, EncodedProblem, IncrementalFitness, batch_fitness,
+    array_fitness, calculate_fitness, evaluate_schedule, decode_schedule, summarize_boundary, get_valid_shifts
+)
+
+SEEDS = range(8)
+PERIODS = [(2025, 1), (2024, 2), (2025, 2), (2025, 4)]
+
+
+# Hàm tạo danh sách ngày của kỳ (26 tháng này đến 25 tháng sau), giống cách ứng dụng tính month_days
+def period_days(year, month):
+    start_date = datetime(year, month, 26)
+    end_date = datetime(year, month + 1, 25) if month < 12 else datetime(year + 1, 1, 25)
+    return [start_date + timedelta(days=x) for x in range((end_date - start_date).days + 1)]
+
+
+# Hàm tạo một bài toán ngẫu nhiên: nhân viên (CS/Cashier, đủ cấp bậc), ô nhập tay, trạng thái cuối kỳ trước
+# và một tập ca được chọn ngẫu nhiên (luôn có PRD và đủ ca sáng/tối)
+def make_case(seed, num_employees=12):
+    rng = np.random.default_rng(seed)
+    year, month = PERIODS[seed % len(PERIODS)]
+    month_days = period_days(year, month)
+    num_days = len(month_days)
+    sundays = [i for i, d in enumerate(month_days) if d.weekday() == 6]
+    employees = [{
+        "ID": f"E{i:03d}",
+        "Họ Tên": f"Nhân viên {i}",
+        "Cấp bậc": rng.choice(["Junior", "Junior", "Senior", "Manager"]),
+        "Bộ phận": "Customer Service" if i < num_employees // 3 else "Cashier"
+    } for i in range(num_employees)]
+    work_shifts = get_valid_shifts()
+    selected_shifts = sorted(set(rng.choice(work_shifts, size=len(work_shifts) // 2, replace=False).tolist())
+                             | {"VX14", "V829", "PRD"})
+
+    manual_shifts = {}
+    for emp in employees:
+        for day in np.flatnonzero(rng.random(num_days) < 0.15).tolist():
+            manual_shifts[(emp["ID"], day)] = SHIFT_CODES[rng.integers(1, NUM_SHIFT_CODES)]
+
+    # Trạng thái cuối kỳ trước lấy từ một đoạn lịch ngẫu nhiên thiên về ca làm việc (có chuỗi dài hơn 7 ngày)
+    previous = {emp["ID"]: [SHIFT_CODES[code] for code in rng.choice(
+        np.arange(NUM_SHIFT_CODES), size=10, p=tail_weights())] for emp in employees}
+    boundary = summarize_boundary(previous)
+
+    settings = (int(rng.integers(1, 5)), bool(rng.random() < 0.7), int(rng.integers(0, 6)))
+    problem = EncodedProblem(employees, month_days, sundays, *settings, manual_shifts, selected_shifts,
+                             boundary=boundary)
+    return rng, employees, month_days, sundays, settings, manual_shifts, selected_shifts, boundary, problem
+
+
+# Xác suất chọn mã ca cho lịch kỳ trước: phần lớn là ca làm việc
+def tail_weights():
+    weights = np.ones(NUM_SHIFT_CODES)
+    weights[[SHIFT_INDEX[""]] + [SHIFT_INDEX[s] for s in OFF_SHIFTS]] = 3
+    return weights / weights.sum()
+
+
+# Hàm tạo lịch ngẫu nhiên dạng mảng: ô nhập tay giữ ca nhập tay, các ô khác lấy mọi mã ca (kể cả ô trống, AL/NPL
+# và ca không được chọn) để mọi ràng buộc đều có vi phạm
+def random_codes(rng, problem):
+    codes = rng.integers(0, NUM_SHIFT_CODES, size=(problem.num_employees, problem.num_days)).astype(np.int8)
+    return np.where(problem.manual_mask, problem.manual_codes, codes)
+
+
+def reference_fitness(codes, case):
+    _, employees, month_days, sundays, settings, manual_shifts, selected_shifts, boundary, problem = case
+    return calculate_fitness(decode_schedule(codes, problem.emp_ids), employees, month_days, sundays, *settings,
+                             manual_shifts, selected_shifts, boundary)[0]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_batch_fitness_matches_calculate_fitness(seed):
+    case = make_case(seed)
+    rng, problem = case[0], case[-1]
+    population = np.stack([random_codes(rng, problem) for _ in range(6)])
+    expected = [reference_fitness(codes, case) for codes in population]
+    assert batch_fitness(population, problem).tolist() == expected
+    assert [array_fitness(codes, problem) for codes in population] == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_incremental_fitness_matches_calculate_fitness(seed):
+    case = make_case(seed)
+    rng, problem = case[0], case[-1]
+    codes = random_codes(rng, problem)
+    evaluator = IncrementalFitness(codes, problem)
+    assert evaluator.total == reference_fitness(codes, case)
+
+    free_cells = np.argwhere(~problem.manual_mask)
+    for step in range(200):
+        e, day = free_cells[rng.integers(len(free_cells))].tolist()
+        new_code = int(rng.integers(0, NUM_SHIFT_CODES))
+        expected_delta = None
+        if step % 10 == 0:
+            trial = codes.copy()
+            trial[e, day] = new_code
+            expected_delta = reference_fitness(trial, case) - evaluator.total
+        delta = evaluator.delta(e, day, new_code)
+        if expected_delta is not None:
+            assert delta == expected_delta
+        assert evaluator.apply(e, day, new_code) == delta
+        if step % 25 == 0:
+            assert evaluator.total == reference_fitness(codes, case)
+    assert evaluator.total == reference_fitness(codes, case) == array_fitness(codes, problem)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_violation_records_sum_to_fitness(seed):
+    case = make_case(seed)
+    rng, employees, month_days, sundays, settings, manual_shifts, selected_shifts, boundary, problem = case
+    schedule = decode_schedule(random_codes(rng, problem), problem.emp_ids)
+    args = (schedule, employees, month_days, sundays, *settings, manual_shifts, selected_shifts, boundary)
+    fitness, records = evaluate_schedule(*args)
+    assert fitness == sum(record.penalty for record in records)
+    assert evaluate_schedule(*args, details=False)[0] == fitness
+    assert len(calculate_fitness(*args)[1]) == len(records)